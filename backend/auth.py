@@ -83,4 +83,21 @@ def api_login_required(f):
         kwargs['current_user'] = user
         return f(*args, **kwargs)
     
+    return decorated_function
+
+def api_session_login_required(f):
+    """
+    Декоратор для API, которое вызывается со страниц веб-интерфейса:
+    пользователь берется из сессии, а при ее отсутствии - из токена
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user = get_current_user()
+        
+        if not user:
+            return api_login_required(f)(*args, **kwargs)
+        
+        kwargs['current_user'] = user
+        return f(*args, **kwargs)
+    
     return decorated_function
\ No newline at end of file
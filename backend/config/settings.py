@@ -41,9 +41,66 @@ class AppSettings:
     bubble_conf: float = 0.7
     text_conf: float = 0.5
     
+    # Параметры удаления текста с фона
+    inpaint_method: str = "fast"  # "fast", "quality" или имя метода ("white", "median", "telea", "ns", "lama")
+    lama_model_path: str = "data/models/lama.onnx"
+    inpaint_workers: int = 0  # Потоков для областей, общих для всех страниц (0 - по числу ядер)
+    
+    # Формат переведенных изображений ("" - как у исходного файла, "png", "jpg", "webp")
+    translated_image_format: str = ""
+    translated_image_quality: int = 92
+    
+    # Параметры миниатюр
+    thumbnail_workers: int = 2  # Процессов для генерации миниатюр
+    thumbnail_quality: int = 80  # Качество WebP миниатюр
+    
+    # Параметры экспорта в PDF/ZIP/CBZ
+    export_image_format: str = ""  # Формат страниц при экспорте ("" - без изменений, "jpeg", "webp")
+    export_image_quality: int = 85  # Качество JPEG/WebP при перекодировании страниц
+    export_workers: int = 0  # Процессов для подготовки страниц (0 - по числу ядер)
+    export_page_cache_mb: int = 256  # Память под подготовленные страницы, общие для всех форматов
+    export_cache_dir: str = os.path.join(project_root, "data", "export_cache")
+    export_cache_max_mb: int = 1024  # Размер кеша готовых файлов экспорта (0 - кеш отключен)
+    
+    # Параметры загрузки файлов частями
+    upload_max_mb: int = 200  # Максимальный размер одного загружаемого файла
+    upload_workers: int = 2  # Потоков для обработки загруженных файлов
+    upload_expire_hours: int = 24  # Время хранения незавершенной загрузки
+    
     # Параметры переводчика
-    translator_default_method: str = "google"  # "google" или "openai"
+    translator_default_method: str = "google"  # "google", "openai" или "local"
     openai_api_key: str = ""  # Ключ API OpenAI
+    translation_max_concurrency: int = 8  # Максимум одновременных запросов к одному сервису перевода
+    translation_request_timeout: float = 60.0  # Таймаут одного HTTP-запроса к сервису перевода
+    translation_max_attempts: int = 4  # Максимум попыток запроса при временных ошибках
+    translation_backoff_base: float = 0.5  # Базовая задержка экспоненциального повтора (с)
+    translation_backoff_max: float = 20.0  # Максимальная задержка между повторами (с)
+    translation_breaker_threshold: int = 5  # Ошибок подряд до отключения сервиса
+    translation_breaker_reset: float = 30.0  # Время отключения сервиса до пробного запроса (с)
+    translation_hedge_delay: float = 3.0  # Задержка перед дублирующим запросом к Google (0 - отключено)
+    translation_page_deadline: float = 120.0  # Бюджет времени на перевод страницы (0 - без ограничения)
+    translation_classifier_enabled: bool = True  # Не переводить пунктуацию, числа, звукоподражания и мусор OCR
+    translation_context_enabled: bool = True  # Передавать OpenAI краткое содержание и глоссарий главы
+    translation_context_max_tokens: int = 400  # Бюджет токенов контекста главы в одном запросе
+    
+    # Ограничения частоты запросов к сервисам перевода (в минуту, 0 - без ограничения)
+    openai_key_rpm: int = 500  # Запросов на один API ключ OpenAI
+    openai_key_tpm: int = 200000  # Токенов на один API ключ OpenAI
+    openai_user_rpm: int = 120  # Запросов OpenAI на пользователя
+    openai_user_tpm: int = 60000  # Токенов OpenAI на пользователя
+    google_rpm: int = 600  # Запросов к Google Translate всего
+    google_user_rpm: int = 300  # Запросов к Google Translate на пользователя
+    openai_batch_max_input_tokens: int = 2000  # Лимит входных токенов блоков в одном запросе OpenAI
+    openai_batch_max_output_tokens: int = 3000  # Лимит ожидаемых токенов ответа на один запрос
+    openai_batch_max_blocks: int = 40  # Максимум блоков в одном запросе (0 - без ограничения)
+    
+    # Параметры локального переводчика (CTranslate2)
+    local_translation_model_path: str = "data/models/nllb-200-distilled-600M-ct2"
+    local_translation_model_family: str = "nllb"  # "nllb" (одна модель на все языки) или "marian" (модель на пару языков)
+    local_translation_compute_type: str = "int8"  # "int8", "int8_float32", "float32"
+    local_translation_batch_size: int = 16  # Максимум блоков в одном пакете инференса
+    local_translation_beam_size: int = 2
+    local_translation_threads: int = 0  # Потоков на перевод (0 - по числу ядер)
     
     # Добавим новое поле для секретного ключа JWT
     jwt_secret_key: str = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
@@ -75,9 +132,62 @@ class AppSettings:
         self.bubble_conf = float(os.environ.get('BUBBLE_CONF', self.bubble_conf))
         self.text_conf = float(os.environ.get('TEXT_CONF', self.text_conf))
         
+        # Параметры удаления текста
+        self.inpaint_method = os.environ.get('INPAINT_METHOD', self.inpaint_method)
+        self.lama_model_path = os.environ.get('LAMA_MODEL_PATH', self.lama_model_path)
+        self.inpaint_workers = int(os.environ.get('INPAINT_WORKERS', self.inpaint_workers))
+        
+        # Формат переведенных изображений
+        self.translated_image_format = os.environ.get('TRANSLATED_IMAGE_FORMAT', self.translated_image_format)
+        self.translated_image_quality = int(os.environ.get('TRANSLATED_IMAGE_QUALITY', self.translated_image_quality))
+        
+        # Параметры миниатюр
+        self.thumbnail_workers = int(os.environ.get('THUMBNAIL_WORKERS', self.thumbnail_workers))
+        self.thumbnail_quality = int(os.environ.get('THUMBNAIL_QUALITY', self.thumbnail_quality))
+        
+        # Параметры экспорта
+        self.export_image_format = os.environ.get('EXPORT_IMAGE_FORMAT', self.export_image_format)
+        self.export_image_quality = int(os.environ.get('EXPORT_IMAGE_QUALITY', self.export_image_quality))
+        self.export_workers = int(os.environ.get('EXPORT_WORKERS', self.export_workers))
+        self.export_page_cache_mb = int(os.environ.get('EXPORT_PAGE_CACHE_MB', self.export_page_cache_mb))
+        self.export_cache_dir = os.environ.get('EXPORT_CACHE_DIR', self.export_cache_dir)
+        self.export_cache_max_mb = int(os.environ.get('EXPORT_CACHE_MAX_MB', self.export_cache_max_mb))
+        
+        # Параметры загрузки файлов частями
+        self.upload_max_mb = int(os.environ.get('UPLOAD_MAX_MB', self.upload_max_mb))
+        self.upload_workers = int(os.environ.get('UPLOAD_WORKERS', self.upload_workers))
+        self.upload_expire_hours = int(os.environ.get('UPLOAD_EXPIRE_HOURS', self.upload_expire_hours))
+        
         # Параметры переводчика
         self.translator_default_method = os.environ.get('TRANSLATOR_METHOD', self.translator_default_method)
         self.openai_api_key = os.environ.get('OPENAI_API_KEY', self.openai_api_key)
+        self.translation_max_concurrency = int(os.environ.get('TRANSLATION_MAX_CONCURRENCY', self.translation_max_concurrency))
+        self.translation_request_timeout = float(os.environ.get('TRANSLATION_REQUEST_TIMEOUT', self.translation_request_timeout))
+        self.translation_max_attempts = int(os.environ.get('TRANSLATION_MAX_ATTEMPTS', self.translation_max_attempts))
+        self.translation_backoff_base = float(os.environ.get('TRANSLATION_BACKOFF_BASE', self.translation_backoff_base))
+        self.translation_backoff_max = float(os.environ.get('TRANSLATION_BACKOFF_MAX', self.translation_backoff_max))
+        self.translation_breaker_threshold = int(os.environ.get('TRANSLATION_BREAKER_THRESHOLD', self.translation_breaker_threshold))
+        self.translation_breaker_reset = float(os.environ.get('TRANSLATION_BREAKER_RESET', self.translation_breaker_reset))
+        self.translation_hedge_delay = float(os.environ.get('TRANSLATION_HEDGE_DELAY', self.translation_hedge_delay))
+        self.translation_page_deadline = float(os.environ.get('TRANSLATION_PAGE_DEADLINE', self.translation_page_deadline))
+        self.translation_classifier_enabled = os.environ.get('TRANSLATION_CLASSIFIER', 'true').lower() == 'true'
+        self.translation_context_enabled = os.environ.get('TRANSLATION_CONTEXT', 'true').lower() == 'true'
+        self.translation_context_max_tokens = int(os.environ.get('TRANSLATION_CONTEXT_MAX_TOKENS', self.translation_context_max_tokens))
+        self.openai_key_rpm = int(os.environ.get('OPENAI_KEY_RPM', self.openai_key_rpm))
+        self.openai_key_tpm = int(os.environ.get('OPENAI_KEY_TPM', self.openai_key_tpm))
+        self.openai_user_rpm = int(os.environ.get('OPENAI_USER_RPM', self.openai_user_rpm))
+        self.openai_user_tpm = int(os.environ.get('OPENAI_USER_TPM', self.openai_user_tpm))
+        self.google_rpm = int(os.environ.get('GOOGLE_RPM', self.google_rpm))
+        self.google_user_rpm = int(os.environ.get('GOOGLE_USER_RPM', self.google_user_rpm))
+        self.openai_batch_max_input_tokens = int(os.environ.get('OPENAI_BATCH_MAX_INPUT_TOKENS', self.openai_batch_max_input_tokens))
+        self.openai_batch_max_output_tokens = int(os.environ.get('OPENAI_BATCH_MAX_OUTPUT_TOKENS', self.openai_batch_max_output_tokens))
+        self.openai_batch_max_blocks = int(os.environ.get('OPENAI_BATCH_MAX_BLOCKS', self.openai_batch_max_blocks))
+        self.local_translation_model_path = os.environ.get('LOCAL_TRANSLATION_MODEL_PATH', self.local_translation_model_path)
+        self.local_translation_model_family = os.environ.get('LOCAL_TRANSLATION_MODEL_FAMILY', self.local_translation_model_family)
+        self.local_translation_compute_type = os.environ.get('LOCAL_TRANSLATION_COMPUTE_TYPE', self.local_translation_compute_type)
+        self.local_translation_batch_size = int(os.environ.get('LOCAL_TRANSLATION_BATCH_SIZE', self.local_translation_batch_size))
+        self.local_translation_beam_size = int(os.environ.get('LOCAL_TRANSLATION_BEAM_SIZE', self.local_translation_beam_size))
+        self.local_translation_threads = int(os.environ.get('LOCAL_TRANSLATION_THREADS', self.local_translation_threads))
         
         # Добавим новые параметры
         self.data_dir = os.environ.get('DATA_DIR', self.data_dir)
@@ -1,7 +1,13 @@
 """
 Модуль для работы с файловой системой
 """
-from .folders import get_manga_folders, natural_sort_key, ensure_dirs_exist
+from .folders import get_manga_folders, get_manga_folder_page, get_manga_folder_images, natural_sort_key, ensure_dirs_exist
 from .temp import cleanup_temp_files, generate_unique_filename, save_text_blocks_info, get_temp_filepath
-from .export import create_pdf_from_images, create_zip_from_images
-from .processing import process_single_file, process_single_image, process_manga_folder
\ No newline at end of file
+from .export import (
+    export_images, get_export_format, register_export_format, get_export_jobs,
+    ExportFormat, EXPORT_FORMATS, EXPORT_IMAGE_FORMATS
+)
+from .export_cache import ExportCache, get_export_cache
+from .processing import process_single_file, process_single_image, process_manga_folder
+from .uploads import UploadManager, UploadError, get_upload_manager
+from .archives import is_archive, open_archive, list_archive_pages, process_archive
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Перевод глав из архивов CBZ/ZIP (и CBR/RAR при установленном rarfile)
+
+Архив не распаковывается на диск: страницы читаются из него в память
+в потоках обработки, в порядке естественной сортировки имен, и записываются
+только в рабочий файл конвейера. Переведенные страницы собираются обратно в CBZ
+"""
+import os
+import posixpath
+import tempfile
+import zipfile
+from threading import Lock
+from backend.config import get_settings
+from backend.logger import get_app_logger
+from backend.file_utils.library import IMAGE_EXTENSIONS, natural_sort_key
+from backend.file_utils.user_files import get_user_directory
+from backend.file_utils.export import export_images
+from backend.file_utils.processing import process_image_batch
+
+ARCHIVE_EXTENSIONS = ('.cbz', '.zip', '.cbr', '.rar')
+RAR_EXTENSIONS = ('.cbr', '.rar')
+
+# Страницы в архивах часто сохранены в WebP
+ARCHIVE_PAGE_EXTENSIONS = IMAGE_EXTENSIONS + ('.webp',)
+
+def is_archive(filename):
+    """Проверяет, является ли файл архивом главы по расширению"""
+    return bool(filename) and filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def open_archive(source, filename):
+    """
+    Открывает архив главы
+
+    Args:
+        source: Путь к архиву или файловый объект с поддержкой seek
+        filename: Имя архива (для определения формата)
+
+    Returns:
+        ZipFile или RarFile: Открытый архив
+
+    Raises:
+        ValueError: Если формат архива не поддерживается
+    """
+    if zipfile.is_zipfile(source):
+        # CBR нередко оказывается ZIP-архивом с другим расширением
+        return zipfile.ZipFile(source)
+    if filename.lower().endswith(RAR_EXTENSIONS):
+        try:
+            import rarfile
+        except ImportError:
+            raise ValueError("Для архивов RAR/CBR требуется пакет rarfile")
+        try:
+            return rarfile.RarFile(source)
+        except rarfile.Error as e:
+            raise ValueError(f"Не удалось открыть архив {filename}: {e}")
+    raise ValueError(f"Файл {filename} не является архивом ZIP/CBZ")
+
+def list_archive_pages(archive, max_page_bytes=None):
+    """
+    Возвращает имена страниц архива в порядке естественной сортировки
+
+    Args:
+        archive: Открытый архив
+        max_page_bytes: Максимальный размер страницы после распаковки (None - без ограничения)
+
+    Returns:
+        list: Имена файлов изображений в архиве
+    """
+    logger = get_app_logger()
+    pages = []
+    for info in archive.infolist():
+        name = info.filename
+        base_name = os.path.basename(name.rstrip('/'))
+        if info.is_dir() or name.startswith('__MACOSX/') or base_name.startswith('.'):
+            continue
+        if not base_name.lower().endswith(ARCHIVE_PAGE_EXTENSIONS):
+            continue
+        if max_page_bytes is not None and info.file_size > max_page_bytes:
+            logger.warning(f"Страница {name} пропущена: {info.file_size} байт после распаковки")
+            continue
+        pages.append(name)
+    return sorted(pages, key=natural_sort_key)
+
+def get_page_output_names(pages):
+    """
+    Уникальные имена файлов для страниц архива. Общая для всех страниц папка
+    отбрасывается, вложенные папки входят в имя: ch1/001.jpg и ch2/001.jpg
+    становятся ch1_001.jpg и ch2_001.jpg
+
+    Args:
+        pages: Имена файлов в архиве
+
+    Returns:
+        dict: {имя файла страницы: имя файла в архиве} в порядке страниц
+    """
+    directories = [posixpath.dirname(name.lstrip('/')) for name in pages]
+    common = posixpath.commonpath(directories) if pages else ''
+    names = {}
+    stems = set()
+    for index, name in enumerate(pages):
+        output_name = posixpath.relpath(name.lstrip('/'), common or '.').replace('/', '_').replace('\\', '_')
+        # Переведенные страницы могут получить общее расширение (translated_image_format),
+        # поэтому уникальным должно быть имя без расширения
+        stem = os.path.splitext(output_name)[0].lower()
+        if stem in stems:
+            output_name = f"{index:04d}_{output_name}"
+            stem = os.path.splitext(output_name)[0].lower()
+        stems.add(stem)
+        names[output_name] = name
+    return names
+
+def get_archive_chapter_name(filename):
+    """Имя главы по имени архива: без пути и расширения"""
+    base_name = os.path.basename(filename.replace('\\', '/'))
+    return os.path.splitext(base_name)[0].lstrip('.') or 'archive'
+
+def write_translated_cbz(image_paths, cbz_path):
+    """
+    Собирает переведенные страницы в CBZ. Файл появляется атомарно после полной записи
+
+    Args:
+        image_paths: Пути к переведенным страницам в порядке страниц
+        cbz_path: Путь к итоговому CBZ
+
+    Returns:
+        str: Путь к CBZ
+    """
+    directory = os.path.dirname(cbz_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.partial_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            # Страницы переносятся без перекодирования
+            for chunk in export_images('cbz', image_paths, image_format=""):
+                f.write(chunk)
+        os.replace(temp_path, cbz_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return cbz_path
+
+def process_archive(source, filename, translation_method='google', openai_api_key='', ocr_engine='mangaocr', edit_mode=False, source_language='zh', target_language='ru', user_id=None, inpaint_method=None):
+    """
+    Переводит главу из архива и сохраняет результат в CBZ
+
+    Args:
+        source: Путь к архиву или файловый объект с поддержкой seek (например, FileStorage.stream)
+        filename: Имя архива
+        translation_method: Метод перевода ('google' или 'openai')
+        openai_api_key: API ключ OpenAI (если используется translation_method='openai')
+        ocr_engine: OCR движок ('auto', 'mangaocr', 'paddleocr', 'easyocr', 'tesseract')
+        edit_mode: Включение режима редактирования
+        source_language: Язык оригинала
+        target_language: Язык перевода
+        user_id: ID пользователя (если None, используются общие директории)
+        inpaint_method: Метод удаления текста на фоне (по умолчанию из настроек)
+
+    Returns:
+        tuple: (результаты обработки страниц, путь к переведенному CBZ или None)
+
+    Raises:
+        ValueError: Если архив не поддерживается или в нем нет страниц
+    """
+    logger = get_app_logger()
+    settings = get_settings()
+
+    chapter_name = get_archive_chapter_name(filename)
+    translated_dir = get_user_directory(user_id, "translated") if user_id else settings.translated_books_dir
+    translated_folder = os.path.join(translated_dir, chapter_name)
+
+    with open_archive(source, filename) as archive:
+        pages = list_archive_pages(archive, settings.upload_max_mb * 1024 * 1024)
+        if not pages:
+            raise ValueError(f"В архиве {filename} нет изображений")
+        logger.info(f"Будет обработано {len(pages)} страниц из архива {filename}")
+
+        # Страницы из разных папок архива могут называться одинаково
+        output_names = get_page_output_names(pages)
+
+        # Архив читается из нескольких потоков обработки
+        read_lock = Lock()
+
+        def read_page(output_name):
+            with read_lock:
+                return archive.read(output_names[output_name])
+
+        results = process_image_batch(list(output_names), translated_folder, translation_method, openai_api_key, ocr_engine,
+                                      edit_mode=edit_mode, source_language=source_language,
+                                      target_language=target_language, user_id=user_id,
+                                      inpaint_method=inpaint_method, read_image=read_page)
+
+    if not results:
+        return results, None
+    cbz_path = write_translated_cbz([result['image_path'] for result in results],
+                                    os.path.join(translated_dir, f"{chapter_name}.cbz"))
+    logger.info(f"Переведенная глава сохранена: {cbz_path}")
+    return results, cbz_path
\ No newline at end of file
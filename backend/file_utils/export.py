@@ -1,117 +1,731 @@
 """
-Утилиты для экспорта переведенной манги
+Экспорт переведенной манги
+
+Все форматы (PDF, ZIP, CBZ, CBZ с WebP, EPUB) формируются одним механизмом:
+страницы подготавливаются в пуле процессов, подготовленные страницы кешируются
+в памяти и переиспользуются разными форматами, файл отдается по частям
+без временных файлов, а ход экспорта передается в progress(готово, всего)
 """
+import atexit
+import html
+import io
 import os
+import time
+import uuid
 import zipfile
+import zlib
+from collections import deque, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from threading import Lock
 from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, landscape
 from backend.logger import get_app_logger
 from backend.config import get_settings
 
-def create_pdf_from_images(image_paths, output_path=None, title="Manga Translation"):
+# Форматы изображений, которые уже сжаты и сохраняются в архив без повторного сжатия
+COMPRESSED_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# Форматы, в которые можно перекодировать страницы при экспорте: (формат PIL, расширение)
+EXPORT_IMAGE_FORMATS = {
+    'jpeg': ('JPEG', '.jpg'),
+    'jpg': ('JPEG', '.jpg'),
+    'webp': ('WEBP', '.webp'),
+}
+
+IMAGE_MIMETYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.gif': 'image/gif',
+}
+
+# Глобальный пул процессов для подготовки страниц
+export_pool = None
+
+def get_export_pool():
+    """
+    Возвращает пул процессов для подготовки страниц при экспорте.
+    Размер пула задается настройкой export_workers (0 - по числу ядер)
+
+    Returns:
+        ProcessPoolExecutor: Пул процессов
+    """
+    global export_pool
+    if export_pool is None:
+        workers = get_settings().export_workers or None
+        export_pool = ProcessPoolExecutor(max_workers=workers)
+        atexit.register(export_pool.shutdown, wait=False, cancel_futures=True)
+    return export_pool
+
+def normalize_image_format(image_format):
     """
-    Создает PDF документ из списка изображений
-    
+    Приводит формат страниц к ключу EXPORT_IMAGE_FORMATS
+
     Args:
-        image_paths: Список путей к изображениям
-        output_path: Путь для сохранения PDF (опционально)
-        title: Заголовок PDF документа
-        
+        image_format: Формат страниц ("", None, "jpeg", "jpg", "webp")
+
     Returns:
-        str: Путь к созданному PDF файлу
+        str: Формат ("" - без перекодирования)
+
+    Raises:
+        ValueError: Неподдерживаемый формат
     """
-    logger = get_app_logger()
-    settings = get_settings()
-    
-    # Если путь не указан, создаем в директории translated_books
-    if output_path is None:
-        os.makedirs(settings.translated_books_dir, exist_ok=True)
-        output_path = os.path.join(settings.translated_books_dir, "translated_manga.pdf")
-    
-    # Размер страницы по умолчанию - A4 альбомной ориентации
-    page_width, page_height = landscape(A4)
-    
+    image_format = (image_format or "").lower().lstrip('.')
+    if image_format and image_format not in EXPORT_IMAGE_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат изображений: {image_format}")
+    return image_format
+
+def _flatten_alpha(img):
+    """Приводит изображение к RGB или L, заполняя прозрачные области белым"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        flattened = Image.new('RGB', rgba.size, (255, 255, 255))
+        flattened.paste(rgba, mask=rgba.split()[3])
+        return flattened
+    if img.mode in ('RGB', 'L'):
+        return img
+    return img.convert('RGB')
+
+def _encode_image(img, pil_format, quality):
+    """Кодирует изображение в JPEG или WebP"""
+    buffer = io.BytesIO()
+    if pil_format == 'JPEG':
+        _flatten_alpha(img).save(buffer, format='JPEG', quality=quality, optimize=True)
+    else:
+        img.save(buffer, format='WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+def prepare_archive_image(img_path, image_format="", quality=85):
+    """
+    Подготавливает изображение для архива (ZIP, CBZ, EPUB)
+
+    Args:
+        img_path: Путь к изображению
+        image_format: Формат страниц в архиве ("" - без изменений, "jpeg", "webp")
+        quality: Качество JPEG/WebP
+
+    Returns:
+        tuple: (расширение файла, данные изображения, ширина, высота)
+    """
+    with Image.open(img_path) as img:
+        width, height = img.size
+        if image_format:
+            pil_format, extension = EXPORT_IMAGE_FORMATS[image_format]
+            # Страницы, уже сохраненные в нужном формате, не перекодируются
+            if img.format != pil_format:
+                data = _encode_image(img, pil_format, quality)
+                # Штриховые страницы в JPEG/WebP бывают больше исходного PNG - тогда остается оригинал
+                if len(data) < os.path.getsize(img_path):
+                    return extension, data, width, height
+    with open(img_path, 'rb') as f:
+        return os.path.splitext(img_path)[1].lower(), f.read(), width, height
+
+def prepare_pdf_image(img_path, image_format="", quality=85):
+    """
+    Подготавливает изображение для PDF.
+    JPEG встраивается как есть (DCTDecode). Остальные форматы сохраняются
+    без потерь в виде сжатых zlib пикселей (FlateDecode) или, если задан формат
+    с потерями, перекодируются в JPEG (PDF не поддерживает WebP)
+
+    Args:
+        img_path: Путь к изображению
+        image_format: "" - без потерь, "jpeg" или "webp" - JPEG заданного качества
+        quality: Качество JPEG
+
+    Returns:
+        tuple: (ширина, высота, словарь изображения, данные потока)
+    """
+    with Image.open(img_path) as img:
+        width, height = img.size
+        if img.format == 'JPEG' and img.mode in ('L', 'RGB'):
+            color_space = '/DeviceGray' if img.mode == 'L' else '/DeviceRGB'
+            with open(img_path, 'rb') as f:
+                data = f.read()
+            image_filter = '/DCTDecode'
+        else:
+            pixels = _flatten_alpha(img)
+            color_space = '/DeviceGray' if pixels.mode == 'L' else '/DeviceRGB'
+            if image_format:
+                data = _encode_image(pixels, 'JPEG', quality)
+                image_filter = '/DCTDecode'
+            else:
+                data = zlib.compress(pixels.tobytes(), 6)
+                image_filter = '/FlateDecode'
+
+    header = (f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+              f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter {image_filter} /Length {len(data)} >>")
+    return width, height, header, data
+
+class PreparedImageCache:
+    """
+    Кеш подготовленных страниц в памяти с вытеснением давно не использованных.
+    Ключ включает размер и время изменения файла, поэтому измененная
+    страница подготавливается заново
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def _sizeof(value):
+        return sum(len(part) for part in value if isinstance(part, (bytes, str)))
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._size -= self._sizeof(self._items.pop(key))
+            self._items[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= self._sizeof(evicted)
+
+# Глобальный кеш подготовленных страниц
+prepared_image_cache = None
+
+def get_prepared_image_cache():
+    """
+    Возвращает кеш подготовленных страниц
+
+    Returns:
+        PreparedImageCache: Кеш
+    """
+    global prepared_image_cache
+    if prepared_image_cache is None:
+        prepared_image_cache = PreparedImageCache(get_settings().export_page_cache_mb * 1024 * 1024)
+    return prepared_image_cache
+
+def prepare_pages(worker, image_paths, image_format="", quality=85, progress=None):
+    """
+    Подготавливает страницы функцией worker в пуле процессов, сохраняя порядок.
+    Готовые страницы берутся из кеша; одновременно в работе не больше двух задач
+    на процесс, поэтому в памяти не накапливаются страницы всей главы
+
+    Args:
+        worker: prepare_pdf_image или prepare_archive_image
+        image_paths: Список путей к изображениям в порядке страниц
+        image_format: Формат страниц ("" - без перекодирования)
+        quality: Качество JPEG/WebP
+        progress: Функция progress(готово, всего)
+
+    Yields:
+        tuple: (путь, результат worker или исключение)
+    """
+    total = len(image_paths)
+
+    # Без перекодирования страницы архива только читаются с диска: пул и кеш не нужны
+    if worker is prepare_archive_image and not image_format:
+        for done, img_path in enumerate(image_paths, 1):
+            try:
+                result = prepare_archive_image(img_path)
+            except Exception as e:
+                result = e
+            if progress is not None:
+                progress(done, total)
+            yield img_path, result
+        return
+
+    cache = get_prepared_image_cache()
+    window = 2 * (get_settings().export_workers or os.cpu_count() or 1)
+    pending = deque()
+    done = 0
+
+    def finish(img_path, key, value):
+        if isinstance(value, Future):
+            try:
+                value = value.result()
+            except Exception as e:
+                return img_path, e
+            cache.put(key, value)
+        return img_path, value
+
     try:
-        logger.info(f"Создание PDF из {len(image_paths)} изображений")
-        
-        # Создаем PDF документ
-        c = canvas.Canvas(output_path, pagesize=landscape(A4))
-        c.setTitle(title)
-        
-        for i, img_path in enumerate(image_paths):
+        for img_path in image_paths:
             try:
-                # Открываем изображение
-                img = Image.open(img_path)
-                img_width, img_height = img.size
-                
-                # Масштабируем изображение, чтобы оно поместилось на странице
-                scale_factor = min(page_width / img_width, page_height / img_height) * 0.9
-                scaled_width = img_width * scale_factor
-                scaled_height = img_height * scale_factor
-                
-                # Центрируем изображение на странице
-                x_offset = (page_width - scaled_width) / 2
-                y_offset = (page_height - scaled_height) / 2
-                
-                # Добавляем изображение в PDF
-                c.drawImage(img_path, x_offset, y_offset, scaled_width, scaled_height)
-                
-                # Если это не последнее изображение, добавляем новую страницу
-                if i < len(image_paths) - 1:
-                    c.showPage()
-                    
-                logger.debug(f"Добавлено изображение {i+1}/{len(image_paths)}: {img_path}")
+                stat = os.stat(img_path)
+                key = (worker.__name__, os.path.abspath(img_path), stat.st_size, stat.st_mtime_ns,
+                       image_format, quality)
+                value = cache.get(key)
+                if value is None:
+                    value = get_export_pool().submit(worker, img_path, image_format, quality)
             except Exception as e:
-                logger.error(f"Ошибка при обработке изображения {img_path}: {e}")
+                key, value = None, e
+            pending.append((img_path, key, value))
+
+            # Страницы из кеша отдаются сразу, ожидание пула - только при заполненном окне
+            while len(pending) >= window or (pending and not isinstance(pending[0][2], Future)):
+                done += 1
+                result = finish(*pending.popleft())
+                if progress is not None:
+                    progress(done, total)
+                yield result
+
+        while pending:
+            done += 1
+            result = finish(*pending.popleft())
+            if progress is not None:
+                progress(done, total)
+            yield result
+    finally:
+        # Загрузка прервана клиентом - оставшиеся страницы не готовим
+        for _, _, value in pending:
+            if isinstance(value, Future):
+                value.cancel()
+
+class _StreamSink:
+    """
+    Файлоподобный приемник, накапливающий записанные байты до выдачи.
+    Позиция отсчитывается от начала всего потока, а seek доступен в пределах
+    еще не выданных байтов: zipfile после записи каждого файла возвращается
+    к его локальному заголовку и записывает в него размеры и CRC, поэтому
+    дескрипторы данных (флаг 0x08) не нужны. Выдавать байты можно только
+    между файлами архива
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # Позиция начала буфера в потоке
+        self._offset = 0
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        start = self._position - self._offset
+        self._buffer[start:start + len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, position, whence=0):
+        if whence == 1:
+            position += self._position
+        elif whence == 2:
+            position += self._offset + len(self._buffer)
+        if not self._offset <= position <= self._offset + len(self._buffer):
+            raise OSError("Позиция уже выдана из потока")
+        self._position = position
+        return position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Возвращает и очищает накопленные байты"""
+        data = bytes(self._buffer)
+        self._offset += len(data)
+        self._buffer = bytearray()
+        self._position = self._offset
+        return data
+
+def get_archive_name(index, img_path, extension=None):
+    """Имя файла в архиве с порядковым номером страницы"""
+    name = os.path.basename(img_path)
+    if extension is not None:
+        name = os.path.splitext(name)[0] + extension
+    return f"{index + 1:03d}_{name}"
+
+def _add_failed(failed, img_path):
+    if failed is not None:
+        failed.append(img_path)
+
+def _compression_for(extension):
+    return zipfile.ZIP_STORED if extension in COMPRESSED_IMAGE_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+class ExportFormat:
+    """
+    Базовый формат экспорта
+    """
+    name = None
+    extension = None
+    mimetype = None
+    # Формат страниц, который используется независимо от параметров запроса (None - из запроса)
+    image_format = None
+
+    def stream(self, image_paths, image_format="", quality=85, progress=None, failed=None):
+        """
+        Формирует файл по частям
+
+        Args:
+            image_paths: Список путей к изображениям в порядке страниц
+            image_format: Формат страниц ("" - без перекодирования, "jpeg", "webp")
+            quality: Качество JPEG/WebP
+            progress: Функция progress(готово, всего)
+            failed: Список, в который добавляются пути пропущенных из-за ошибок страниц
+
+        Yields:
+            bytes: Очередная часть файла
+        """
+        raise NotImplementedError
+
+class PdfExport(ExportFormat):
+    """
+    PDF, размер каждой страницы равен размеру изображения (без полей).
+    Каталог и дерево страниц записываются в конце, когда известны все страницы
+    """
+    name = 'pdf'
+    extension = 'pdf'
+    mimetype = 'application/pdf'
+
+    def stream(self, image_paths, image_format="", quality=85, progress=None, failed=None):
+        logger = get_app_logger()
+        offsets = {}
+        position = 0
+
+        def emit(data):
+            nonlocal position
+            position += len(data)
+            return data
+
+        def emit_object(number, body, stream=None):
+            offsets[number] = position
+            data = f"{number} 0 obj\n{body}\n".encode('latin-1')
+            if stream is not None:
+                data += b"stream\n" + stream + b"\nendstream\n"
+            data += b"endobj\n"
+            return emit(data)
+
+        catalog_number, pages_number = 1, 2
+        next_number = 3
+        page_numbers = []
+
+        yield emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        for img_path, result in prepare_pages(prepare_pdf_image, image_paths, image_format, quality, progress):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при добавлении изображения {img_path} в PDF: {result}")
+                _add_failed(failed, img_path)
                 continue
-                
-        # Сохраняем PDF
-        c.save()
-        logger.info(f"PDF создан успешно: {output_path}")
-        return output_path
-        
-    except Exception as e:
-        logger.error(f"Ошибка создания PDF: {e}")
-        return None
-
-def create_zip_from_images(image_paths, output_path=None):
-    """
-    Создает ZIP архив из списка изображений
-    
+            width, height, image_header, image_data = result
+
+            image_number, content_number, page_number = next_number, next_number + 1, next_number + 2
+            next_number += 3
+            content = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode('latin-1')
+
+            yield emit_object(image_number, image_header, image_data)
+            yield emit_object(content_number, f"<< /Length {len(content)} >>", content)
+            yield emit_object(page_number,
+                              f"<< /Type /Page /Parent {pages_number} 0 R /MediaBox [0 0 {width} {height}] "
+                              f"/Resources << /XObject << /Im0 {image_number} 0 R >> >> /Contents {content_number} 0 R >>")
+            page_numbers.append(page_number)
+
+        kids = " ".join(f"{number} 0 R" for number in page_numbers)
+        yield emit_object(pages_number, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>")
+        yield emit_object(catalog_number, f"<< /Type /Catalog /Pages {pages_number} 0 R >>")
+
+        xref_offset = position
+        xref = [f"xref\n0 {next_number}\n", "0000000000 65535 f \n"]
+        xref += [f"{offsets[number]:010d} 00000 n \n" for number in range(1, next_number)]
+        xref.append(f"trailer\n<< /Size {next_number} /Root {catalog_number} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        yield emit("".join(xref).encode('latin-1'))
+
+class ZipExport(ExportFormat):
+    """
+    ZIP-архив страниц. Уже сжатые изображения сохраняются без повторного сжатия (ZIP_STORED)
+    """
+    name = 'zip'
+    extension = 'zip'
+    mimetype = 'application/zip'
+
+    def stream(self, image_paths, image_format="", quality=85, progress=None, failed=None):
+        logger = get_app_logger()
+        sink = _StreamSink()
+        with zipfile.ZipFile(sink, 'w') as zip_file:
+            pages = prepare_pages(prepare_archive_image, image_paths, image_format, quality, progress)
+            for i, (img_path, result) in enumerate(pages):
+                if isinstance(result, Exception):
+                    logger.error(f"Ошибка при добавлении изображения {img_path} в архив: {result}")
+                    _add_failed(failed, img_path)
+                    continue
+                extension, data, _, _ = result
+                zip_file.writestr(get_archive_name(i, img_path, extension), data,
+                                  compress_type=_compression_for(extension))
+                yield sink.drain()
+        # Центральный каталог записывается при закрытии архива
+        yield sink.drain()
+
+class CbzExport(ZipExport):
+    """
+    CBZ - ZIP-архив страниц, который открывают программы для чтения комиксов
+    """
+    name = 'cbz'
+    extension = 'cbz'
+
+class WebpCbzExport(CbzExport):
+    """
+    CBZ со страницами в WebP: заметно меньше PNG при сопоставимом качестве
+    """
+    name = 'cbz-webp'
+    image_format = 'webp'
+
+class EpubExport(ExportFormat):
+    """
+    EPUB 3 с фиксированной разметкой: одна страница XHTML на изображение.
+    Файл mimetype идет первым без сжатия, пакетный файл и оглавление
+    записываются в конце, когда известны все страницы
+    """
+    name = 'epub'
+    extension = 'epub'
+    mimetype = 'application/epub+zip'
+
+    CONTAINER_XML = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+        '  <rootfiles>\n'
+        '    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>\n'
+        '  </rootfiles>\n'
+        '</container>\n'
+    )
+
+    def __init__(self, title="Manga Translation", language="und"):
+        self.title = title
+        self.language = language
+
+    @staticmethod
+    def _page_xhtml(number, image_name, width, height):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE html>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">\n'
+            f'<head><title>{number}</title>'
+            f'<meta name="viewport" content="width={width}, height={height}"/>'
+            '<style>html, body { margin: 0; padding: 0; } img { display: block; width: 100%; height: 100%; }</style>'
+            '</head>\n'
+            f'<body><img src="images/{html.escape(image_name)}" alt="{number}"/></body>\n'
+            '</html>\n'
+        )
+
+    def _package_opf(self, pages):
+        manifest = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>']
+        spine = []
+        for number, image_name, image_type in pages:
+            cover = ' properties="cover-image"' if number == 1 else ''
+            manifest.append(f'<item id="img{number}" href="images/{html.escape(image_name)}" '
+                            f'media-type="{image_type}"{cover}/>')
+            manifest.append(f'<item id="page{number}" href="page_{number:03d}.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="page{number}"/>')
+        modified = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" '
+            'prefix="rendition: http://www.idpf.org/vocab/rendition/#">\n'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+            f'<dc:identifier id="book-id">urn:uuid:{uuid.uuid4()}</dc:identifier>\n'
+            f'<dc:title>{html.escape(self.title)}</dc:title>\n'
+            f'<dc:language>{html.escape(self.language)}</dc:language>\n'
+            f'<meta property="dcterms:modified">{modified}</meta>\n'
+            '<meta property="rendition:layout">pre-paginated</meta>\n'
+            '<meta property="rendition:spread">none</meta>\n'
+            '</metadata>\n'
+            '<manifest>\n' + '\n'.join(manifest) + '\n</manifest>\n'
+            '<spine>\n' + '\n'.join(spine) + '\n</spine>\n'
+            '</package>\n'
+        )
+
+    def _nav_xhtml(self, pages):
+        first_page = f'<li><a href="page_{pages[0][0]:03d}.xhtml">{html.escape(self.title)}</a></li>' if pages else ''
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE html>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">\n'
+            f'<head><title>{html.escape(self.title)}</title></head>\n'
+            f'<body><nav epub:type="toc"><ol>{first_page}</ol></nav></body>\n'
+            '</html>\n'
+        )
+
+    def stream(self, image_paths, image_format="", quality=85, progress=None, failed=None):
+        logger = get_app_logger()
+        sink = _StreamSink()
+        pages = []
+        with zipfile.ZipFile(sink, 'w') as zip_file:
+            zip_file.writestr('mimetype', self.mimetype, compress_type=zipfile.ZIP_STORED)
+            zip_file.writestr('META-INF/container.xml', self.CONTAINER_XML, compress_type=zipfile.ZIP_DEFLATED)
+            yield sink.drain()
+
+            prepared = prepare_pages(prepare_archive_image, image_paths, image_format, quality, progress)
+            for img_path, result in prepared:
+                if isinstance(result, Exception):
+                    logger.error(f"Ошибка при добавлении изображения {img_path} в EPUB: {result}")
+                    _add_failed(failed, img_path)
+                    continue
+                extension, data, width, height = result
+                image_type = IMAGE_MIMETYPES.get(extension)
+                if image_type is None:
+                    logger.error(f"Формат изображения {img_path} не поддерживается в EPUB")
+                    _add_failed(failed, img_path)
+                    continue
+                number = len(pages) + 1
+                image_name = f"page_{number:03d}{extension}"
+                zip_file.writestr(f"OEBPS/images/{image_name}", data, compress_type=_compression_for(extension))
+                zip_file.writestr(f"OEBPS/page_{number:03d}.xhtml", self._page_xhtml(number, image_name, width, height),
+                                  compress_type=zipfile.ZIP_DEFLATED)
+                pages.append((number, image_name, image_type))
+                yield sink.drain()
+
+            zip_file.writestr('OEBPS/content.opf', self._package_opf(pages), compress_type=zipfile.ZIP_DEFLATED)
+            zip_file.writestr('OEBPS/nav.xhtml', self._nav_xhtml(pages), compress_type=zipfile.ZIP_DEFLATED)
+        yield sink.drain()
+
+# Зарегистрированные форматы экспорта
+EXPORT_FORMATS = {
+    export_format.name: export_format
+    for export_format in (PdfExport(), ZipExport(), CbzExport(), WebpCbzExport(), EpubExport())
+}
+
+def register_export_format(export_format):
+    """
+    Регистрирует формат экспорта
+
     Args:
-        image_paths: Список путей к изображениям
-        output_path: Путь для сохранения ZIP (опционально)
-        
+        export_format: Экземпляр ExportFormat
+    """
+    EXPORT_FORMATS[export_format.name] = export_format
+
+def get_export_format(name):
+    """
+    Возвращает формат экспорта по имени
+
+    Args:
+        name: Имя формата ('pdf', 'zip', 'cbz', 'cbz-webp', 'epub')
+
+    Returns:
+        ExportFormat: Формат экспорта
+    """
+    if name not in EXPORT_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат: {name}")
+    return EXPORT_FORMATS[name]
+
+def resolve_export_options(format_name, image_format=None, quality=None):
+    """
+    Определяет итоговые формат и качество страниц с учетом формата экспорта и настроек
+
+    Args:
+        format_name: Имя формата экспорта
+        image_format: Формат страниц из запроса (None - из настроек)
+        quality: Качество из запроса (None - из настроек)
+
     Returns:
-        str: Путь к созданному ZIP архиву
+        tuple: (формат страниц, качество)
     """
-    logger = get_app_logger()
     settings = get_settings()
-    
-    # Если путь не указан, создаем в директории translated_books
-    if output_path is None:
-        os.makedirs(settings.translated_books_dir, exist_ok=True)
-        output_path = os.path.join(settings.translated_books_dir, "translated_manga.zip")
-    
-    try:
-        logger.info(f"Создание ZIP из {len(image_paths)} изображений")
-        
-        # Создаем ZIP архив
-        with zipfile.ZipFile(output_path, 'w') as zip_file:
-            for i, img_path in enumerate(image_paths):
-                try:
-                    # Добавляем файл в архив с его оригинальным именем
-                    filename = os.path.basename(img_path)
-                    zip_file.write(img_path, filename)
-                    logger.debug(f"Добавлен файл {i+1}/{len(image_paths)}: {filename}")
-                except Exception as e:
-                    logger.error(f"Ошибка при добавлении файла {img_path} в архив: {e}")
-                    continue
-        
-        logger.info(f"ZIP архив создан успешно: {output_path}")
-        return output_path
-        
-    except Exception as e:
-        logger.error(f"Ошибка создания ZIP архива: {e}")
-        return None
\ No newline at end of file
+    export_format = get_export_format(format_name)
+    if export_format.image_format is not None:
+        image_format = export_format.image_format
+    elif image_format is None:
+        image_format = settings.export_image_format
+    return normalize_image_format(image_format), quality or settings.export_image_quality
+
+def export_images(format_name, image_paths, image_format=None, quality=None, progress=None, failed=None):
+    """
+    Формирует файл экспорта по частям
+
+    Args:
+        format_name: Имя формата экспорта
+        image_paths: Список путей к изображениям в порядке страниц
+        image_format: Формат страниц ("jpeg", "webp"; по умолчанию из настроек, "" - без изменений)
+        quality: Качество JPEG/WebP (по умолчанию из настроек)
+        progress: Функция progress(готово, всего)
+        failed: Список, в который добавляются пути пропущенных из-за ошибок страниц
+
+    Returns:
+        generator: Части файла
+    """
+    image_format, quality = resolve_export_options(format_name, image_format, quality)
+    return get_export_format(format_name).stream(image_paths, image_format, quality, progress, failed)
+
+class ExportJobs:
+    """
+    Состояние последних экспортов для отображения хода загрузки.
+    ID экспорта задает клиент, поэтому экспорты хранятся по паре
+    (ID пользователя, ID экспорта) и не пересекаются между пользователями
+    """
+
+    def __init__(self, max_jobs=200):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = Lock()
+
+    def start(self, job_id, format_name, total, user_id=None):
+        key = (user_id, job_id)
+        with self._lock:
+            self._jobs[key] = {
+                'job_id': job_id, 'format': format_name, 'user_id': user_id,
+                'status': 'running', 'done': 0, 'total': total, 'error': None,
+                'started_at': time.time(), 'finished_at': None
+            }
+            self._jobs.move_to_end(key)
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+    def update(self, job_id, done, total, user_id=None):
+        with self._lock:
+            job = self._jobs.get((user_id, job_id))
+            if job is not None:
+                job['done'], job['total'] = done, total
+
+    def finish(self, job_id, status='done', error=None, user_id=None):
+        with self._lock:
+            job = self._jobs.get((user_id, job_id))
+            if job is not None:
+                job['status'] = status
+                job['error'] = error
+                job['finished_at'] = time.time()
+                if status == 'done':
+                    job['done'] = job['total']
+
+    def get(self, job_id, user_id=None):
+        """
+        Returns:
+            dict: Копия состояния экспорта пользователя или None
+        """
+        with self._lock:
+            job = self._jobs.get((user_id, job_id))
+            return dict(job) if job is not None else None
+
+    def track(self, job_id, chunks, user_id=None):
+        """
+        Передает части файла дальше и отмечает завершение, ошибку или отмену экспорта
+
+        Args:
+            job_id: ID экспорта
+            chunks: Генератор частей файла
+            user_id: ID пользователя
+
+        Yields:
+            bytes: Части файла
+        """
+        status, error = 'cancelled', None
+        try:
+            yield from chunks
+            status = 'done'
+        except Exception as e:
+            status, error = 'error', str(e)
+            raise
+        finally:
+            self.finish(job_id, status, error, user_id)
+
+# Глобальное состояние экспортов
+export_jobs = ExportJobs()
+
+def get_export_jobs():
+    """
+    Возвращает состояние экспортов
+
+    Returns:
+        ExportJobs: Состояние экспортов
+    """
+    return export_jobs
\ No newline at end of file
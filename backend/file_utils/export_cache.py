@@ -0,0 +1,169 @@
+"""
+Кеш готовых файлов экспорта (PDF, ZIP, CBZ)
+
+Ключ файла вычисляется по содержимому запроса: упорядоченному списку изображений,
+их размерам и времени изменения, формату и параметрам экспорта. Повторная загрузка
+той же выборки отдается с диска, а ключ служит ETag для условных запросов.
+Файлы хранятся в папке владельца и выдаются только ему. В кеш попадают только
+файлы, в которые вошли все страницы.
+Размер кеша ограничен, при превышении удаляются файлы, которые дольше всего
+не запрашивались
+"""
+import hashlib
+import json
+import os
+import tempfile
+from threading import Lock
+from backend.logger import get_app_logger
+from backend.config import get_settings
+
+class ExportCache:
+    """
+    Кеш файлов экспорта на диске с вытеснением давно не использованных
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+
+    @staticmethod
+    def make_key(format_type, image_paths, options=None):
+        """
+        Вычисляет ключ файла экспорта
+
+        Args:
+            format_type: Формат экспорта (pdf, zip, cbz)
+            image_paths: Список путей к изображениям в порядке страниц
+            options: Параметры экспорта, влияющие на результат
+
+        Returns:
+            str: Ключ (sha256)
+        """
+        pages = []
+        for path in image_paths:
+            stat = os.stat(path)
+            pages.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+        payload = json.dumps([format_type, options or {}, pages], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _owner_directory(self, owner):
+        return os.path.join(self.directory, str(owner) if owner is not None else 'shared')
+
+    def _path(self, key, owner=None):
+        return os.path.join(self._owner_directory(owner), key)
+
+    def get(self, key, owner=None):
+        """
+        Возвращает путь к файлу экспорта, если он есть в кеше владельца
+
+        Args:
+            key: Ключ файла
+            owner: ID пользователя, сформировавшего файл
+
+        Returns:
+            str: Путь к файлу или None
+        """
+        path = self._path(key, owner)
+        try:
+            # Время доступа отмечается явно: файловая система может быть смонтирована с noatime
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def stream_and_store(self, key, chunks, owner=None, is_complete=None):
+        """
+        Передает части файла дальше, одновременно сохраняя их в кеш.
+        Файл появляется в кеше атомарно и только после полной записи;
+        если загрузка прервана или файл неполный, записанный файл удаляется
+
+        Args:
+            key: Ключ файла
+            chunks: Генератор частей файла
+            owner: ID пользователя, которому будет выдаваться файл
+            is_complete: Функция без аргументов, которая после записи сообщает,
+                вошли ли в файл все страницы (None - файл всегда полный)
+
+        Yields:
+            bytes: Части файла
+        """
+        directory = self._owner_directory(owner)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.partial_')
+        completed = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            if is_complete is None or is_complete():
+                os.replace(temp_path, self._path(key, owner))
+                completed = True
+            else:
+                get_app_logger().warning(f"Файл экспорта {key} не сохранен в кеш: не все страницы добавлены")
+        finally:
+            if not completed:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+        self.evict()
+
+    def evict(self):
+        """Удаляет давно не использованные файлы, пока размер кеша превышает лимит"""
+        logger = get_app_logger()
+        with self._lock:
+            entries = []
+            total = 0
+            try:
+                owners = os.listdir(self.directory)
+            except FileNotFoundError:
+                return
+            for owner in owners:
+                try:
+                    names = os.listdir(os.path.join(self.directory, owner))
+                except (NotADirectoryError, FileNotFoundError):
+                    continue
+                for name in names:
+                    if name.startswith('.partial_'):
+                        continue
+                    path = os.path.join(self.directory, owner, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    logger.debug(f"Файл экспорта удален из кеша: {path}")
+                except FileNotFoundError:
+                    pass
+
+# Глобальный кеш файлов экспорта
+export_cache = None
+
+def get_export_cache():
+    """
+    Возвращает кеш файлов экспорта или None, если кеш отключен в настройках
+
+    Returns:
+        ExportCache: Кеш
+    """
+    global export_cache
+    settings = get_settings()
+    if not settings.export_cache_max_mb:
+        return None
+    if export_cache is None:
+        export_cache = ExportCache(settings.export_cache_dir, settings.export_cache_max_mb * 1024 * 1024)
+    return export_cache
\ No newline at end of file
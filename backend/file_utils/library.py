@@ -0,0 +1,296 @@
+"""
+Индекс библиотеки манги пользователя
+
+Список папок и изображений хранится в памяти и проверяется по времени изменения
+директорий: заново читаются только папки, в которых добавились или удалились файлы.
+Файлы, сохраненные через save_file/copy_file, добавляются в индекс сразу.
+Изображения, для которых миниатюры еще создаются, получают URL с версией
+при следующем обращении
+"""
+import bisect
+import os
+import re
+from threading import Lock
+from backend.config import get_settings
+from backend.logger import get_app_logger
+from backend.file_utils.user_files import get_user_directory
+from backend.file_utils.thumbnails import get_thumbnail_generator, get_thumbnail_path, THUMBNAIL_SIZES
+from backend.file_utils.versions import versioned_url
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+def natural_sort_key(s):
+    """
+    Функция для естественной сортировки строк, чтобы '2' шел перед '10'
+
+    Args:
+        s: Строка для сортировки
+
+    Returns:
+        list: Список для сортировки
+    """
+    return [int(text) if text.isdigit() else text.lower()
+            for text in re.split(r'(\d+)', s)]
+
+class _FolderEntry:
+    """Изображения одной папки в порядке естественной сортировки"""
+
+    def __init__(self, mtime_ns):
+        self.mtime_ns = mtime_ns
+        self.images = []
+        self.keys = []
+        # Имена изображений, URL миниатюр которых еще без версии
+        self.unversioned = set()
+
+class LibraryIndex:
+    """
+    Индекс папок манги одной директории books
+    """
+
+    def __init__(self, books_dir, thumbnails_dir, user_id=None):
+        self.books_dir = books_dir
+        self.thumbnails_dir = thumbnails_dir
+        self.user_id = user_id
+        self._books_mtime_ns = None
+        self._folder_names = []
+        self._folders = {}
+        self._lock = Lock()
+
+    def _thumbnail_url(self, folder_name, image_name):
+        if self.user_id:
+            return f'/thumbnails/{self.user_id}/{folder_name}/{image_name}'
+        return f'/frontend/static/thumbnails/{folder_name}/{image_name}'
+
+    def _image_entry(self, folder_name, image_name):
+        """
+        Returns:
+            tuple: (данные изображения, есть ли версия у URL миниатюры)
+        """
+        thumbnail_url = self._thumbnail_url(folder_name, image_name)
+        # Версия по содержимому миниатюры: браузер хранит ее до изменения файла
+        small_path = get_thumbnail_path(self.thumbnails_dir, folder_name, image_name, THUMBNAIL_SIZES[0])
+        large_path = get_thumbnail_path(self.thumbnails_dir, folder_name, image_name, THUMBNAIL_SIZES[1])
+        small_url = versioned_url(thumbnail_url, small_path)
+        image = {
+            'name': image_name,
+            'path': os.path.join(self.books_dir, folder_name, image_name),
+            'thumbnail_url': small_url,
+            'thumbnail_url_2x': versioned_url(f'{thumbnail_url}?size={THUMBNAIL_SIZES[1]}', large_path),
+        }
+        return image, small_url != thumbnail_url
+
+    def _scan_folder(self, folder_name, mtime_ns):
+        """Читает папку целиком и ставит отсутствующие миниатюры в очередь"""
+        folder_path = os.path.join(self.books_dir, folder_name)
+        generator = get_thumbnail_generator()
+        entry = _FolderEntry(mtime_ns)
+        mtimes = {}
+        with os.scandir(folder_path) as it:
+            for item in it:
+                if item.name.lower().endswith(IMAGE_EXTENSIONS) and item.is_file():
+                    mtimes[item.name] = item.stat().st_mtime
+        names = sorted(mtimes, key=natural_sort_key)
+
+        for image_name in names:
+            # Файлы, добавленные в папку не через save_file/copy_file, получают миниатюры в фоне;
+            # изображения с актуальными миниатюрами в очередь не ставятся
+            image_path = os.path.join(folder_path, image_name)
+            if generator.stale_targets(image_path, self.thumbnails_dir, folder_name, image_name, mtimes[image_name]):
+                generator.schedule(image_path, self.thumbnails_dir, folder_name, image_name)
+            image, versioned = self._image_entry(folder_name, image_name)
+            entry.images.append(image)
+            entry.keys.append(natural_sort_key(image_name))
+            if not versioned:
+                entry.unversioned.add(image_name)
+        return entry
+
+    def _refresh_versions(self, folder_name, entry):
+        """Добавляет версии к URL миниатюр, созданных после чтения папки"""
+        for i, image in enumerate(entry.images):
+            if image['name'] not in entry.unversioned:
+                continue
+            updated, versioned = self._image_entry(folder_name, image['name'])
+            if versioned:
+                entry.images[i] = updated
+                entry.unversioned.discard(image['name'])
+
+    def refresh(self):
+        """Обновляет индекс по времени изменения директорий"""
+        logger = get_app_logger()
+        with self._lock:
+            if not os.path.exists(self.books_dir):
+                os.makedirs(self.books_dir, exist_ok=True)
+                logger.info(f"Создана директория {self.books_dir}")
+
+            books_mtime_ns = os.stat(self.books_dir).st_mtime_ns
+            if books_mtime_ns != self._books_mtime_ns:
+                with os.scandir(self.books_dir) as it:
+                    self._folder_names = sorted(item.name for item in it if item.is_dir())
+                self._books_mtime_ns = books_mtime_ns
+                for folder_name in set(self._folders) - set(self._folder_names):
+                    del self._folders[folder_name]
+
+            scanned = 0
+            for folder_name in self._folder_names:
+                try:
+                    mtime_ns = os.stat(os.path.join(self.books_dir, folder_name)).st_mtime_ns
+                except OSError:
+                    continue
+                entry = self._folders.get(folder_name)
+                if entry is None or entry.mtime_ns != mtime_ns:
+                    self._folders[folder_name] = self._scan_folder(folder_name, mtime_ns)
+                    scanned += 1
+                elif entry.unversioned:
+                    self._refresh_versions(folder_name, entry)
+            if scanned:
+                logger.debug(f"Индекс библиотеки {self.books_dir}: перечитано папок: {scanned}")
+
+    def add_file(self, file_path):
+        """
+        Добавляет в индекс сохраненное изображение без повторного чтения папки
+
+        Args:
+            file_path: Путь к изображению в директории books
+        """
+        folder_path, image_name = os.path.split(os.path.abspath(file_path))
+        if os.path.dirname(folder_path) != os.path.abspath(self.books_dir):
+            return
+        if not image_name.lower().endswith(IMAGE_EXTENSIONS):
+            return
+        folder_name = os.path.basename(folder_path)
+        with self._lock:
+            entry = self._folders.get(folder_name)
+            if entry is None:
+                # Новая папка будет прочитана при следующем обновлении
+                return
+            key = natural_sort_key(image_name)
+            image, versioned = self._image_entry(folder_name, image_name)
+            index = bisect.bisect_left(entry.keys, key)
+            if index < len(entry.keys) and entry.images[index]['name'] == image_name:
+                entry.images[index] = image
+            else:
+                entry.keys.insert(index, key)
+                entry.images.insert(index, image)
+            if versioned:
+                entry.unversioned.discard(image_name)
+            else:
+                entry.unversioned.add(image_name)
+            # Время изменения папки не обновляется: изменения, сделанные в обход приложения,
+            # будут найдены при следующем обновлении индекса
+
+    def get_folders(self, offset=0, limit=None):
+        """
+        Возвращает папки манги
+
+        Args:
+            offset: Номер первой папки
+            limit: Максимум папок (None - все)
+
+        Returns:
+            tuple: (список папок, общее количество папок)
+        """
+        self.refresh()
+        with self._lock:
+            end = None if limit is None else offset + limit
+            folders = []
+            for folder_id, folder_name in enumerate(self._folder_names[offset:end], start=offset):
+                entry = self._folders.get(folder_name)
+                if entry is None:
+                    continue
+                folders.append({
+                    'id': folder_id,
+                    'name': folder_name,
+                    'path': os.path.join(self.books_dir, folder_name),
+                    'images': list(entry.images)
+                })
+            return folders, len(self._folder_names)
+
+    def get_folder_page(self, after=None, limit=20):
+        """
+        Возвращает страницу папок без списков изображений.
+        Страница начинается после папки с именем after, поэтому добавление
+        и удаление папок между запросами не сдвигает следующие страницы
+
+        Args:
+            after: Имя последней папки предыдущей страницы (None - с начала)
+            limit: Максимум папок
+
+        Returns:
+            tuple: (список папок, имя последней папки или None, если папок больше нет,
+                    общее количество папок)
+        """
+        self.refresh()
+        with self._lock:
+            start = 0 if after is None else bisect.bisect_right(self._folder_names, after)
+            names = self._folder_names[start:start + limit]
+            folders = []
+            for folder_id, folder_name in enumerate(names, start=start):
+                entry = self._folders.get(folder_name)
+                if entry is None:
+                    continue
+                folders.append({
+                    'id': folder_id,
+                    'name': folder_name,
+                    'path': os.path.join(self.books_dir, folder_name),
+                    'image_count': len(entry.images)
+                })
+            has_more = start + limit < len(self._folder_names)
+            return folders, names[-1] if names and has_more else None, len(self._folder_names)
+
+    def get_image_page(self, folder_name, after=None, limit=100):
+        """
+        Возвращает страницу изображений папки в порядке естественной сортировки
+
+        Args:
+            folder_name: Имя папки
+            after: Имя последнего изображения предыдущей страницы (None - с начала)
+            limit: Максимум изображений
+
+        Returns:
+            tuple: (список изображений, имя последнего изображения или None,
+                    если изображений больше нет, общее количество изображений)
+
+        Raises:
+            KeyError: Если папки нет в библиотеке
+        """
+        self.refresh()
+        with self._lock:
+            entry = self._folders[folder_name]
+            start = 0
+            if after is not None:
+                key = natural_sort_key(after)
+                start = bisect.bisect_left(entry.keys, key)
+                # Имена, различающиеся только регистром, имеют одинаковый ключ
+                while start < len(entry.keys) and entry.keys[start] == key:
+                    start += 1
+                    if entry.images[start - 1]['name'] == after:
+                        break
+            images = entry.images[start:start + limit]
+            has_more = start + limit < len(entry.images)
+            return list(images), images[-1]['name'] if images and has_more else None, len(entry.images)
+
+# Индексы библиотек по ID пользователя (None - общая директория)
+library_indexes = {}
+library_indexes_lock = Lock()
+
+def get_library_index(user_id=None):
+    """
+    Возвращает индекс библиотеки пользователя
+
+    Args:
+        user_id: ID пользователя (если None, используется общая директория)
+
+    Returns:
+        LibraryIndex: Индекс
+    """
+    with library_indexes_lock:
+        index = library_indexes.get(user_id)
+        if index is None:
+            if user_id:
+                index = LibraryIndex(get_user_directory(user_id, "books"),
+                                     get_user_directory(user_id, "thumbnails"), user_id)
+            else:
+                settings = get_settings()
+                index = LibraryIndex(settings.books_dir, settings.thumbnails_dir)
+            library_indexes[user_id] = index
+        return index
\ No newline at end of file
@@ -4,10 +4,7 @@
 import os
 import time
 import json
-import base64
-import io
 import concurrent.futures
-from PIL import Image
 import shutil
 import uuid
 from backend.logger import get_app_logger
@@ -16,8 +13,25 @@ from .temp import generate_unique_filename, save_text_blocks_info, get_temp_file
 from .folders import natural_sort_key
 from backend.process_pipeline import process_segmentation, process_ocr_and_translation
 from backend.file_utils.user_files import get_user_directory
+from backend.translation import get_chapter_cache
 
-def process_single_file(file, translation_method, openai_api_key, ocr_engine, edit_mode=False, batch_id=None, file_index=0, source_language='zh', target_language='ru', user_id=None):
+def get_translated_output_path(directory, filename):
+    """
+    Формирует путь для переведенного изображения с учетом выбранного формата вывода
+    
+    Args:
+        directory: Директория для сохранения
+        filename: Исходное имя файла
+        
+    Returns:
+        str: Путь к переведенному изображению
+    """
+    output_format = get_settings().translated_image_format.lower().lstrip('.')
+    if output_format:
+        filename = f"{os.path.splitext(filename)[0]}.{output_format}"
+    return os.path.join(directory, filename)
+
+def process_single_file(file, translation_method, openai_api_key, ocr_engine, edit_mode=False, batch_id=None, file_index=0, source_language='zh', target_language='ru', user_id=None, inpaint_method=None, chapter_id=None):
     """
     Обрабатывает один файл изображения и возвращает результаты
     
@@ -32,6 +46,8 @@ def process_single_file(file, translation_method, openai_api_key, ocr_engine, ed
         source_language: Язык оригинала
         target_language: Язык перевода
         user_id: ID пользователя (если None, используются общие директории)
+        inpaint_method: Метод удаления текста на фоне (по умолчанию из настроек)
+        chapter_id: ID главы для переиспользования переводов одинаковых текстов между страницами
         
     Returns:
         tuple: (путь к временному файлу, результаты обработки)
@@ -85,6 +101,14 @@ def process_single_file(file, translation_method, openai_api_key, ocr_engine, ed
     
     # Сохраняем оригинальное имя файла в результатах для дальнейшего использования
     seg_results['original_filename'] = original_filename
+    
+    # Путь для переведенного изображения (для возможности скачивания)
+    if user_id:
+        # Используем пользовательскую директорию для переведенных файлов
+        translated_dir = get_user_directory(user_id, "translated")
+    else:
+        translated_dir = settings.translated_books_dir
+    translated_image_path = get_translated_output_path(translated_dir, original_filename)
     try:
         # Выполняем OCR и перевод с учетом режима редактирования
         logger.info(f"OCR и перевод для {original_filename}...")
@@ -105,7 +129,10 @@ def process_single_file(file, translation_method, openai_api_key, ocr_engine, ed
             original_filename=original_filename,
             source_language=source_language,
             target_language=target_language,
-            user_id=user_id  # Передаем ID пользователя
+            user_id=user_id,  # Передаем ID пользователя
+            chapter_id=chapter_id,
+            inpaint_method=inpaint_method,
+            translated_output_path=translated_image_path
         )
             
         # Проверяем на наличие ошибки перевода
@@ -115,29 +142,9 @@ def process_single_file(file, translation_method, openai_api_key, ocr_engine, ed
             
         file_result['filename'] = original_filename
         
-        # Сохраняем переведенное изображение для возможности скачивания
-        try:
-            if user_id:
-                # Используем пользовательскую директорию для переведенных файлов
-                translated_dir = get_user_directory(user_id, "translated")
-                os.makedirs(translated_dir, exist_ok=True)
-                translated_image_path = os.path.join(translated_dir, original_filename)
-            else:
-                # Создаем директорию, если ее нет
-                os.makedirs(settings.translated_books_dir, exist_ok=True)
-                translated_image_path = os.path.join(settings.translated_books_dir, original_filename)
-            
-            # Сохраняем изображение из base64
-            translated_base64 = file_result['translated']
-            img_data = base64.b64decode(translated_base64)
-            img = Image.open(io.BytesIO(img_data))
-            img.save(translated_image_path)
-            
-            # Добавляем путь к результату
-            file_result['image_path'] = translated_image_path
-            logger.info(f"Изображение сохранено для скачивания: {translated_image_path}")
-        except Exception as e:
-            logger.error(f"Ошибка сохранения изображения для скачивания: {e}")
+        # Изображение уже записано этапом рендеринга, добавляем путь к результату
+        file_result['image_path'] = file_result['translated_path']
+        logger.info(f"Изображение сохранено для скачивания: {translated_image_path}")
         
         return file_path, file_result
     except Exception as e:
@@ -155,7 +162,7 @@ def process_single_file(file, translation_method, openai_api_key, ocr_engine, ed
                 except Exception as e:
                     logger.warning(f"Ошибка при удалении временного файла {path}: {e}")
 
-def process_single_image(image_path, translation_method, openai_api_key, ocr_engine, translated_folder, edit_mode=False, batch_id=None, file_index=0, source_language='zh', target_language='ru', user_id=None):
+def process_single_image(image_path, translation_method, openai_api_key, ocr_engine, translated_folder, edit_mode=False, batch_id=None, file_index=0, source_language='zh', target_language='ru', user_id=None, inpaint_method=None, chapter_id=None, image_data=None):
     """
     Обрабатывает одно изображение из папки манги
     
@@ -171,6 +178,10 @@ def process_single_image(image_path, translation_method, openai_api_key, ocr_eng
         source_language: Язык оригинала
         target_language: Язык перевода
         user_id: ID пользователя
+        inpaint_method: Метод удаления текста на фоне (по умолчанию из настроек)
+        chapter_id: ID главы для переиспользования переводов одинаковых текстов между страницами
+        image_data: Содержимое изображения (например, страница из архива); если указано,
+                    image_path используется только как имя файла
         
     Returns:
         tuple: (путь к временному файлу, результаты обработки)
@@ -191,8 +202,12 @@ def process_single_image(image_path, translation_method, openai_api_key, ocr_eng
         temp_filename = generate_unique_filename('temp_image', '.png')
         file_path = get_temp_filepath(temp_filename)
     
-    # Копируем файл
-    shutil.copy(image_path, file_path)
+    # Копируем файл; содержимое из памяти записывается сразу в рабочий файл
+    if image_data is not None:
+        with open(file_path, 'wb') as f:
+            f.write(image_data)
+    else:
+        shutil.copy(image_path, file_path)
     
     # Получаем имя файла
     image_name = os.path.basename(image_path)
@@ -213,6 +228,9 @@ def process_single_image(image_path, translation_method, openai_api_key, ocr_eng
             final_results_filename = f'final_results_{unique_id}.json'
             final_results_path = get_temp_filepath(final_results_filename)
         
+        # Переведенное изображение записывается этапом рендеринга сразу в папку translated_books
+        translated_image_path = get_translated_output_path(translated_folder, image_name)
+        
         # Выполняем OCR и перевод
         logger.info(f"OCR и перевод для {image_name}...")
         file_result = process_ocr_and_translation(
@@ -230,21 +248,18 @@ def process_single_image(image_path, translation_method, openai_api_key, ocr_eng
             original_filename=image_name,
             source_language=source_language,
             target_language=target_language,
-            user_id=user_id  # Передаем ID пользователя
+            user_id=user_id,  # Передаем ID пользователя
+            chapter_id=chapter_id,
+            inpaint_method=inpaint_method,
+            translated_output_path=translated_image_path
         )
         
-        # Сохраняем переведенное изображение в папку translated_books
-        translated_image_path = os.path.join(translated_folder, image_name)
-        translated_base64 = file_result['translated']
-        
-        # Декодируем base64 и сохраняем изображение
-        img_data = base64.b64decode(translated_base64)
-        img = Image.open(io.BytesIO(img_data))
-        img.save(translated_image_path)
+        if file_result.get('error'):
+            return file_path, file_result
         
         # Добавляем информацию о файле в результаты
         file_result['filename'] = image_name
-        file_result['image_path'] = translated_image_path
+        file_result['image_path'] = file_result['translated_path']
         
         logger.info(f"Изображение для скачивания: {translated_image_path}")
         
@@ -264,7 +279,7 @@ def process_single_image(image_path, translation_method, openai_api_key, ocr_eng
                 except Exception as e:
                     logger.warning(f"Ошибка при удалении временного файла {path}: {e}")
 
-def process_manga_folder(folder_path, translation_method='google', openai_api_key='', ocr_engine='mangaocr', selected_images=None, edit_mode=False, source_language='zh', target_language='ru', user_id=None):
+def process_manga_folder(folder_path, translation_method='google', openai_api_key='', ocr_engine='mangaocr', selected_images=None, edit_mode=False, source_language='zh', target_language='ru', user_id=None, inpaint_method=None):
     """
     Обработка всех изображений в папке манги с параллельной обработкой
     и сохранением исходного порядка файлов
@@ -278,13 +293,14 @@ def process_manga_folder(folder_path, translation_method='google', openai_api_ke
         edit_mode: Включение режима редактирования
         source_language: Язык оригинала
         target_language: Язык перевода
+        user_id: ID пользователя
+        inpaint_method: Метод удаления текста на фоне (по умолчанию из настроек)
         
     Returns:
         list: Результаты обработки
     """
     logger = get_app_logger()
     settings = get_settings()
-    temp_files = []
     
     if user_id:
         # Получаем директории пользователя
@@ -297,27 +313,79 @@ def process_manga_folder(folder_path, translation_method='google', openai_api_ke
     else:
         translated_folder = folder_path.replace(settings.books_dir, settings.translated_books_dir)
     
+    # Получаем список изображений в папке
+    if selected_images:
+        # Сортируем выбранные изображения по естественному порядку
+        image_paths = sorted(selected_images, key=lambda x: natural_sort_key(os.path.basename(x)))
+        logger.debug(f"Выбранные изображения после сортировки: {[os.path.basename(path) for path in image_paths]}")
+    else:
+        image_paths = []
+        # Используем естественную сортировку для файлов в папке
+        for image_name in sorted(os.listdir(folder_path), key=natural_sort_key):
+            image_path = os.path.join(folder_path, image_name)
+            if os.path.isfile(image_path) and image_name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
+                image_paths.append(image_path)
+    
+    logger.info(f"Будет обработано {len(image_paths)} файлов из папки {os.path.basename(folder_path)}")
+    return process_image_batch(image_paths, translated_folder, translation_method, openai_api_key, ocr_engine,
+                               edit_mode=edit_mode, source_language=source_language,
+                               target_language=target_language, user_id=user_id, inpaint_method=inpaint_method)
+
+def process_image_batch(image_paths, translated_folder, translation_method='google', openai_api_key='', ocr_engine='mangaocr', edit_mode=False, source_language='zh', target_language='ru', user_id=None, inpaint_method=None, read_image=None):
+    """
+    Параллельная обработка страниц одной главы с сохранением их порядка
+    
+    Args:
+        image_paths: Пути к изображениям (или имена страниц при read_image) в порядке страниц
+        translated_folder: Папка для сохранения переведенных изображений
+        translation_method: Метод перевода ('google' или 'openai')
+        openai_api_key: API ключ OpenAI (если используется translation_method='openai')
+        ocr_engine: OCR движок ('auto', 'mangaocr', 'paddleocr', 'easyocr', 'tesseract')
+        edit_mode: Включение режима редактирования
+        source_language: Язык оригинала
+        target_language: Язык перевода
+        user_id: ID пользователя
+        inpaint_method: Метод удаления текста на фоне (по умолчанию из настроек)
+        read_image: Функция read_image(путь) -> bytes; страница читается в потоке обработки,
+                    поэтому в памяти одновременно находятся только обрабатываемые страницы
+        
+    Returns:
+        list: Результаты обработки
+    """
+    logger = get_app_logger()
+    temp_files = []
+    results = []
+    
+    if not image_paths:
+        return results
+    
     os.makedirs(translated_folder, exist_ok=True)
     
+    # Создаем batch_id для группы файлов если включен режим редактирования
+    batch_id = f"batch_{generate_unique_filename('', '')}" if edit_mode else None
+    # Переводы одинаковых текстов переиспользуются в пределах папки
+    chapter_id = batch_id or f"chapter_{generate_unique_filename('', '')}"
+    
+    def process_page(image_path, index):
+        image_data = read_image(image_path) if read_image is not None else None
+        return process_single_image(
+            image_path,
+            translation_method,
+            openai_api_key,
+            ocr_engine,
+            translated_folder,
+            edit_mode,
+            batch_id,  # Передаем batch_id
+            index,  # Передаем индекс файла
+            source_language,  # Передаем исходный язык
+            target_language,   # Передаем язык перевода
+            user_id,
+            inpaint_method,
+            chapter_id,
+            image_data
+        )
+    
     try:
-        # Получаем список изображений в папке
-        if selected_images:
-            # Сортируем выбранные изображения по естественному порядку
-            image_paths = sorted(selected_images, key=lambda x: natural_sort_key(os.path.basename(x)))
-            logger.debug(f"Выбранные изображения после сортировки: {[os.path.basename(path) for path in image_paths]}")
-        else:
-            image_paths = []
-            # Используем естественную сортировку для файлов в папке
-            for image_name in sorted(os.listdir(folder_path), key=natural_sort_key):
-                image_path = os.path.join(folder_path, image_name)
-                if os.path.isfile(image_path) and image_name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                    image_paths.append(image_path)
-        
-        logger.info(f"Будет обработано {len(image_paths)} файлов из папки {os.path.basename(folder_path)}")
-        
-        # Создаем batch_id для группы файлов если включен режим редактирования
-        batch_id = f"batch_{generate_unique_filename('', '')}" if edit_mode else None
-        
         # Увеличиваем количество параллельных задач до 6
         max_workers = min(12, len(image_paths))
         logger.info(f"Используем {max_workers} потоков для обработки")
@@ -333,20 +401,7 @@ def process_manga_folder(folder_path, translation_method='google', openai_api_ke
             
             # Создаем список задач с задержкой между запусками
             for i, image_path in enumerate(image_paths):
-                future = executor.submit(
-                    process_single_image, 
-                    image_path, 
-                    translation_method, 
-                    openai_api_key, 
-                    ocr_engine,
-                    translated_folder,
-                    edit_mode,
-                    batch_id,  # Передаем batch_id
-                    i,  # Передаем индекс файла
-                    source_language,  # Передаем исходный язык
-                    target_language,   # Передаем язык перевода
-                    user_id
-                )
+                future = executor.submit(process_page, image_path, i)
                 # Связываем future с индексом в исходном списке и именем файла
                 future_to_index[future] = {
                     'index': i,
@@ -388,6 +443,10 @@ def process_manga_folder(folder_path, translation_method='google', openai_api_ke
                 except Exception as e:
                     logger.error(f"Исключение при обработке изображения: {str(e)}")
         
+        dedup_stats = get_chapter_cache().get_stats(chapter_id)
+        logger.info(f"Дедупликация текстов главы: {dedup_stats['blocks']} блоков, "
+                    f"{dedup_stats['translated']} переведено, доля повторов {dedup_stats['dedup_ratio']:.0%}")
+        
         # Сортируем результаты по исходному порядку
         results = sorted(results_with_order, key=lambda x: x['original_index'])
         logger.debug(f"Порядок сортировки результатов: {[result['filename'] for result in results]}")
@@ -400,6 +459,4 @@ def process_manga_folder(folder_path, translation_method='google', openai_api_ke
                 try:
                     os.remove(file_path)
                 except Exception as e:
-                    logger.warning(f"Ошибка при удалении временного файла {file_path}: {e}")
-    
-    return results
\ No newline at end of file
+                    logger.warning(f"Ошибка при удалении временного файла {file_path}: {e}")
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Миниатюры страниц манги
+
+Миниатюры создаются заранее, при сохранении файла, в нескольких размерах
+в формате WebP. Генерация выполняется в пуле процессов; для JPEG используется
+режим draft, при котором декодер сразу уменьшает изображение и не распаковывает
+его полностью. Одновременные запросы одной миниатюры ожидают одну задачу
+"""
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import RLock
+from PIL import Image
+from backend.config import get_settings
+from backend.logger import get_app_logger
+
+# Размеры миниатюр (наибольшая сторона в пикселях)
+THUMBNAIL_SIZES = (150, 300, 600)
+
+THUMBNAIL_SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+def get_thumbnail_path(thumbnails_dir, folder, filename, size):
+    """
+    Путь к миниатюре изображения
+
+    Args:
+        thumbnails_dir: Корневая директория миниатюр
+        folder: Папка манги
+        filename: Имя исходного изображения
+        size: Размер миниатюры
+
+    Returns:
+        str: Путь к файлу миниатюры
+    """
+    return os.path.join(thumbnails_dir, folder, f"{os.path.splitext(filename)[0]}_{size}.webp")
+
+def select_thumbnail_size(requested):
+    """Наименьший размер миниатюры, не меньше запрошенного"""
+    for size in THUMBNAIL_SIZES:
+        if size >= requested:
+            return size
+    return THUMBNAIL_SIZES[-1]
+
+def render_thumbnails(image_path, targets, quality=80):
+    """
+    Создает миниатюры изображения. Выполняется в пуле процессов
+
+    Args:
+        image_path: Путь к исходному изображению
+        targets: Список (размер, путь к миниатюре)
+        quality: Качество WebP
+
+    Returns:
+        list: Пути к созданным миниатюрам
+    """
+    targets = sorted(targets, reverse=True)
+    created = []
+    with Image.open(image_path) as img:
+        # Для JPEG декодер уменьшает изображение в 2-8 раз без полной распаковки
+        img.draft('RGB', (targets[0][0], targets[0][0]))
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        # Каждая следующая миниатюра уменьшается из предыдущей, большей
+        for size, thumbnail_path in targets:
+            img.thumbnail((size, size), Image.LANCZOS)
+            os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+            temp_path = f"{thumbnail_path}.{os.getpid()}.tmp"
+            img.save(temp_path, format='WEBP', quality=quality, method=4)
+            os.replace(temp_path, thumbnail_path)
+            created.append(thumbnail_path)
+    return created
+
+class ThumbnailGenerator:
+    """
+    Фоновая генерация миниатюр с объединением одинаковых задач
+    """
+
+    def __init__(self, workers=2, quality=80):
+        self.workers = workers
+        self.quality = quality
+        self._pool = None
+        self._pending = {}
+        # RLock: обратный вызов уже завершенной задачи выполняется сразу, под блокировкой
+        self._lock = RLock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            atexit.register(self._pool.shutdown, wait=False, cancel_futures=True)
+        return self._pool
+
+    @staticmethod
+    def _is_fresh(thumbnail_path, source_mtime):
+        try:
+            return os.path.getmtime(thumbnail_path) >= source_mtime
+        except OSError:
+            return False
+
+    def stale_targets(self, image_path, thumbnails_dir, folder, filename=None, source_mtime=None):
+        """
+        Возвращает миниатюры изображения, которые отсутствуют или старше исходного файла
+
+        Args:
+            image_path: Путь к исходному изображению
+            thumbnails_dir: Корневая директория миниатюр
+            folder: Папка манги
+            filename: Имя изображения (по умолчанию из image_path)
+            source_mtime: Время изменения исходного файла, если уже известно
+
+        Returns:
+            list: Пары (размер, путь к миниатюре); пустой список, если все миниатюры актуальны
+                  или изображение не поддерживается
+        """
+        filename = filename or os.path.basename(image_path)
+        if not filename.lower().endswith(THUMBNAIL_SOURCE_EXTENSIONS):
+            return []
+        if source_mtime is None:
+            try:
+                source_mtime = os.path.getmtime(image_path)
+            except OSError:
+                return []
+        targets = [(size, get_thumbnail_path(thumbnails_dir, folder, filename, size)) for size in THUMBNAIL_SIZES]
+        return [(size, path) for size, path in targets if not self._is_fresh(path, source_mtime)]
+
+    def schedule(self, image_path, thumbnails_dir, folder, filename=None):
+        """
+        Ставит в очередь создание отсутствующих или устаревших миниатюр изображения
+
+        Args:
+            image_path: Путь к исходному изображению
+            thumbnails_dir: Корневая директория миниатюр
+            folder: Папка манги
+            filename: Имя изображения (по умолчанию из image_path)
+
+        Returns:
+            Future: Задача генерации или None, если все миниатюры актуальны
+        """
+        targets = self.stale_targets(image_path, thumbnails_dir, folder, filename)
+        if not targets:
+            return None
+
+        key = (os.path.abspath(image_path), os.path.abspath(os.path.join(thumbnails_dir, folder)))
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._get_pool().submit(render_thumbnails, image_path, targets, self.quality)
+                self._pending[key] = future
+                future.add_done_callback(lambda _, key=key: self._done(key))
+        return future
+
+    def _done(self, key):
+        with self._lock:
+            future = self._pending.pop(key, None)
+        if future is not None and future.exception() is not None:
+            get_app_logger().error(f"Ошибка при создании миниатюр для {key[0]}: {future.exception()}")
+
+    def ensure(self, image_path, thumbnails_dir, folder, filename, size, timeout=None):
+        """
+        Возвращает путь к актуальной миниатюре. Отсутствующая или устаревшая
+        миниатюра ставится в очередь на создание
+
+        Args:
+            image_path: Путь к исходному изображению
+            thumbnails_dir: Корневая директория миниатюр
+            folder: Папка манги
+            filename: Имя изображения
+            size: Размер миниатюры из THUMBNAIL_SIZES
+            timeout: Максимальное время ожидания создания в секундах (None - не ждать)
+
+        Returns:
+            str: Путь к миниатюре или None, если она еще создается или ее не удалось создать
+        """
+        thumbnail_path = get_thumbnail_path(thumbnails_dir, folder, filename, size)
+        future = self.schedule(image_path, thumbnails_dir, folder, filename)
+        if future is not None:
+            if not timeout:
+                return None
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                return None
+        return thumbnail_path if os.path.exists(thumbnail_path) else None
+
+# Глобальный генератор миниатюр
+thumbnail_generator = None
+
+def get_thumbnail_generator():
+    """
+    Возвращает генератор миниатюр с параметрами из настроек
+
+    Returns:
+        ThumbnailGenerator: Генератор
+    """
+    global thumbnail_generator
+    if thumbnail_generator is None:
+        settings = get_settings()
+        thumbnail_generator = ThumbnailGenerator(settings.thumbnail_workers, settings.thumbnail_quality)
+    return thumbnail_generator
\ No newline at end of file
@@ -0,0 +1,517 @@
+"""
+Загрузка файлов частями с возобновлением
+
+Протокол похож на tus: клиент создает загрузку с именем файла, размером и
+необязательной контрольной суммой, затем отправляет части по порядку, указывая
+смещение каждой части. Части пишутся сразу во временный файл в папке books
+пользователя, без буферизации всего файла в памяти или во временной директории.
+Прерванную загрузку можно продолжить с последнего сохраненного смещения,
+в том числе после перезапуска сервера: параметры загрузки хранятся рядом
+с временным файлом.
+Готовый файл проверяется по контрольной сумме и сразу ставится в очередь
+на перевод, не дожидаясь остальных файлов главы
+"""
+import atexit
+import base64
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from backend.config import get_settings
+from backend.logger import get_app_logger
+from backend.file_utils.library import IMAGE_EXTENSIONS
+from backend.file_utils.user_files import get_user_directory, schedule_user_thumbnails, update_library_index
+
+# Размер блока чтения тела запроса
+UPLOAD_READ_SIZE = 1024 * 1024
+
+# Префикс незавершенных файлов; индекс библиотеки их не показывает
+PARTIAL_PREFIX = '.upload_'
+
+# Расширение файла с параметрами загрузки рядом с незавершенным файлом
+METADATA_SUFFIX = '.json'
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Алгоритмы для заголовка Upload-Checksum
+CHUNK_CHECKSUM_ALGORITHMS = ('sha1', 'sha256', 'md5')
+
+# Параметры перевода, которые можно передать при создании загрузки
+PROCESS_OPTIONS = ('translation_method', 'openai_api_key', 'source_language',
+                   'target_language', 'inpaint_method', 'chapter')
+
+# Параметры, которые не пишутся на диск. Без ключа после перезапуска
+# используется ключ OpenAI из настроек
+SECRET_PROCESS_OPTIONS = ('openai_api_key',)
+
+class UploadError(Exception):
+    """Ошибка загрузки с HTTP-статусом ответа"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def validate_upload_name(name, what):
+    """
+    Проверяет имя папки или файла: одна компонента пути без скрытых файлов
+
+    Raises:
+        UploadError: Если имя недопустимо
+    """
+    if not name or name in ('.', '..') or name.startswith('.') \
+            or '/' in name or '\\' in name or '\0' in name:
+        raise UploadError(f"Недопустимое имя {what}: {name!r}")
+    return name
+
+def parse_chunk_checksum(header):
+    """
+    Разбирает заголовок Upload-Checksum вида "<алгоритм> <base64>"
+
+    Returns:
+        tuple: (алгоритм, ожидаемый хеш в байтах) или None, если заголовка нет
+
+    Raises:
+        UploadError: Если заголовок поврежден или алгоритм не поддерживается
+    """
+    if not header:
+        return None
+    try:
+        algorithm, value = header.split(' ', 1)
+        digest = base64.b64decode(value.strip(), validate=True)
+    except ValueError:
+        raise UploadError("Некорректный заголовок Upload-Checksum")
+    algorithm = algorithm.lower()
+    if algorithm not in CHUNK_CHECKSUM_ALGORITHMS:
+        raise UploadError(f"Алгоритм контрольной суммы не поддерживается: {algorithm}")
+    return algorithm, digest
+
+class Upload:
+    """Состояние одной загрузки"""
+
+    def __init__(self, user_id, folder, filename, size, checksum=None, process=None, upload_id=None):
+        self.upload_id = upload_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.folder = folder
+        self.filename = filename
+        self.size = size
+        self.checksum = checksum
+        self.process = process
+        self.offset = 0
+        # Хеш уже записанной части файла; продолжается с каждой частью
+        self.hasher = hashlib.sha256()
+        folder_path = os.path.join(get_user_directory(user_id, "books"), folder)
+        self.path = os.path.join(folder_path, filename)
+        self.partial_path = os.path.join(folder_path, f"{PARTIAL_PREFIX}{self.upload_id}")
+        self.metadata_path = self.partial_path + METADATA_SUFFIX
+        # uploading, processing, done, error, cancelled
+        self.status = 'uploading'
+        self.error = None
+        self.result = None
+        self.updated_at = time.time()
+        self.lock = Lock()
+
+    def to_dict(self):
+        return {
+            'upload_id': self.upload_id,
+            'folder': self.folder,
+            'filename': self.filename,
+            'size': self.size,
+            'offset': self.offset,
+            'status': self.status,
+            'error': self.error,
+            'result': self.result
+        }
+
+    def save_metadata(self):
+        """Сохраняет параметры загрузки рядом с временным файлом"""
+        process = self.process
+        if process is not None:
+            process = {key: value for key, value in process.items() if key not in SECRET_PROCESS_OPTIONS}
+        metadata = {
+            'user_id': self.user_id,
+            'folder': self.folder,
+            'filename': self.filename,
+            'size': self.size,
+            'checksum': self.checksum,
+            'process': process
+        }
+        with open(self.metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, metadata_path, upload_id):
+        """
+        Восстанавливает загрузку после перезапуска: смещение - размер временного
+        файла, хеш пересчитывается по уже записанной части
+
+        Returns:
+            Upload: Загрузка или None, если файлы загрузки повреждены
+        """
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            upload = cls(metadata['user_id'], metadata['folder'], metadata['filename'], metadata['size'],
+                         metadata.get('checksum'), metadata.get('process'), upload_id)
+            with open(upload.partial_path, 'rb') as f:
+                while True:
+                    block = f.read(UPLOAD_READ_SIZE)
+                    if not block:
+                        break
+                    upload.hasher.update(block)
+                    upload.offset += len(block)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            get_app_logger().warning(f"Не удалось восстановить загрузку {upload_id}: {e}")
+            return None
+        if upload.offset > upload.size:
+            return None
+        return upload
+
+class UploadManager:
+    """
+    Загрузки частями и очередь перевода загруженных файлов
+    """
+
+    def __init__(self, max_bytes, workers=2, expire_seconds=24 * 3600):
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.expire_seconds = expire_seconds
+        self._uploads = {}
+        self._lock = Lock()
+        self._pool = None
+        self._swept_at = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='upload')
+            atexit.register(self._pool.shutdown, wait=False, cancel_futures=True)
+        return self._pool
+
+    def create(self, user_id, folder, filename, size, checksum=None, process=None):
+        """
+        Создает загрузку и пустой временный файл в папке books пользователя
+
+        Args:
+            user_id: ID пользователя
+            folder: Папка манги
+            filename: Имя файла изображения
+            size: Размер файла в байтах
+            checksum: SHA-256 всего файла (hex) для проверки после загрузки
+            process: Параметры перевода (None - файл только сохраняется)
+
+        Returns:
+            Upload: Загрузка
+
+        Raises:
+            UploadError: Если параметры загрузки недопустимы или файл с таким
+                именем уже есть или загружается (409)
+        """
+        validate_upload_name(folder, "папки")
+        validate_upload_name(filename, "файла")
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            raise UploadError(f"Неподдерживаемый тип файла: {filename}")
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("Некорректный размер файла")
+        if size > self.max_bytes:
+            raise UploadError("Файл превышает максимальный размер загрузки", 413)
+        if checksum is not None:
+            checksum = str(checksum).lower()
+            if not SHA256_PATTERN.match(checksum):
+                raise UploadError("Контрольная сумма должна быть SHA-256 в hex")
+        if process is not None:
+            process = {key: process[key] for key in PROCESS_OPTIONS if process.get(key)}
+
+        self.expire()
+        upload = Upload(user_id, folder, filename, size, checksum, process)
+        with self._lock:
+            if os.path.exists(upload.path) or self._is_claimed(upload.path):
+                raise UploadError(f"Файл {folder}/{filename} уже существует", 409)
+            os.makedirs(os.path.dirname(upload.partial_path), exist_ok=True)
+            open(upload.partial_path, 'wb').close()
+            upload.save_metadata()
+            self._uploads[upload.upload_id] = upload
+        get_app_logger().info(f"Загрузка {upload.upload_id}: {folder}/{filename}, {size} байт")
+        return upload
+
+    def _is_claimed(self, path):
+        """Проверяет, загружается ли уже файл по этому пути. Вызывается под self._lock"""
+        return any(upload.path == path and upload.status in ('uploading', 'processing')
+                   for upload in self._uploads.values())
+
+    def get(self, upload_id, user_id):
+        """
+        Возвращает загрузку; если ее нет в памяти (сервер перезапускался),
+        восстанавливает ее по файлу параметров в папке books пользователя
+
+        Returns:
+            Upload: Загрузка пользователя
+
+        Raises:
+            UploadError: Если загрузка не найдена
+        """
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+        if upload is None:
+            upload = self._restore(upload_id, user_id)
+        if upload is None or upload.user_id != user_id:
+            raise UploadError("Загрузка не найдена", 404)
+        return upload
+
+    def _restore(self, upload_id, user_id):
+        """
+        Returns:
+            Upload: Восстановленная загрузка или None
+        """
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            return None
+        books_dir = get_user_directory(user_id, "books")
+        metadata_name = f"{PARTIAL_PREFIX}{upload_id}{METADATA_SUFFIX}"
+        try:
+            folders = [entry.path for entry in os.scandir(books_dir) if entry.is_dir()]
+        except FileNotFoundError:
+            return None
+        for folder_path in folders:
+            metadata_path = os.path.join(folder_path, metadata_name)
+            if not os.path.exists(metadata_path):
+                continue
+            upload = Upload.load(metadata_path, upload_id)
+            if upload is None or upload.user_id != user_id:
+                return None
+            with self._lock:
+                # Другой запрос мог восстановить загрузку раньше
+                upload = self._uploads.setdefault(upload_id, upload)
+            get_app_logger().info(f"Загрузка {upload_id} восстановлена со смещения {upload.offset}")
+            return upload
+        return None
+
+    def write_chunk(self, upload, offset, stream, chunk_checksum=None):
+        """
+        Дописывает часть файла из потока запроса. Если часть не дошла целиком
+        или не совпала контрольная сумма, файл обрезается до прежнего смещения
+
+        Args:
+            upload: Загрузка
+            offset: Смещение части, должно совпадать с уже загруженным размером
+            stream: Поток с содержимым части
+            chunk_checksum: Результат parse_chunk_checksum или None
+
+        Returns:
+            Upload: Загрузка с новым смещением
+
+        Raises:
+            UploadError: При неверном смещении, превышении размера или несовпадении суммы
+        """
+        if not upload.lock.acquire(blocking=False):
+            raise UploadError("Часть этой загрузки уже передается", 409)
+        try:
+            if upload.status != 'uploading':
+                raise UploadError("Загрузка уже завершена", 409)
+            if offset != upload.offset:
+                raise UploadError(f"Неверное смещение: ожидалось {upload.offset}", 409)
+
+            hasher = upload.hasher.copy()
+            chunk_hasher = hashlib.new(chunk_checksum[0]) if chunk_checksum else None
+            written = 0
+            with open(upload.partial_path, 'r+b') as f:
+                f.seek(offset)
+                try:
+                    while True:
+                        block = stream.read(UPLOAD_READ_SIZE)
+                        if not block:
+                            break
+                        written += len(block)
+                        if offset + written > upload.size:
+                            raise UploadError("Часть выходит за объявленный размер файла", 413)
+                        f.write(block)
+                        hasher.update(block)
+                        if chunk_hasher is not None:
+                            chunk_hasher.update(block)
+                    if chunk_hasher is not None and chunk_hasher.digest() != chunk_checksum[1]:
+                        raise UploadError("Контрольная сумма части не совпадает", 460)
+                except BaseException:
+                    f.truncate(offset)
+                    raise
+
+            upload.offset += written
+            upload.hasher = hasher
+            upload.updated_at = time.time()
+            if upload.offset == upload.size:
+                self._complete(upload)
+            return upload
+        finally:
+            upload.lock.release()
+
+    def _complete(self, upload):
+        """Проверяет файл, переносит его на место и ставит в очередь перевода"""
+        logger = get_app_logger()
+        if upload.checksum is not None and upload.hasher.hexdigest() != upload.checksum:
+            self._remove_partial(upload)
+            upload.status, upload.error = 'error', "Контрольная сумма файла не совпадает"
+            raise UploadError(upload.error, 460)
+
+        if os.path.exists(upload.path):
+            # Файл мог появиться, пока шла загрузка: не перезаписываем его
+            self._remove_partial(upload)
+            upload.status, upload.error = 'error', f"Файл {upload.folder}/{upload.filename} уже существует"
+            raise UploadError(upload.error, 409)
+
+        os.replace(upload.partial_path, upload.path)
+        self._remove_metadata(upload)
+        logger.info(f"Загрузка {upload.upload_id} завершена: {upload.path}")
+        schedule_user_thumbnails(upload.user_id, upload.path)
+        update_library_index(upload.user_id, upload.path)
+
+        if upload.process is None:
+            upload.status = 'done'
+            return
+        upload.status = 'processing'
+        self._get_pool().submit(self._process, upload)
+
+    def _process(self, upload):
+        """Переводит загруженный файл. Выполняется в пуле потоков"""
+        # Импорт здесь: конвейер обработки загружает модели
+        from backend.file_utils.processing import process_single_image
+        from backend.models import get_optimal_ocr_engine
+
+        logger = get_app_logger()
+        options = upload.process
+        source_language = options.get('source_language', 'zh')
+        translated_folder = os.path.join(get_user_directory(upload.user_id, "translated"), upload.folder)
+        os.makedirs(translated_folder, exist_ok=True)
+        temp_path = None
+        try:
+            temp_path, file_result = process_single_image(
+                upload.path,
+                options.get('translation_method', 'google'),
+                options.get('openai_api_key', ''),
+                get_optimal_ocr_engine(source_language),
+                translated_folder,
+                source_language=source_language,
+                target_language=options.get('target_language', 'ru'),
+                user_id=upload.user_id,
+                inpaint_method=options.get('inpaint_method') or get_settings().inpaint_method,
+                # Файлы одной папки переводятся как одна глава
+                chapter_id=f"upload_{upload.user_id}_{options.get('chapter') or upload.folder}"
+            )
+            if file_result.get('error'):
+                upload.status, upload.error = 'error', file_result.get('error_message', 'Неизвестная ошибка')
+            else:
+                upload.status = 'done'
+                upload.result = {'image_path': file_result['image_path']}
+        except Exception as e:
+            logger.error(f"Ошибка перевода загруженного файла {upload.path}: {e}")
+            upload.status, upload.error = 'error', str(e)
+        finally:
+            upload.updated_at = time.time()
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def cancel(self, upload):
+        """Отменяет загрузку и удаляет временный файл"""
+        with upload.lock:
+            if upload.status == 'uploading':
+                self._remove_partial(upload)
+                upload.status = 'cancelled'
+        with self._lock:
+            self._uploads.pop(upload.upload_id, None)
+
+    @staticmethod
+    def _remove_metadata(upload):
+        try:
+            os.remove(upload.metadata_path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def _remove_partial(cls, upload):
+        try:
+            os.remove(upload.partial_path)
+        except FileNotFoundError:
+            pass
+        cls._remove_metadata(upload)
+
+    def expire(self):
+        """
+        Удаляет загрузки, которые не обновлялись дольше времени хранения,
+        и брошенные временные файлы, оставшиеся на диске после перезапуска
+        """
+        deadline = time.time() - self.expire_seconds
+        with self._lock:
+            expired = [upload for upload in self._uploads.values()
+                       if upload.updated_at < deadline and upload.status != 'processing']
+            for upload in expired:
+                del self._uploads[upload.upload_id]
+        for upload in expired:
+            if upload.status == 'uploading' and upload.lock.acquire(blocking=False):
+                try:
+                    self._remove_partial(upload)
+                    upload.status = 'cancelled'
+                finally:
+                    upload.lock.release()
+        # Обход всех папок пользователей - не чаще раза в час
+        if self._swept_at < time.time() - 3600:
+            self._swept_at = time.time()
+            self._sweep_partials(deadline)
+
+    def _sweep_partials(self, deadline):
+        """
+        Удаляет временные файлы загрузок, которых нет в памяти и которые
+        не изменялись с момента deadline
+
+        Args:
+            deadline: Время (timestamp), раньше которого файл считается брошенным
+        """
+        users_dir = os.path.join(get_settings().data_dir, "users")
+        if not os.path.isdir(users_dir):
+            return
+        with self._lock:
+            active = set(self._uploads)
+        removed = 0
+        for user_entry in os.scandir(users_dir):
+            books_dir = os.path.join(user_entry.path, "books")
+            if not user_entry.is_dir() or not os.path.isdir(books_dir):
+                continue
+            for folder_entry in os.scandir(books_dir):
+                if not folder_entry.is_dir():
+                    continue
+                for entry in os.scandir(folder_entry.path):
+                    if not entry.name.startswith(PARTIAL_PREFIX):
+                        continue
+                    upload_id = entry.name[len(PARTIAL_PREFIX):]
+                    if upload_id.endswith(METADATA_SUFFIX):
+                        upload_id = upload_id[:-len(METADATA_SUFFIX)]
+                    if upload_id in active:
+                        continue
+                    # Время последней записи - у самого временного файла
+                    partial_path = os.path.join(folder_entry.path, f"{PARTIAL_PREFIX}{upload_id}")
+                    try:
+                        modified = os.path.getmtime(partial_path if os.path.exists(partial_path) else entry.path)
+                        if modified < deadline:
+                            os.remove(entry.path)
+                            removed += 1
+                    except OSError:
+                        pass
+        if removed:
+            get_app_logger().info(f"Удалено брошенных временных файлов загрузок: {removed}")
+
+# Глобальный менеджер загрузок
+upload_manager = None
+
+def get_upload_manager():
+    """
+    Возвращает менеджер загрузок с параметрами из настроек
+
+    Returns:
+        UploadManager: Менеджер
+    """
+    global upload_manager
+    if upload_manager is None:
+        settings = get_settings()
+        upload_manager = UploadManager(settings.upload_max_mb * 1024 * 1024, settings.upload_workers,
+                                       settings.upload_expire_hours * 3600)
+    return upload_manager
\ No newline at end of file
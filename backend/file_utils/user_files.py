@@ -5,6 +5,7 @@ import os
 import shutil
 from backend.config import get_settings
 from backend.logger import get_app_logger
+from backend.file_utils.thumbnails import get_thumbnail_generator
 
 def get_user_directory(user_id, dir_type="books"):
     """
@@ -119,6 +120,10 @@ def save_file(file, user_id, dir_type="books", filename=None):
     
     logger.debug(f"Файл сохранен для пользователя {user_id}: {dest_path}")
     
+    if dir_type == "books":
+        schedule_user_thumbnails(user_id, dest_path)
+        update_library_index(user_id, dest_path)
+    
     return dest_path
 
 def copy_file(source_path, user_id, dir_type="books", filename=None):
@@ -154,8 +159,46 @@ def copy_file(source_path, user_id, dir_type="books", filename=None):
     shutil.copy2(source_path, dest_path)
     logger.debug(f"Файл скопирован для пользователя {user_id}: {dest_path}")
     
+    if dir_type == "books":
+        schedule_user_thumbnails(user_id, dest_path)
+        update_library_index(user_id, dest_path)
+    
     return dest_path
 
+def schedule_user_thumbnails(user_id, file_path):
+    """
+    Ставит в очередь создание миниатюр изображения из директории books пользователя
+    
+    Args:
+        user_id: ID пользователя
+        file_path: Путь к изображению
+        
+    Returns:
+        Future: Задача генерации или None
+    """
+    books_dir = get_user_directory(user_id, "books")
+    folder = os.path.relpath(os.path.dirname(os.path.abspath(file_path)), os.path.abspath(books_dir))
+    try:
+        return get_thumbnail_generator().schedule(file_path, get_user_directory(user_id, "thumbnails"), folder)
+    except Exception as e:
+        get_app_logger().error(f"Ошибка при постановке миниатюр {file_path} в очередь: {e}")
+        return None
+
+def update_library_index(user_id, file_path):
+    """
+    Добавляет сохраненное изображение в индекс библиотеки пользователя
+    
+    Args:
+        user_id: ID пользователя
+        file_path: Путь к изображению
+    """
+    # Импорт здесь: индекс библиотеки сам использует функции этого модуля
+    from backend.file_utils.library import get_library_index
+    try:
+        get_library_index(user_id).add_file(file_path)
+    except Exception as e:
+        get_app_logger().error(f"Ошибка при обновлении индекса библиотеки для {file_path}: {e}")
+
 def list_files(user_id, dir_type="books", extension=None):
     """
     Получает список файлов в директории пользователя
@@ -0,0 +1,100 @@
+"""
+Версии файлов по содержимому
+
+Версия - короткий хеш содержимого файла. Она добавляется к URL миниатюр
+и изображений редактора (параметр v), поэтому браузер может хранить такие
+ответы бессрочно: измененный файл получает новый URL. Хеши запоминаются
+по размеру и времени изменения файла и не пересчитываются без необходимости
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from threading import Lock
+
+# Количество файлов, версии которых хранятся в памяти
+VERSION_CACHE_SIZE = 20000
+
+class FileVersions:
+    """
+    Хеши содержимого файлов с вытеснением давно не использованных
+    """
+
+    def __init__(self, max_files=VERSION_CACHE_SIZE):
+        self.max_files = max_files
+        self._versions = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.blake2b(digest_size=8)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, path):
+        """
+        Возвращает версию файла
+
+        Args:
+            path: Путь к файлу
+
+        Returns:
+            str: Хеш содержимого или None, если файла нет
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = os.path.abspath(path)
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            cached = self._versions.get(key)
+            if cached is not None and cached[0] == fingerprint:
+                self._versions.move_to_end(key)
+                return cached[1]
+
+        try:
+            version = self._hash_file(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            self._versions[key] = (fingerprint, version)
+            self._versions.move_to_end(key)
+            while len(self._versions) > self.max_files:
+                self._versions.popitem(last=False)
+        return version
+
+# Глобальный кеш версий файлов
+file_versions = FileVersions()
+
+def get_file_version(path):
+    """
+    Возвращает версию (хеш содержимого) файла
+
+    Args:
+        path: Путь к файлу
+
+    Returns:
+        str: Версия или None, если файла нет
+    """
+    return file_versions.get(path)
+
+def versioned_url(url, path):
+    """
+    Добавляет к URL версию файла
+
+    Args:
+        url: URL файла
+        path: Путь к файлу на диске
+
+    Returns:
+        str: URL с параметром v или исходный URL, если файла еще нет
+    """
+    version = get_file_version(path)
+    if version is None:
+        return url
+    separator = '&' if '?' in url else '?'
+    return f"{url}{separator}v={version}"
\ No newline at end of file
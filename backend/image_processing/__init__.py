@@ -2,6 +2,7 @@
 Модуль для обработки изображений манги и рендеринга текста
 """
 
-from .utils import image_to_base64, save_debug_image
-from .text_rendering import draw_wrapped_text, create_translated_image
-from .masking import create_bubble_mask, create_text_background_mask
\ No newline at end of file
+from .utils import image_to_base64, save_debug_image, save_image, file_to_base64
+from .text_rendering import draw_wrapped_text, create_translated_image, remove_text, render_text_blocks, get_font
+from .masking import create_bubble_mask, create_text_background_mask
+from .inpainting import inpaint_regions, get_inpaint_backend, get_inpaint_stats, INPAINT_BACKENDS, INPAINT_MODES
\ No newline at end of file
@@ -0,0 +1,426 @@
+"""
+Функции для удаления текста с фона (inpainting) по отдельным областям маски
+"""
+import atexit
+import os
+import time
+import concurrent.futures
+from threading import Lock
+import cv2
+import numpy as np
+
+# Радиус inpainting и отступ вокруг области маски.
+# Отступ должен покрывать радиус inpainting и размытие границ,
+# чтобы результат внутри ROI совпадал с обработкой всего изображения
+INPAINT_RADIUS = 7
+ROI_PADDING = 2 * INPAINT_RADIUS + 4
+
+# Порог яркости, ниже которого фон считается темным
+DARK_BACKGROUND_THRESHOLD = 60
+
+# Цвет заливки для темного фона
+DARK_FILL_VALUE = 5
+
+# Режимы выбора метода для каждой области
+INPAINT_MODES = ('fast', 'quality')
+
+# Площадь области (в пикселях маски), до которой область считается мелкой
+SMALL_REGION_AREA = 2500
+
+class InpaintBackend:
+    """
+    Базовый класс метода удаления текста внутри ROI
+    """
+    name = None
+    
+    def is_available(self):
+        """
+        Проверяет, может ли метод использоваться в текущем окружении
+        
+        Returns:
+            bool: True, если метод доступен
+        """
+        return True
+    
+    def inpaint(self, roi, text_mask):
+        """
+        Удаляет текст во фрагменте изображения
+        
+        Args:
+            roi: Фрагмент изображения (numpy.ndarray), не изменяется
+            text_mask: Маска текста внутри фрагмента (uint8, 0/255)
+            
+        Returns:
+            numpy.ndarray: Фрагмент с удаленным текстом
+        """
+        raise NotImplementedError
+
+class WhiteFillBackend(InpaintBackend):
+    """Заливка текста белым цветом (как для пузырей)"""
+    name = 'white'
+    
+    def inpaint(self, roi, text_mask):
+        patch = roi.copy()
+        patch[text_mask > 0] = 255
+        return patch
+
+class LocalMedianBackend(InpaintBackend):
+    """Заливка текста медианным цветом окружающей области ROI"""
+    name = 'median'
+    
+    def inpaint(self, roi, text_mask):
+        patch = roi.copy()
+        surrounding = roi[text_mask == 0]
+        if surrounding.size > 0:
+            patch[text_mask > 0] = np.median(surrounding, axis=0)
+        return patch
+
+class OpenCVInpaintBackend(InpaintBackend):
+    """Inpainting средствами OpenCV"""
+    flags = None
+    
+    def inpaint(self, roi, text_mask):
+        return cv2.inpaint(np.ascontiguousarray(roi), text_mask, inpaintRadius=INPAINT_RADIUS, flags=self.flags)
+
+class TeleaBackend(OpenCVInpaintBackend):
+    """Быстрый inpainting методом Telea"""
+    name = 'telea'
+    flags = cv2.INPAINT_TELEA
+
+class NSBackend(OpenCVInpaintBackend):
+    """Inpainting методом Навье-Стокса"""
+    name = 'ns'
+    flags = cv2.INPAINT_NS
+
+class LamaOnnxBackend(InpaintBackend):
+    """
+    Inpainting нейросетью LaMa, экспортированной в ONNX (CPU).
+    Требует установленного onnxruntime и файла модели
+    """
+    name = 'lama'
+    input_size = 512
+    
+    def __init__(self, model_path=None):
+        self.model_path = model_path
+        self._session = None
+        self._load_failed = False
+        self._lock = Lock()
+    
+    def _get_model_path(self):
+        if self.model_path:
+            return self.model_path
+        from backend.config import get_settings
+        return get_settings().lama_model_path
+    
+    def _get_session(self):
+        # Модель загружается один раз при первом использовании
+        with self._lock:
+            if self._session is None and not self._load_failed:
+                try:
+                    import onnxruntime
+                    model_path = self._get_model_path()
+                    self._session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+                    print(f"Загружена модель LaMa: {model_path}")
+                except Exception as e:
+                    self._load_failed = True
+                    print(f"Модель LaMa недоступна: {e}")
+            return self._session
+    
+    def is_available(self):
+        if self._session is not None:
+            return True
+        if self._load_failed:
+            return False
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            return False
+        return os.path.exists(self._get_model_path())
+    
+    def inpaint(self, roi, text_mask):
+        session = self._get_session()
+        if session is None:
+            raise RuntimeError("Модель LaMa не загружена")
+        
+        roi_h, roi_w = roi.shape[:2]
+        rgb = roi if roi.ndim == 3 else cv2.cvtColor(roi, cv2.COLOR_GRAY2RGB)
+        rgb = np.ascontiguousarray(rgb[:, :, :3])
+        
+        size = (self.input_size, self.input_size)
+        image = cv2.resize(rgb, size, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+        mask = (cv2.resize(text_mask, size, interpolation=cv2.INTER_NEAREST) > 0).astype(np.float32)
+        
+        inputs = session.get_inputs()
+        feed = {
+            inputs[0].name: image.transpose(2, 0, 1)[np.newaxis],
+            inputs[1].name: mask[np.newaxis, np.newaxis]
+        }
+        output = session.run(None, feed)[0][0].transpose(1, 2, 0)
+        
+        # Модели разных экспортов возвращают значения в [0, 1] или [0, 255]
+        if output.max() <= 1.0:
+            output = output * 255.0
+        output = cv2.resize(np.clip(output, 0, 255).astype(np.uint8), (roi_w, roi_h), interpolation=cv2.INTER_CUBIC)
+        
+        patch = roi.copy()
+        if roi.ndim == 3:
+            patch[:, :, :3][text_mask > 0] = output[text_mask > 0]
+        else:
+            patch[text_mask > 0] = cv2.cvtColor(output, cv2.COLOR_RGB2GRAY)[text_mask > 0]
+        return patch
+
+# Зарегистрированные методы удаления текста
+INPAINT_BACKENDS = {
+    backend.name: backend
+    for backend in (WhiteFillBackend(), LocalMedianBackend(), TeleaBackend(), NSBackend(), LamaOnnxBackend())
+}
+
+def get_inpaint_backend(name):
+    """
+    Возвращает метод удаления текста по имени
+    
+    Args:
+        name: Имя метода ('white', 'median', 'telea', 'ns', 'lama')
+        
+    Returns:
+        InpaintBackend: Метод удаления текста
+    """
+    if name not in INPAINT_BACKENDS:
+        raise ValueError(f"Неизвестный метод удаления текста: {name}")
+    return INPAINT_BACKENDS[name]
+
+def select_inpaint_backend(method, area):
+    """
+    Выбирает метод удаления текста для области в зависимости от режима и площади маски
+    
+    Args:
+        method: Режим ('fast', 'quality') или имя конкретного метода
+        area: Площадь маски области в пикселях
+        
+    Returns:
+        InpaintBackend: Метод удаления текста
+    """
+    if method == 'quality':
+        # Мелкие области NS восстанавливает не хуже нейросети и намного быстрее
+        if area > SMALL_REGION_AREA and INPAINT_BACKENDS['lama'].is_available():
+            return INPAINT_BACKENDS['lama']
+        return INPAINT_BACKENDS['ns']
+    if method == 'fast':
+        if area <= SMALL_REGION_AREA:
+            return INPAINT_BACKENDS['median']
+        return INPAINT_BACKENDS['telea']
+    
+    backend = get_inpaint_backend(method)
+    if not backend.is_available():
+        print(f"Метод {method} недоступен, используется ns")
+        return INPAINT_BACKENDS['ns']
+    return backend
+
+# Накопленная статистика времени работы методов: {имя: {'regions', 'area', 'seconds'}}
+inpaint_stats = {}
+inpaint_stats_lock = Lock()
+
+def _record_inpaint_stats(stats):
+    with inpaint_stats_lock:
+        for name, values in stats.items():
+            total = inpaint_stats.setdefault(name, {'regions': 0, 'area': 0, 'seconds': 0.0})
+            for key, value in values.items():
+                total[key] += value
+
+def get_inpaint_stats():
+    """
+    Возвращает накопленную статистику по методам удаления текста
+    
+    Returns:
+        dict: {имя метода: {'regions': ..., 'area': ..., 'seconds': ...}}
+    """
+    with inpaint_stats_lock:
+        return {name: values.copy() for name, values in inpaint_stats.items()}
+
+def find_mask_regions(mask, padding=ROI_PADDING):
+    """
+    Разбивает маску на связные области и возвращает для каждой ROI с отступом
+
+    Args:
+        mask: Маска текстовых блоков (numpy.ndarray, 2D)
+        padding: Отступ вокруг области в пикселях
+
+    Returns:
+        list: Список кортежей ((x1, y1, x2, y2), маска области внутри ROI)
+    """
+    binary = (mask > 0).astype(np.uint8)
+    img_h, img_w = binary.shape[:2]
+
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+    regions = []
+    for label in range(1, num_labels):
+        x, y, w, h = (int(v) for v in stats[label, :4])
+        x1 = max(0, x - padding)
+        y1 = max(0, y - padding)
+        x2 = min(img_w, x + w + padding)
+        y2 = min(img_h, y + h + padding)
+
+        region_mask = (labels[y1:y2, x1:x2] == label).astype(np.uint8) * 255
+        regions.append(((x1, y1, x2, y2), region_mask))
+
+    return regions
+
+def is_dark_region(roi, region_mask):
+    """
+    Определяет по локальной статистике, является ли фон области темным
+
+    Args:
+        roi: Фрагмент изображения вокруг области
+        region_mask: Маска области внутри фрагмента
+
+    Returns:
+        tuple: (темный ли фон, средняя яркость или None)
+    """
+    # Темный фон обрабатывается отдельно только для черно-белых фрагментов
+    if roi.ndim == 3:
+        if roi.shape[2] < 3:
+            return False, None
+        channels = roi[:, :, :3].astype(np.int16)
+        if (np.abs(channels[:, :, 0] - channels[:, :, 1]).max() > 10 or
+                np.abs(channels[:, :, 1] - channels[:, :, 2]).max() > 10):
+            return False, None
+        gray = cv2.cvtColor(np.ascontiguousarray(roi[:, :, :3]), cv2.COLOR_BGR2GRAY)
+    else:
+        gray = roi
+
+    # Анализируем область вокруг текста
+    background_region = cv2.dilate(region_mask, np.ones((5, 5), np.uint8), iterations=1) > 0
+    if not np.any(background_region):
+        return False, None
+
+    bg_brightness = float(np.mean(gray[background_region]))
+    return bg_brightness < DARK_BACKGROUND_THRESHOLD, bg_brightness
+
+def inpaint_region(image, box, region_mask, method='fast'):
+    """
+    Удаляет текст в одной области изображения
+    
+    Args:
+        image: Исходное изображение (numpy.ndarray), не изменяется
+        box: Координаты ROI (x1, y1, x2, y2)
+        region_mask: Маска области внутри ROI
+        method: Режим ('fast', 'quality') или имя конкретного метода
+        
+    Returns:
+        dict: Результат обработки области с ключами 'box', 'patch', 'write_mask', 'is_dark',
+              'backend', 'area', 'seconds'
+    """
+    start_time = time.time()
+    x1, y1, x2, y2 = box
+    roi = image[y1:y2, x1:x2]
+    
+    # Расширяем маску для захвата полутонов и деталей символов
+    enhanced_mask = cv2.dilate(region_mask, np.ones((2, 2), np.uint8), iterations=1)
+    text_mask = (enhanced_mask > 0).astype(np.uint8) * 255
+    area = int(np.count_nonzero(text_mask))
+    
+    # Темный фон заливается напрямую, если метод не задан явно
+    is_dark = False
+    if method in INPAINT_MODES:
+        is_dark, _ = is_dark_region(roi, enhanced_mask)
+    
+    if is_dark:
+        backend_name = 'dark_fill'
+        # Прямая заливка с размытием границ для естественности
+        blurred_mask = cv2.GaussianBlur((enhanced_mask > 0).astype(np.float32), (5, 5), 0)
+        if roi.ndim == 3:
+            blurred_mask = blurred_mask[:, :, np.newaxis]
+        patch = (roi * (1 - blurred_mask) + DARK_FILL_VALUE * blurred_mask).astype(roi.dtype)
+        write_mask = blurred_mask.reshape(blurred_mask.shape[:2]) > 0
+    else:
+        backend = select_inpaint_backend(method, area)
+        backend_name = backend.name
+        try:
+            patch = backend.inpaint(roi, text_mask)
+        except Exception as e:
+            print(f"Ошибка метода удаления текста {backend.name}: {e}")
+            # Заполняем текст медианным цветом окружающей области
+            backend_name = 'median'
+            patch = INPAINT_BACKENDS['median'].inpaint(roi, text_mask)
+        write_mask = text_mask > 0
+    
+    return {
+        'box': box,
+        'patch': patch,
+        'write_mask': write_mask,
+        'is_dark': is_dark,
+        'backend': backend_name,
+        'area': area,
+        'seconds': time.time() - start_time
+    }
+
+# Общий пул потоков для областей всех страниц
+inpaint_pool = None
+inpaint_pool_lock = Lock()
+
+def get_inpaint_pool():
+    """
+    Возвращает пул потоков для обработки областей. Пул общий для всех страниц,
+    которые обрабатываются параллельно, поэтому число потоков OpenCV не растет
+    с числом страниц. Размер задается настройкой inpaint_workers (0 - по числу ядер)
+
+    Returns:
+        ThreadPoolExecutor: Пул потоков
+    """
+    global inpaint_pool
+    with inpaint_pool_lock:
+        if inpaint_pool is None:
+            from backend.config import get_settings
+            workers = get_settings().inpaint_workers or os.cpu_count() or 1
+            inpaint_pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inpaint')
+            atexit.register(inpaint_pool.shutdown, wait=False, cancel_futures=True)
+        return inpaint_pool
+
+def inpaint_regions(image, mask, method='fast', parallel=True):
+    """
+    Удаляет текст по маске, обрабатывая каждую связную область в своей ROI параллельно
+
+    Args:
+        image: Изображение (numpy.ndarray), изменяется на месте
+        mask: Маска текстовых блоков
+        method: Режим ('fast', 'quality') или имя конкретного метода
+            ('white', 'median', 'telea', 'ns', 'lama')
+        parallel: Обрабатывать области в общем пуле потоков (get_inpaint_pool)
+
+    Returns:
+        list: Координаты ROI областей с темным фоном [(x1, y1, x2, y2), ...]
+    """
+    regions = find_mask_regions(mask)
+    if not regions:
+        return []
+
+    # Все области читают неизменную копию, поэтому перекрывающиеся ROI
+    # обрабатываются независимо и результат не зависит от порядка
+    source = image.copy()
+
+    if not parallel or len(regions) == 1:
+        results = [inpaint_region(source, box, region_mask, method) for box, region_mask in regions]
+    else:
+        # OpenCV освобождает GIL, поэтому потоки дают реальный параллелизм
+        results = list(get_inpaint_pool().map(lambda region: inpaint_region(source, *region, method), regions))
+
+    dark_boxes = []
+    stats = {}
+    for result in results:
+        x1, y1, x2, y2 = result['box']
+        write_mask = result['write_mask']
+        image[y1:y2, x1:x2][write_mask] = result['patch'][write_mask]
+        if result['is_dark']:
+            dark_boxes.append(result['box'])
+        
+        backend_stats = stats.setdefault(result['backend'], {'regions': 0, 'area': 0, 'seconds': 0.0})
+        backend_stats['regions'] += 1
+        backend_stats['area'] += result['area']
+        backend_stats['seconds'] += result['seconds']
+    
+    _record_inpaint_stats(stats)
+    
+    summary = ", ".join(f"{name}: {values['regions']} обл. за {values['seconds']:.3f} с" for name, values in stats.items())
+    print(f"Обработано {len(results)} областей текста (режим {method}): {summary}")
+    return dark_boxes
\ No newline at end of file
@@ -1,172 +1,298 @@
 """
 Функции для рендеринга текста на изображениях
+
+Единый движок рендеринга для конвейера перевода и редактора:
+кэшированная загрузка шрифтов, кэшированная раскладка текста по строкам
+и отрисовка блоков с учетом стилей
 """
-import os
 import re
-import cv2
+import functools
 import numpy as np
 from PIL import Image as PILImage, ImageDraw, ImageFont
+from .inpainting import inpaint_regions
+
+# Пути к шрифтам для разных стилей (первый найденный используется)
+FONT_PATHS = {
+    'normal': ["data/fonts/anime-ace-v02.ttf", "arial.ttf", "C:/Windows/Fonts/Arial.ttf", "C:/Windows/Fonts/Calibri.ttf"],
+    'bold': ["data/fonts/anime-ace-bb.ttf", "C:/Windows/Fonts/Arialbd.ttf", "C:/Windows/Fonts/Calibrib.ttf"],
+    'italic': ["data/fonts/anime-ace-it.ttf", "C:/Windows/Fonts/Ariali.ttf", "C:/Windows/Fonts/Calibrii.ttf"],
+    'bold_italic': ["data/fonts/anime-ace-bb-it.ttf", "C:/Windows/Fonts/Arialbi.ttf", "C:/Windows/Fonts/Calibriz.ttf"]
+}
+
+# Доступные размеры шрифта (от 8 до 32 с шагом 2)
+FONT_SIZES = tuple(range(8, 33, 2))
+
+DEFAULT_FONT_SIZE = 16
 
-def get_font(size=16):
+@functools.lru_cache(maxsize=None)
+def get_font(size=DEFAULT_FONT_SIZE, font_key='normal'):
     """
-    Загружает подходящий шрифт заданного размера
-    
+    Загружает подходящий шрифт заданного размера и стиля.
+    Шрифты кэшируются и загружаются с диска один раз на процесс
+
     Args:
         size: Размер шрифта
-        
+        font_key: Стиль шрифта ('normal', 'bold', 'italic', 'bold_italic')
+
     Returns:
         PIL.ImageFont: Шрифт
     """
-    font_paths = [
-        "data/fonts/anime-ace-v02.ttf", 
-        "arial.ttf", 
-        "C:/Windows/Fonts/Arial.ttf", 
-        "C:/Windows/Fonts/Calibri.ttf"
-    ]
-    
-    for path in font_paths:
+    for path in FONT_PATHS.get(font_key, FONT_PATHS['normal']):
         try:
             font = ImageFont.truetype(path, size)
-            print(f"Используется шрифт: {path}")
+            print(f"Загружен шрифт {font_key} размера {size}: {path}")
             return font
         except Exception:
             continue
-    
-    print("Используется шрифт по умолчанию")
+
+    print(f"Используется шрифт по умолчанию для {font_key} размера {size}")
     return ImageFont.load_default()
 
-def draw_wrapped_text(draw, font, text, box, outline_strength=1):
+def resolve_style(style=None):
+    """
+    Приводит стиль блока к параметрам отрисовки
+
+    Args:
+        style: Словарь со стилями текста (font_size, font_weight, font_style, align, offset_x, offset_y)
+
+    Returns:
+        dict: Параметры отрисовки с ключами 'font', 'font_size', 'align', 'offset_x', 'offset_y'
+    """
+    if style is None:
+        style = {}
+
+    font_size = style.get('font_size', DEFAULT_FONT_SIZE)
+    font_weight = style.get('font_weight', 'normal')
+    font_style = style.get('font_style', 'normal')
+
+    # Определяем ключ для выбора шрифта
+    if font_weight == 'bold' and font_style == 'italic':
+        font_key = 'bold_italic'
+    elif font_weight == 'bold':
+        font_key = 'bold'
+    elif font_style == 'italic':
+        font_key = 'italic'
+    else:
+        font_key = 'normal'
+
+    # Выбираем ближайший доступный размер шрифта
+    closest_size = min(FONT_SIZES, key=lambda x: abs(x - font_size))
+
+    return {
+        'font': get_font(closest_size, font_key),
+        'font_size': font_size,
+        'align': style.get('align', 'center'),
+        'offset_x': style.get('offset_x', 0),
+        'offset_y': style.get('offset_y', 0)
+    }
+
+def _split_keeping_delimiters(text, pattern):
+    """
+    Разбивает текст по регулярному выражению, присоединяя разделители к предыдущим частям
+    """
+    pieces = re.split(pattern, text)
+    chunks = []
+    for i in range(0, len(pieces) - 1, 2):
+        chunks.append(pieces[i] + pieces[i + 1])
+    if len(pieces) % 2 == 1:
+        chunks.append(pieces[-1])
+    return chunks
+
+def _text_width(font, text):
+    left, top, right, bottom = font.getbbox(text)
+    return right - left
+
+@functools.lru_cache(maxsize=4096)
+def wrap_text(font, text, max_width):
+    """
+    Разбивает текст на строки, помещающиеся в заданную ширину.
+    Учитывает явные переносы строк, границы предложений и знаки препинания.
+    Результат кэшируется, так как одинаковые блоки рендерятся многократно
+    (предпросмотр, сохранение, повторные страницы)
+
+    Args:
+        font: Объект PIL.ImageFont
+        text: Текст для переноса
+        max_width: Максимальная ширина строки в пикселях
+
+    Returns:
+        tuple: Строки текста (пустая строка - разрыв между абзацами)
+    """
+    paragraphs = text.split('\n')
+    wrapped_text = []
+
+    for paragraph_index, paragraph in enumerate(paragraphs):
+        # Разбиваем на предложения, затем по знакам препинания
+        for sentence in _split_keeping_delimiters(paragraph, r'([.!?]\s+)'):
+            for part in _split_keeping_delimiters(sentence, r'([,:;]\s+)'):
+                current_line = ""
+
+                for word in part.split():
+                    test_line = current_line + " " + word if current_line else word
+
+                    if _text_width(font, test_line) <= max_width:
+                        current_line = test_line
+                    else:
+                        if current_line:
+                            wrapped_text.append(current_line)
+                        current_line = word
+
+                if current_line:
+                    wrapped_text.append(current_line)
+
+        # Добавляем пустую строку между параграфами, если не последний параграф
+        if paragraph_index < len(paragraphs) - 1:
+            wrapped_text.append("")
+
+    return tuple(wrapped_text)
+
+def draw_wrapped_text(draw, font, text, box, outline_strength=1, align='center', line_spacing=6):
     """
     Рисует текст с переносами и обводкой в указанном прямоугольнике
-    
+
     Args:
         draw: Объект PIL.ImageDraw
         font: Объект PIL.ImageFont
         text: Текст для отрисовки
         box: Границы прямоугольника (x_min, y_min, x_max, y_max)
         outline_strength: Сила обводки (1 - обычная, 2 - усиленная)
+        align: Выравнивание ('left', 'center', 'right')
+        line_spacing: Межстрочный интервал
     """
     x_min, y_min, x_max, y_max = box
     max_width = x_max - x_min - 15
-    
+
     # Получаем размеры шрифта
-    left, top, right, bottom = draw.textbbox((0, 0), 'А', font=font)
-    char_width = right - left
+    left, top, right, bottom = font.getbbox('А')
     char_height = bottom - top
-    
-    line_spacing = 6
-
-    # Разбиваем текст на предложения по точкам
-    sentences = re.split(r'([.!?]\s+)', text)
-    # Объединяем предложения с их знаками препинания
-    sentence_chunks = []
-    for i in range(0, len(sentences)-1, 2):
-        if i+1 < len(sentences):
-            sentence_chunks.append(sentences[i] + sentences[i+1])
-        else:
-            sentence_chunks.append(sentences[i])
-    if len(sentences) % 2 == 1:
-        sentence_chunks.append(sentences[-1])
-    
-    # Теперь обрабатываем каждое предложение
-    wrapped_text = []
-    
-    for sentence in sentence_chunks:
-        # Разбиваем предложение на части по знакам препинания
-        parts = re.split(r'([,:;]\s+)', sentence)
-        parts_combined = []
-        
-        for i in range(0, len(parts)-1, 2):
-            if i+1 < len(parts):
-                parts_combined.append(parts[i] + parts[i+1])
-            else:
-                parts_combined.append(parts[i])
-        if len(parts) % 2 == 1:
-            parts_combined.append(parts[-1])
-        
-        # Обрабатываем каждую часть
-        for part in parts_combined:
-            words = part.split()
-            current_line = ""
-            
-            for word in words:
-                test_line = current_line + " " + word if current_line else word
-                left, top, right, bottom = draw.textbbox((0, 0), test_line, font=font)
-                line_width = right - left
-                
-                if line_width <= max_width:
-                    current_line = test_line
-                else:
-                    if current_line:
-                        wrapped_text.append(current_line)
-                    current_line = word
-            
-            if current_line:
-                wrapped_text.append(current_line)
-    
+
+    wrapped_text = wrap_text(font, text, max_width)
+
     # Рисуем текст с переносом строк и настраиваемой обводкой
     if wrapped_text:
         text_height_total = len(wrapped_text) * (char_height + line_spacing)
         y_start = y_min + ((y_max - y_min - text_height_total) / 2)
-        
+
         for i, line in enumerate(wrapped_text):
-            left, top, right, bottom = draw.textbbox((0, 0), line, font=font)
-            text_width = right - left
-            x_pos = x_min + ((x_max - x_min - text_width) / 2)
+            if not line:  # Пропускаем пустые строки
+                continue
+
+            text_width = _text_width(font, line)
+
+            # Определяем позицию в зависимости от выравнивания
+            if align == 'left':
+                x_pos = x_min + 5  # Небольшой отступ
+            elif align == 'right':
+                x_pos = x_max - text_width - 5  # Небольшой отступ
+            else:  # center
+                x_pos = x_min + ((x_max - x_min - text_width) / 2)
+
             y_pos = y_start + (i * (char_height + line_spacing))
-            
-            # Настраиваемая обводка в зависимости от outline_strength
-            outline_pixels = []
-            
-            if outline_strength == 1:
-                # Стандартная обводка (8 направлений)
-                for dx, dy in [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]:
-                    outline_pixels.append((dx, dy))
-            else:
-                # Усиленная обводка (16 направлений, включая точки на расстоянии 2 пикселя)
-                for dx in [-2, -1, 0, 1, 2]:
-                    for dy in [-2, -1, 0, 1, 2]:
-                        if dx == 0 and dy == 0:
-                            continue
-                        if abs(dx) == 2 and abs(dy) == 2:
-                            continue  # Пропускаем диагональные точки на расстоянии 2
-                        outline_pixels.append((dx, dy))
-            
-            # Рисуем обводку
-            for dx, dy in outline_pixels:
-                draw.text((x_pos + dx, y_pos + dy), line, fill="white", font=font)
-                
-            # Основной текст черным
-            draw.text((x_pos, y_pos), line, fill="black", font=font)
-
-def create_translated_image(image_path, text_blocks, output_path, bubble_mask, text_background_mask=None):
+
+            # Черный текст с белой обводкой за одну растеризацию строки
+            # (outline_strength=1 - обводка 1 px, 2 - усиленная обводка 2 px)
+            draw.text((x_pos, y_pos), line, fill="black", font=font,
+                      stroke_width=max(1, int(outline_strength)), stroke_fill="white")
+
+def _overlaps_any(box, boxes):
     """
-    Создает переведенное изображение с учетом масок пузырей и текстовых блоков
-    
+    Проверяет, пересекается ли прямоугольник хотя бы с одним из списка
+
+    Args:
+        box: Прямоугольник (x_min, y_min, x_max, y_max)
+        boxes: Список прямоугольников
+
+    Returns:
+        bool: True, если есть пересечение
+    """
+    x_min, y_min, x_max, y_max = box
+    for bx1, by1, bx2, by2 in boxes:
+        if x_min < bx2 and bx1 < x_max and y_min < by2 and by1 < y_max:
+            return True
+    return False
+
+def render_text_blocks(img, text_blocks, dark_boxes=None):
+    """
+    Рисует переведенный текст всех блоков на изображении (изменяет изображение на месте)
+
+    Args:
+        img: Изображение PIL.Image с удаленным текстом
+        text_blocks: Список блоков текста с координатами, переводом и стилем (опционально)
+        dark_boxes: Области с темным фоном, для которых нужна усиленная обводка
+
+    Returns:
+        PIL.Image: То же изображение с текстом
+    """
+    draw = ImageDraw.Draw(img)
+    img_w, img_h = img.size
+    dark_boxes = dark_boxes or []
+
+    # Обрабатываем каждый текстовый блок
+    for block in text_blocks:
+        if not block.get('translated_text'):
+            continue
+
+        x_min, y_min, x_max, y_max = block['box']
+        text = block['translated_text'].strip()
+
+        # Проверяем корректность координат
+        if y_min < 0 or y_max > img_h or x_min < 0 or x_max > img_w:
+            # Корректируем координаты
+            x_min = max(0, min(x_min, img_w-1))
+            y_min = max(0, min(y_min, img_h-1))
+            x_max = max(0, min(x_max, img_w-1))
+            y_max = max(0, min(y_max, img_h-1))
+
+        # Усиленная обводка для блоков, попадающих на области с темным фоном
+        outline_strength = 2 if _overlaps_any((x_min, y_min, x_max, y_max), dark_boxes) else 1
+
+        # Получаем стиль блока или используем значения по умолчанию
+        params = resolve_style(block.get('style'))
+        offset_x = params['offset_x']
+        offset_y = params['offset_y']
+
+        draw_wrapped_text(
+            draw,
+            params['font'],
+            text,
+            (x_min + offset_x, y_min + offset_y, x_max + offset_x, y_max + offset_y),
+            outline_strength,
+            align=params['align'],
+            # Межстрочный интервал зависит от размера шрифта
+            line_spacing=max(6, int(params['font_size'] * 0.3))
+        )
+
+    return img
+
+def remove_text(image_path, bubble_mask, text_background_mask=None, inpaint_method=None):
+    """
+    Удаляет исходный текст с изображения: пузыри закрашиваются белым,
+    текст на фоне удаляется выбранным методом inpainting
+
     Args:
         image_path: Путь к исходному изображению
-        text_blocks: Список блоков текста с координатами и переводом
-        output_path: Путь для сохранения результата
         bubble_mask: Маска пузырей
         text_background_mask: Маска текстовых блоков (опционально)
-        
+        inpaint_method: Метод удаления текста на фоне ('fast', 'quality', 'white', 'median',
+            'telea', 'ns', 'lama'); по умолчанию берется из настроек
+
     Returns:
-        str: Путь к созданному изображению
+        tuple: (изображение без текста PIL.Image, области с темным фоном)
     """
-    print("Создание изображения с переводом...")
     img = PILImage.open(image_path)
     img_np = np.array(img)
     img_h, img_w = img_np.shape[:2]
-    
+
     translated_np = img_np.copy()
-    
+    dark_boxes = []
+
     # Проверяем размеры масок
     if bubble_mask.shape[:2] != (img_h, img_w):
         raise ValueError(f"Размеры маски пузырей {bubble_mask.shape[:2]} не совпадают с размерами изображения {(img_h, img_w)}")
-    
+
     # Создаем бинарные маски
     bubble_binary = (bubble_mask > 0).astype(np.uint8)
-    
+
     # Закрашиваем пузыри белым
     if len(translated_np.shape) == 3 and translated_np.shape[2] >= 3:
         translated_np[bubble_binary > 0, 0] = 255
@@ -174,113 +300,42 @@ def create_translated_image(image_path, text_blocks, output_path, bubble_mask, t
         translated_np[bubble_binary > 0, 2] = 255
     else:
         translated_np[bubble_binary > 0] = 255
-    
+
     # Добавляем обработку текстовых блоков, если передана маска
     if text_background_mask is not None:
         if text_background_mask.shape[:2] != (img_h, img_w):
             raise ValueError(f"Размеры маски текстовых блоков {text_background_mask.shape[:2]} не совпадают с размерами изображения {(img_h, img_w)}")
-        
-        # УЛУЧШЕНИЕ 1: Усиление маски текста для улучшенного покрытия символов
-        # Расширяем маску с помощью морфологических операций для захвата полутонов и деталей
-        kernel = np.ones((2, 2), np.uint8)
-        enhanced_mask = cv2.dilate(text_background_mask, kernel, iterations=1)
-        
-        # УЛУЧШЕНИЕ 2: Определяем тип фона для выбора оптимальной стратегии
-        is_dark_background = False
-        
-        # Проверяем, является ли изображение черно-белым
-        is_grayscale = False
-        if len(img_np.shape) == 2 or (len(img_np.shape) == 3 and np.allclose(img_np[:,:,0], img_np[:,:,1], atol=10) and np.allclose(img_np[:,:,1], img_np[:,:,2], atol=10)):
-            is_grayscale = True
-            
-            # Если это черно-белое изображение, проверяем яркость фона
-            if len(img_np.shape) == 3:
-                gray = cv2.cvtColor(img_np, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = img_np
-                
-            # Создаем маску для анализа фона вокруг текста
-            dilated = cv2.dilate(enhanced_mask, np.ones((5, 5), np.uint8), iterations=1)
-            background_region = dilated > 0
-            
-            # Если маска не пустая, анализируем цвет фона
-            if np.sum(background_region) > 0:
-                bg_brightness = np.mean(gray[background_region])
-                # Если фон темный, отмечаем это
-                if bg_brightness < 60:
-                    is_dark_background = True
-                    print(f"Обнаружен темный фон (яркость: {bg_brightness:.1f}), используем специальную обработку")
-        
-        # УЛУЧШЕНИЕ 3: Применяем разные стратегии в зависимости от типа фона
-        if is_dark_background:
-            # Для темного фона (как на вашем изображении) используем прямую заливку
-            # с небольшим размытием для естественности
-            binary_mask = (enhanced_mask > 0).astype(np.uint8)
-            
-            # Размываем маску на границах для плавного перехода
-            blurred_mask = cv2.GaussianBlur(binary_mask.astype(np.float32), (5, 5), 0)
-            
-            # Применяем маску, сохраняя оригинальную темноту фона
-            if len(translated_np.shape) == 3:
-                for c in range(3):
-                    translated_np[:,:,c] = translated_np[:,:,c] * (1 - blurred_mask) + 5 * blurred_mask
-            else:
-                translated_np = translated_np * (1 - blurred_mask) + 5 * blurred_mask
-        else:
-            # Для других типов фона используем inpainting
-            text_mask = (enhanced_mask > 0).astype(np.uint8) * 255
-            
-            try:
-                # Пробуем использовать inpainting
-                inpainted_img = cv2.inpaint(translated_np, text_mask, inpaintRadius=7, flags=cv2.INPAINT_NS)
-                translated_np = inpainted_img
-            except Exception as e:
-                print(f"Ошибка при использовании cv2.inpaint: {e}")
-                # Если inpainting не работает, используем средний цвет области
-                if len(translated_np.shape) == 3:
-                    for c in range(3):
-                        # Находим средний цвет окружающей области и заполняем им текст
-                        bg_color = np.median(translated_np[:,:,c][enhanced_mask == 0])
-                        translated_np[:,:,c][enhanced_mask > 0] = bg_color
-                else:
-                    bg_color = np.median(translated_np[enhanced_mask == 0])
-                    translated_np[enhanced_mask > 0] = bg_color
-    
-    # Преобразуем в PIL изображение для дальнейшей обработки
-    translated_img = PILImage.fromarray(translated_np)
-    draw = ImageDraw.Draw(translated_img)
-    
-    # Загружаем шрифт
-    try:
-        font = get_font(16)
-    except Exception:
-        font = ImageFont.load_default()
-        print("Используется шрифт по умолчанию (после ошибки)")
-    
-    # УЛУЧШЕНИЕ 4: Определяем, нужна ли усиленная обводка для текста
-    outline_strength = 1  # Стандартная обводка
-    if 'is_dark_background' in locals() and is_dark_background:
-        outline_strength = 2  # Усиленная обводка для темного фона
-    
-    # Обрабатываем каждый текстовый блок
-    for block in text_blocks:
-        if not block['translated_text']:
-            continue
-            
-        x_min, y_min, x_max, y_max = block['box']
-        text = block['translated_text'].strip()
-        
-        # Проверяем корректность координат
-        if y_min < 0 or y_max > img_h or x_min < 0 or x_max > img_w:
-            # Корректируем координаты
-            x_min = max(0, min(x_min, img_w-1))
-            y_min = max(0, min(y_min, img_h-1))
-            x_max = max(0, min(x_max, img_w-1))
-            y_max = max(0, min(y_max, img_h-1))
-        
-        # Используем модифицированную функцию для рисования текста с обводкой
-        draw_wrapped_text(draw, font, text, (x_min, y_min, x_max, y_max), outline_strength)
-    
+
+        # Удаляем текст по отдельным связным областям маски: каждая область
+        # обрабатывается в своей ROI, тип фона определяется по локальной статистике
+        if inpaint_method is None:
+            from backend.config import get_settings
+            inpaint_method = get_settings().inpaint_method
+        dark_boxes = inpaint_regions(translated_np, text_background_mask, inpaint_method)
+
+    return PILImage.fromarray(translated_np), dark_boxes
+
+def create_translated_image(image_path, text_blocks, output_path, bubble_mask, text_background_mask=None,
+                            inpaint_method=None):
+    """
+    Создает переведенное изображение с учетом масок пузырей и текстовых блоков
+
+    Args:
+        image_path: Путь к исходному изображению
+        text_blocks: Список блоков текста с координатами и переводом
+        output_path: Путь для сохранения результата
+        bubble_mask: Маска пузырей
+        text_background_mask: Маска текстовых блоков (опционально)
+        inpaint_method: Метод удаления текста на фоне ('fast', 'quality', 'white', 'median',
+            'telea', 'ns', 'lama'); по умолчанию берется из настроек
+
+    Returns:
+        str: Путь к созданному изображению
+    """
+    print("Создание изображения с переводом...")
+    translated_img, dark_boxes = remove_text(image_path, bubble_mask, text_background_mask, inpaint_method)
+    render_text_blocks(translated_img, text_blocks, dark_boxes)
+
     # Сохраняем результат
     translated_img.save(output_path)
     print(f"Изображение с переводом сохранено как {output_path}")
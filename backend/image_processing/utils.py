@@ -3,6 +3,8 @@
 """
 import base64
 import io
+import os
+import mimetypes
 import cv2
 import numpy as np
 from PIL import Image as PILImage
@@ -26,6 +28,47 @@ def image_to_base64(img):
         return base64.b64encode(buffer).decode('utf-8')
     return ""
 
+def save_image(img, file_path, quality=92):
+    """
+    Сохраняет PIL Image в формате, определяемом расширением файла.
+    Для форматов без альфа-канала (JPEG) изображение приводится к RGB
+    
+    Args:
+        img: PIL Image
+        file_path: Путь для сохранения
+        quality: Качество для JPEG/WebP
+        
+    Returns:
+        str: Путь к сохраненному файлу
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    
+    if extension in ('.jpg', '.jpeg'):
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.save(file_path, format='JPEG', quality=quality, optimize=True)
+    elif extension == '.webp':
+        img.save(file_path, format='WEBP', quality=quality, method=4)
+    else:
+        img.save(file_path)
+    
+    return file_path
+
+def file_to_base64(file_path):
+    """
+    Кодирует файл изображения в base64 без повторного декодирования и кодирования
+    
+    Args:
+        file_path: Путь к файлу
+        
+    Returns:
+        tuple: (строка base64, MIME-тип изображения)
+    """
+    with open(file_path, 'rb') as f:
+        data = base64.b64encode(f.read()).decode('utf-8')
+    mimetype = mimetypes.guess_type(file_path)[0] or 'image/png'
+    return data, mimetype
+
 def save_debug_image(image, file_path):
     """
     Сохраняет отладочное изображение
@@ -5,12 +5,14 @@ import base64
 import io
 import numpy as np
 import cv2
-from PIL import Image as PILImage, ImageDraw, ImageFont
+from PIL import Image as PILImage
 import tempfile
 import time
 import glob
+import shutil
 import functools
 from threading import Lock
+from backend.image_processing.text_rendering import render_text_blocks
 
 class MangaEditor:
     """
@@ -92,7 +94,7 @@ class MangaEditor:
         
     def create_session(self, original_image_path, text_removed_image, text_blocks, text_mask, 
                   group_id=None, file_index=0, original_filename=None, text_background_mask=None, 
-                  source_language='zh', target_language='ru'):
+                  source_language='zh', target_language='ru', translated_image=None, dark_boxes=None):
         """
         Создает новую сессию редактирования
         
@@ -104,6 +106,9 @@ class MangaEditor:
             group_id: ID группы связанных сессий (optional)
             file_index: Индекс файла в группе для сохранения порядка
             original_filename: Оригинальное имя файла (если отличается от basename original_image_path)
+            translated_image: Уже отрисованное конвейером изображение с переводом (PIL Image или путь).
+                Если передано, используется как есть без повторного рендеринга
+            dark_boxes: Области с темным фоном для усиленной обводки при повторном рендеринге
             
         Returns:
             str: ID сессии
@@ -138,17 +143,22 @@ class MangaEditor:
         elif isinstance(text_removed_image, PILImage.Image):
             text_removed_image.save(text_removed_path)
         
-        # Создаем переведенное изображение
-        if text_blocks and len(text_blocks) > 0:
+        # Используем результат рендеринга конвейера, если он передан
+        if translated_image is not None:
+            if isinstance(translated_image, PILImage.Image):
+                translated_image.save(translated_path)
+            else:
+                shutil.copy(translated_image, translated_path)
+        # Иначе создаем переведенное изображение
+        elif text_blocks and len(text_blocks) > 0:
             try:
                 # Создаем переведенное изображение используя существующий метод
-                self._create_translated_image(text_removed_path, text_blocks, translated_path, text_mask)
+                self._create_translated_image(text_removed_path, text_blocks, translated_path, text_mask, dark_boxes)
                 print(f"Создано переведенное изображение для сессии {session_id}")
             except Exception as e:
                 print(f"Ошибка при создании переведенного изображения: {e}")
                 # Если не удалось создать переведенное изображение, копируем изображение без текста
                 if os.path.exists(text_removed_path):
-                    import shutil
                     shutil.copy(text_removed_path, translated_path)
         
         # Преобразуем маску текста в список для сериализации JSON
@@ -171,7 +181,8 @@ class MangaEditor:
             "text_blocks": text_blocks,
             "text_mask": text_mask_list,
             "source_language": source_language,
-            "target_language": target_language
+            "target_language": target_language,
+            "dark_boxes": [list(box) for box in (dark_boxes or [])]
         }
         
         # Сохраняем данные сессии
@@ -246,7 +257,8 @@ class MangaEditor:
                         
                         if os.path.exists(text_removed_path):
                             print(f"Создание отсутствующего переведенного изображения для сессии {session_id}")
-                            self._create_translated_image(text_removed_path, text_blocks, translated_path, text_mask)
+                            self._create_translated_image(text_removed_path, text_blocks, translated_path, text_mask,
+                                                          session_data.get("dark_boxes"))
                             session_data["translated_path"] = translated_path
                             
                             # Обновляем файл сессии с новым путем
@@ -474,7 +486,8 @@ class MangaEditor:
         
         try:
             # Генерируем изображение с обновленным текстом
-            self._create_translated_image(text_removed_path, text_blocks, preview_path, text_mask)
+            self._create_translated_image(text_removed_path, text_blocks, preview_path, text_mask,
+                                          session_data.get("dark_boxes"))
             
             # Преобразуем в base64
             preview_img = PILImage.open(preview_path)
@@ -526,7 +539,8 @@ class MangaEditor:
         
         try:
             # Генерируем финальное изображение
-            self._create_translated_image(text_removed_path, text_blocks, save_path, text_mask)
+            self._create_translated_image(text_removed_path, text_blocks, save_path, text_mask,
+                                          session_data.get("dark_boxes"))
             return True, save_path
         except Exception as e:
             print(f"Ошибка сохранения отредактированного изображения: {e}")
@@ -566,7 +580,7 @@ class MangaEditor:
             except Exception as e:
                 print(f"Ошибка при очистке сессии {session_id}: {e}")
     
-    def _create_translated_image(self, image_path, text_blocks, output_path, text_mask):
+    def _create_translated_image(self, image_path, text_blocks, output_path, text_mask, dark_boxes=None):
         """
         Создает изображение с переведенным текстом с учетом стилей
         
@@ -575,214 +589,15 @@ class MangaEditor:
             text_blocks: Список блоков текста с координатами и переводом
             output_path: Путь для сохранения результата
             text_mask: Маска текста
+            dark_boxes: Области с темным фоном для усиленной обводки (опционально)
         """
         print("Создание изображения с переводом...")
         img = PILImage.open(image_path)
-        img_np = np.array(img)
-        draw = ImageDraw.Draw(img)
-        
-        # Загружаем доступные шрифты
-        fonts = self._load_available_fonts()
         
-        # Обрабатываем каждый текстовый блок
-        for block in text_blocks:
-            if not block['translated_text']:
-                continue
-                
-            x_min, y_min, x_max, y_max = block['box']
-            text = block['translated_text'].strip()
-            
-            # Получаем стиль блока или используем значения по умолчанию
-            style = block.get('style', {})
-            
-            # Рисуем текст для этого блока с учетом стиля
-            self._draw_wrapped_text(draw, fonts, text, (x_min, y_min, x_max, y_max), style)
+        # Используем общий движок рендеринга с кэшированными шрифтами и раскладкой
+        render_text_blocks(img, text_blocks, dark_boxes)
         
         # Сохраняем результат
         img.save(output_path)
         print(f"Изображение с переводом сохранено как {output_path}")
-        return output_path
-    
-    def _load_available_fonts(self):
-        """
-        Загружает доступные шрифты для различных стилей
-        
-        Returns:
-            dict: Словарь шрифтов разных стилей и размеров
-        """
-        fonts = {}
-        
-        # Пути к шрифтам для разных стилей
-        font_paths = {
-            'normal': ["data/fonts/anime-ace-v02.ttf", "arial.ttf", "C:/Windows/Fonts/Arial.ttf", "C:/Windows/Fonts/Calibri.ttf"],
-            'bold': ["data/fonts/anime-ace-bb.ttf", "C:/Windows/Fonts/Arialbd.ttf", "C:/Windows/Fonts/Calibrib.ttf"],
-            'italic': ["data/fonts/anime-ace-it.ttf", "C:/Windows/Fonts/Ariali.ttf", "C:/Windows/Fonts/Calibrii.ttf"],
-            'bold_italic': ["data/fonts/anime-ace-bb-it.ttf", "C:/Windows/Fonts/Arialbi.ttf", "C:/Windows/Fonts/Calibriz.ttf"]
-        }
-        
-        # Загружаем шрифты разных размеров
-        for style, paths in font_paths.items():
-            fonts[style] = {}
-            
-            for size in range(8, 33, 2):  # Размеры от 8 до 32 с шагом 2
-                for path in paths:
-                    try:
-                        fonts[style][size] = ImageFont.truetype(path, size)
-                        print(f"Загружен шрифт {style} размера {size}: {path}")
-                        break
-                    except Exception:
-                        continue
-                
-                # Если не удалось загрузить шрифт, используем шрифт по умолчанию
-                if size not in fonts[style]:
-                    fonts[style][size] = ImageFont.load_default()
-                    print(f"Используется шрифт по умолчанию для {style} размера {size}")
-        
-        return fonts
-
-    def _draw_wrapped_text(self, draw, fonts, text, box, style=None):
-        """
-        Улучшенная функция для интеллектуального переноса и рисования текста с учетом стилей
-        
-        Args:
-            draw: ImageDraw объект
-            fonts: Словарь доступных шрифтов
-            text: Текст для отображения
-            box: Координаты box (x_min, y_min, x_max, y_max)
-            style: Словарь со стилями текста
-        """
-        if style is None:
-            style = {}
-        
-        # Извлекаем и применяем стили
-        x_min, y_min, x_max, y_max = box
-        font_size = style.get('font_size', 16)
-        font_weight = style.get('font_weight', 'normal')
-        font_style = style.get('font_style', 'normal')
-        align = style.get('align', 'center')
-        offset_x = style.get('offset_x', 0)
-        offset_y = style.get('offset_y', 0)
-        
-        # Применяем смещение
-        x_min += offset_x
-        y_min += offset_y
-        x_max += offset_x
-        y_max += offset_y
-        
-        # Определяем ключ для выбора шрифта
-        if font_weight == 'bold' and font_style == 'italic':
-            font_key = 'bold_italic'
-        elif font_weight == 'bold':
-            font_key = 'bold'
-        elif font_style == 'italic':
-            font_key = 'italic'
-        else:
-            font_key = 'normal'
-        
-        # Выбираем ближайший доступный размер шрифта
-        available_sizes = list(fonts.get(font_key, {}).keys())
-        if available_sizes:
-            closest_size = min(available_sizes, key=lambda x: abs(x - font_size))
-            font = fonts[font_key][closest_size]
-        else:
-            # Если шрифт не найден, используем стандартный
-            font = ImageFont.load_default()
-        
-        max_width = x_max - x_min - 15
-        
-        # Получаем размеры шрифта
-        left, top, right, bottom = draw.textbbox((0, 0), 'А', font=font)
-        char_height = bottom - top
-        
-        # Настраиваем межстрочный интервал в зависимости от размера шрифта
-        line_spacing = max(6, int(font_size * 0.3))
-        
-        # Обрабатываем явные переносы строк в тексте
-        paragraphs = text.split('\n')
-        wrapped_text = []
-        
-        for paragraph in paragraphs:
-            # Разбиваем параграф на части
-            import re
-            
-            # Разбиваем на предложения
-            sentences = re.split(r'([.!?]\s+)', paragraph)
-            sentence_chunks = []
-            
-            for i in range(0, len(sentences)-1, 2):
-                if i+1 < len(sentences):
-                    sentence_chunks.append(sentences[i] + sentences[i+1])
-                else:
-                    sentence_chunks.append(sentences[i])
-            
-            if len(sentences) % 2 == 1:
-                sentence_chunks.append(sentences[-1])
-            
-            # Обрабатываем каждое предложение
-            for sentence in sentence_chunks:
-                # Разбиваем предложение на части по знакам препинания
-                parts = re.split(r'([,:;]\s+)', sentence)
-                parts_combined = []
-                
-                for i in range(0, len(parts)-1, 2):
-                    if i+1 < len(parts):
-                        parts_combined.append(parts[i] + parts[i+1])
-                    else:
-                        parts_combined.append(parts[i])
-                
-                if len(parts) % 2 == 1:
-                    parts_combined.append(parts[-1])
-                
-                # Обрабатываем каждую часть
-                for part in parts_combined:
-                    words = part.split()
-                    current_line = ""
-                    
-                    for word in words:
-                        test_line = current_line + " " + word if current_line else word
-                        left, top, right, bottom = draw.textbbox((0, 0), test_line, font=font)
-                        line_width = right - left
-                        
-                        if line_width <= max_width:
-                            current_line = test_line
-                        else:
-                            if current_line:
-                                wrapped_text.append(current_line)
-                            current_line = word
-                    
-                    if current_line:
-                        wrapped_text.append(current_line)
-            
-            # Добавляем пустую строку между параграфами, если не последний параграф
-            if paragraph != paragraphs[-1]:
-                wrapped_text.append("")
-        
-        # Рисуем текст с учетом выравнивания
-        if wrapped_text:
-            # Считаем высоту всего текста
-            text_height_total = len(wrapped_text) * (char_height + line_spacing)
-            y_start = y_min + ((y_max - y_min - text_height_total) / 2)
-            
-            for i, line in enumerate(wrapped_text):
-                if not line:  # Пропускаем пустые строки
-                    continue
-                    
-                left, top, right, bottom = draw.textbbox((0, 0), line, font=font)
-                text_width = right - left
-                
-                # Определяем позицию в зависимости от выравнивания
-                if align == 'left':
-                    x_pos = x_min + 5  # Небольшой отступ
-                elif align == 'right':
-                    x_pos = x_max - text_width - 5  # Небольшой отступ
-                else:  # center
-                    x_pos = x_min + ((x_max - x_min - text_width) / 2)
-                
-                y_pos = y_start + (i * (char_height + line_spacing))
-                
-                # Добавляем белую обводку для лучшей читаемости 
-                for dx, dy in [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]:
-                    draw.text((x_pos + dx, y_pos + dy), line, fill="white", font=font)
-                
-                # Основной текст черным
-                draw.text((x_pos, y_pos), line, fill="black", font=font)
\ No newline at end of file
+        return output_path
\ No newline at end of file
@@ -32,6 +32,18 @@ OPENAI_LANG_NAMES = {
     'de': 'German',
 }
 
+# Коды языков для локальной модели NLLB
+NLLB_LANG_CODES = {
+    'ja': 'jpn_Jpan',
+    'zh': 'zho_Hans',
+    'ko': 'kor_Hang',
+    'en': 'eng_Latn',
+    'ru': 'rus_Cyrl',
+    'fr': 'fra_Latn',
+    'es': 'spa_Latn',
+    'de': 'deu_Latn',
+}
+
 # Коды языков для PaddleOCR
 PADDLE_OCR_LANGS = {
     'ja': 'japan',
@@ -6,14 +6,16 @@ import time
 import json
 import base64
 import io
+import queue
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image as PILImage
 
 from backend.config import get_settings
 from backend.logger import get_app_logger
 from backend.models import extract_text_from_boxes, get_optimal_ocr_engine
 from backend.translation import translate_text_blocks
-from backend.image_processing import create_translated_image
+from backend.image_processing import remove_text, render_text_blocks, save_image
 from backend.file_utils import save_text_blocks_info
 from backend.file_utils.temp import get_temp_filepath, generate_unique_filename
 from backend.manga_editor import MangaEditor
@@ -21,7 +23,8 @@ from backend.manga_editor import MangaEditor
 def process_ocr_and_translation(image_path, seg_results, bubble_mask=None, text_background_mask=None, output_path=None, 
                                translation_method=None, openai_api_key=None, ocr_engine=None, edit_mode=False, 
                                batch_id=None, file_index=0, original_filename=None, source_language='zh', target_language='ru',
-                               user_id=None):
+                               user_id=None, inpaint_method=None, translated_output_path=None, on_block=None,
+                               chapter_id=None):
     """
     Комплексная обработка OCR и перевода изображения с автоматическим выбором OCR
     
@@ -41,9 +44,17 @@ def process_ocr_and_translation(image_path, seg_results, bubble_mask=None, text_
         source_language: Язык оригинала
         target_language: Язык перевода
         user_id: ID пользователя
+        inpaint_method: Метод удаления текста на фоне (по умолчанию из настроек)
+        translated_output_path: Путь для итогового переведенного изображения; формат
+            определяется расширением. По умолчанию - рядом с исходным изображением
+        on_block: Функция on_block(индекс блока, перевод), вызываемая по мере перевода
+            блоков (например, для передачи прогресса клиенту)
+        chapter_id: ID главы для переиспользования переводов одинаковых текстов между страницами
+            (по умолчанию batch_id)
         
     Returns:
-        dict: Результаты обработки
+        dict: Результаты обработки. Путь к переведенному изображению - в 'translated_path',
+              base64 не формируется (см. file_to_base64)
     """
     from backend.file_utils.user_files import get_user_directory
     
@@ -120,14 +131,46 @@ def process_ocr_and_translation(image_path, seg_results, bubble_mask=None, text_
         logger.info(f"Извлечение текста с использованием {ocr_engine}...")
         text_blocks = extract_text_from_boxes(image_path, text_boxes, ocr_engine, source_language, settings.use_gpu)
         
+        # Перевод выполняется в отдельном потоке, а готовые блоки передаются через очередь:
+        # пока идет перевод, удаляется исходный текст, и каждый блок рисуется сразу после перевода
         logger.info("Перевод текста...")
-        translated_blocks, error_message = translate_text_blocks(
-            text_blocks, 
-            translation_method=translation_method, 
-            openai_api_key=openai_api_key,
-            src_lang=source_language,
-            dest_lang=target_language
-        )
+        translated_queue = queue.Queue()
+
+        def handle_translated_block(index, translated_text):
+            translated_queue.put((index, translated_text))
+            if on_block is not None:
+                on_block(index, translated_text)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            translation_future = executor.submit(
+                translate_text_blocks,
+                text_blocks,
+                translation_method=translation_method,
+                openai_api_key=openai_api_key,
+                src_lang=source_language,
+                dest_lang=target_language,
+                on_block=handle_translated_block,
+                chapter_id=chapter_id or batch_id,
+                user_id=user_id
+            )
+
+            logger.info("Удаление исходного текста...")
+            text_removed_img, dark_boxes = remove_text(image_path, bubble_mask, text_background_mask, inpaint_method)
+            rendered_img = text_removed_img.copy()
+
+            rendered_indices = set()
+            while True:
+                try:
+                    index, translated_text = translated_queue.get(timeout=0.05)
+                except queue.Empty:
+                    if translation_future.done():
+                        break
+                    continue
+                rendered_indices.add(index)
+                render_text_blocks(rendered_img, [dict(text_blocks[index], translated_text=translated_text)], dark_boxes)
+
+            translated_blocks, error_message = translation_future.result()
+        logger.debug(f"Блоков отрисовано по мере перевода: {len(rendered_indices)} из {len(translated_blocks)}")
         
         if error_message:
             logger.error(f"Ошибка при переводе: {error_message}")
@@ -141,10 +184,13 @@ def process_ocr_and_translation(image_path, seg_results, bubble_mask=None, text_
         json_path = image_path + ".json"
         save_text_blocks_info(translated_blocks, json_path)
         
-        # Получаем изображение с удаленным текстом
-        text_removed_base64 = seg_results.get('text_removed', '')
-        text_removed_bytes = base64.b64decode(text_removed_base64)
-        text_removed_img = PILImage.open(io.BytesIO(text_removed_bytes))
+        # Дорисовываем блоки, перевод которых не был передан по мере готовности
+        logger.info("Создание изображения с переводом...")
+        render_text_blocks(
+            rendered_img,
+            [block for i, block in enumerate(translated_blocks) if i not in rendered_indices],
+            dark_boxes
+        )
         
         # Если включен режим редактирования, создаем сессию
         if edit_mode:
@@ -158,6 +204,7 @@ def process_ocr_and_translation(image_path, seg_results, bubble_mask=None, text_
             
             manga_editor = MangaEditor(editor_sessions_dir)
             
+            # Передаем результат рендеринга конвейера, чтобы редактор не рендерил страницу повторно
             session_id = manga_editor.create_session(
                 image_path,
                 text_removed_img,
@@ -168,7 +215,9 @@ def process_ocr_and_translation(image_path, seg_results, bubble_mask=None, text_
                 file_index=file_index,
                 original_filename=original_filename,
                 source_language=source_language,
-                target_language=target_language
+                target_language=target_language,
+                translated_image=rendered_img,
+                dark_boxes=dark_boxes
             )
             
             # Проверяем, что сессия была создана успешно
@@ -183,35 +232,21 @@ def process_ocr_and_translation(image_path, seg_results, bubble_mask=None, text_
             seg_results['edit_batch_id'] = batch_id
             seg_results['user_id'] = user_id  # Добавляем ID пользователя
         
-        logger.info("Создание изображения с переводом...")
-        translated_img_path = image_path + ".translated.png"
-        
-        # Вызываем функцию с обеими масками из модуля image_processing
-        create_translated_image(
-            image_path, 
-            translated_blocks, 
-            translated_img_path, 
-            bubble_mask, 
-            text_background_mask
-        )
-        
-        logger.debug("Конвертация изображения в base64...")
-        translated_img = PILImage.open(translated_img_path)
-        
-        # Импортируем функцию для конвертации в base64
-        from backend.image_processing import image_to_base64
-        translated_base64 = image_to_base64(translated_img)
+        # Итоговое изображение записывается один раз; base64 формируется
+        # только там, где изображение встраивается в страницу
+        if translated_output_path is None:
+            translated_output_path = os.path.splitext(image_path)[0] + ".translated.png"
+        os.makedirs(os.path.dirname(os.path.abspath(translated_output_path)), exist_ok=True)
+        save_image(rendered_img, translated_output_path, settings.translated_image_quality)
+        logger.info(f"Переведенное изображение сохранено: {translated_output_path}")
 
-        seg_results['translated'] = translated_base64
+        seg_results['translated_path'] = translated_output_path
         seg_results['text_blocks'] = translated_blocks
         
         logger.info(f"Сохранение финальных результатов в {output_path}")
         with open(output_path, 'w') as f:
             json.dump(seg_results, f)
             
-        if os.path.exists(translated_img_path):
-            os.remove(translated_img_path)
-            
         logger.info(f"OCR и перевод завершены за {time.time() - start_time:.2f} секунд")
         return seg_results
     except Exception as e:
@@ -192,15 +192,8 @@ def process_segmentation(image_path, output_path=None, user_id=None):
         dilated_bubble_mask = cv2.dilate(combined_bubble_mask, np.ones((1, 1), np.uint8), iterations=1)
         dilated_text_background_mask = cv2.dilate(combined_text_background_mask, np.ones((1, 1), np.uint8), iterations=1)
 
-        # 10. Удаляем текст с разным цветом закрашивания
-        text_removed = img.copy()
-
-        # Закрашиваем пузыри белым
-        text_removed[dilated_bubble_mask > 0] = [255, 255, 255]
-
-        # Закрашиваем текстовые блоки белым, используя побитовое сравнение
-        text_removed[dilated_text_background_mask > 0] = [255, 255, 255]
-
+        # 10. Текст удаляется на этапе OCR и перевода выбранным методом (remove_text),
+        # поэтому заливка белым здесь не выполняется
         
         # 11. Создаем маску для SickZil
         sickzil_img = np.zeros((img_h, img_w, 4), dtype=np.uint8)
@@ -218,9 +211,6 @@ def process_segmentation(image_path, output_path=None, user_id=None):
         _, mask_buffer = cv2.imencode(".png", dilated_bubble_mask)
         mask_base64 = base64.b64encode(mask_buffer).decode('utf-8')
         
-        _, removed_buffer = cv2.imencode(".png", text_removed)
-        text_removed_base64 = base64.b64encode(removed_buffer).decode('utf-8')
-        
         buffered = io.BytesIO()
         sickzil_pil.save(buffered, format="PNG")
         final_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
@@ -232,7 +222,6 @@ def process_segmentation(image_path, output_path=None, user_id=None):
             'boxes_image': boxes_base64,
             'overlay': boxes_base64,
             'final': final_base64,
-            'text_removed': text_removed_base64,
             'text_boxes': [box['coordinates'] for box in bubble_boxes + text_background_boxes]
         }
         
@@ -1,18 +1,29 @@
 from . import api_bp
-from flask import request, jsonify, send_file
+from flask import request, jsonify, send_file, Response, stream_with_context
+import base64
 import os
+import re
 import time
-import io
-from PIL import Image as PILImage
 import uuid
-import tempfile
-import zipfile
-from reportlab.pdfgen import canvas
 from backend.manga_editor import MangaEditor
-from backend.auth import api_login_required, get_current_user
+from backend.file_utils.export import get_export_format, resolve_export_options, get_export_jobs, EXPORT_FORMATS
+from backend.file_utils.export_cache import get_export_cache
+from backend.file_utils.folders import get_manga_folder_page, get_manga_folder_images
+from backend.file_utils.uploads import get_upload_manager, parse_chunk_checksum, UploadError
+from backend.auth import api_login_required, api_session_login_required, get_current_user
 
 # Инициализация редактора манги
 manga_editor = MangaEditor()
+
+# Несколько PNG отдаются ZIP-архивом
+EXPORT_FORMAT_ALIASES = {'png': 'zip'}
+
+EXPORT_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Размеры страниц списка библиотеки: по умолчанию и максимальный
+LIBRARY_FOLDERS_PAGE = (20, 100)
+LIBRARY_IMAGES_PAGE = (60, 500)
+
 @api_bp.route('/edit/update_translation', methods=['POST'])
 @api_login_required
 def api_update_translation(current_user):
@@ -71,6 +82,183 @@ def api_save_edited(current_user):
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@api_bp.route('/usage', methods=['GET'])
+@api_login_required
+def api_translation_usage(current_user):
+    """API для получения расхода сервисов перевода текущего пользователя"""
+    try:
+        from backend.translation import get_usage_tracker
+        return jsonify({
+            "success": True,
+            "usage": get_usage_tracker().get_usage(current_user.id)
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@api_bp.route('/library/folders', methods=['GET'])
+@api_session_login_required
+def api_library_folders(current_user):
+    """API для постраничного получения папок с мангой (без списков изображений)"""
+    try:
+        after = decode_cursor(request.args.get('cursor'))
+        limit = page_limit(request.args.get('limit'), *LIBRARY_FOLDERS_PAGE)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    folders, last_name, total = get_manga_folder_page(current_user.id, after, limit)
+    return jsonify({
+        "success": True,
+        "folders": folders,
+        "total": total,
+        "next_cursor": encode_cursor(last_name)
+    })
+
+@api_bp.route('/library/images', methods=['GET'])
+@api_session_login_required
+def api_library_images(current_user):
+    """API для постраничного получения изображений папки с мангой"""
+    folder_name = request.args.get('folder', '')
+    try:
+        after = decode_cursor(request.args.get('cursor'))
+        limit = page_limit(request.args.get('limit'), *LIBRARY_IMAGES_PAGE)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    try:
+        images, last_name, total = get_manga_folder_images(folder_name, current_user.id, after, limit)
+    except KeyError:
+        return jsonify({"success": False, "error": "Папка не найдена"}), 404
+    return jsonify({
+        "success": True,
+        "images": images,
+        "total": total,
+        "next_cursor": encode_cursor(last_name)
+    })
+
+@api_bp.route('/uploads', methods=['POST'])
+@api_login_required
+def api_create_upload(current_user):
+    """
+    API для создания загрузки файла частями.
+    Тело: folder, filename, size, необязательные checksum (SHA-256 hex) и process
+    (параметры перевода; если указаны, файл переводится сразу после загрузки)
+    """
+    data = request.json or {}
+    try:
+        upload = get_upload_manager().create(
+            current_user.id,
+            data.get('folder', ''),
+            data.get('filename', ''),
+            data.get('size'),
+            data.get('checksum'),
+            data.get('process')
+        )
+    except UploadError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    response = upload_response(upload, 201)
+    response.headers['Location'] = f"/api/uploads/{upload.upload_id}"
+    return response
+
+@api_bp.route('/uploads/<upload_id>', methods=['GET'])
+@api_login_required
+def api_upload_status(upload_id, current_user):
+    """API для получения смещения и состояния загрузки (HEAD - только заголовки)"""
+    try:
+        upload = get_upload_manager().get(upload_id, current_user.id)
+    except UploadError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    return upload_response(upload)
+
+@api_bp.route('/uploads/<upload_id>', methods=['PATCH'])
+@api_login_required
+def api_upload_chunk(upload_id, current_user):
+    """
+    API для передачи части файла. Заголовок Upload-Offset - смещение части,
+    необязательный Upload-Checksum - "<алгоритм> <base64>" для проверки части.
+    Тело запроса читается потоком и пишется сразу в файл
+    """
+    manager = get_upload_manager()
+    upload = None
+    try:
+        upload = manager.get(upload_id, current_user.id)
+        offset = request.headers.get('Upload-Offset', '')
+        if not offset.isdigit():
+            raise UploadError("Не указан заголовок Upload-Offset")
+        chunk_checksum = parse_chunk_checksum(request.headers.get('Upload-Checksum'))
+        manager.write_chunk(upload, int(offset), request.stream, chunk_checksum)
+    except UploadError as e:
+        response = jsonify({"success": False, "error": str(e)})
+        if upload is not None:
+            # Клиент продолжает загрузку с этого смещения
+            response.headers['Upload-Offset'] = str(upload.offset)
+        return response, e.status
+    return upload_response(upload)
+
+@api_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@api_login_required
+def api_cancel_upload(upload_id, current_user):
+    """API для отмены загрузки"""
+    manager = get_upload_manager()
+    try:
+        manager.cancel(manager.get(upload_id, current_user.id))
+    except UploadError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    return jsonify({"success": True})
+
+def upload_response(upload, status=200):
+    """Ответ с состоянием загрузки и заголовками смещения"""
+    response = jsonify({"success": True, "upload": upload.to_dict()})
+    response.status_code = status
+    response.headers['Upload-Offset'] = str(upload.offset)
+    response.headers['Upload-Length'] = str(upload.size)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def encode_cursor(name):
+    """Курсор страницы: имя последнего элемента предыдущей страницы в base64"""
+    if name is None:
+        return None
+    return base64.urlsafe_b64encode(name.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Разбирает курсор страницы
+
+    Returns:
+        str: Имя последнего элемента предыдущей страницы или None для первой страницы
+
+    Raises:
+        ValueError: Если курсор поврежден
+    """
+    if not cursor:
+        return None
+    try:
+        return base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+    except (ValueError, UnicodeError):
+        raise ValueError("Некорректный курсор страницы")
+
+def page_limit(value, default, maximum):
+    """Размер страницы из запроса, ограниченный максимумом"""
+    if value is None or value == '':
+        return default
+    try:
+        return min(maximum, max(1, int(value)))
+    except ValueError:
+        raise ValueError("Некорректный размер страницы")
+
+@api_bp.route('/inpaint/stats', methods=['GET'])
+@api_login_required
+def api_inpaint_stats(current_user):
+    """API для получения статистики методов удаления текста: число областей, площадь и время"""
+    try:
+        from backend.image_processing import get_inpaint_stats
+        return jsonify({
+            "success": True,
+            "stats": get_inpaint_stats()
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @api_bp.route('/download/<format_type>', methods=['POST'])
 @api_login_required
 def api_download_results(format_type, current_user):
@@ -78,6 +266,12 @@ def api_download_results(format_type, current_user):
     try:
         data = request.json
         image_paths = data.get('image_paths', [])
+        # Необязательное перекодирование страниц: "jpeg" или "webp" и качество
+        image_format = data.get('image_format')
+        quality = data.get('quality')
+        # ID экспорта для отслеживания хода через /api/export/status/<job_id>;
+        # экспорты хранятся отдельно для каждого пользователя
+        job_id = str(data.get('job_id') or uuid.uuid4().hex)[:64]
         
         if not image_paths:
             return jsonify({"success": False, "error": "Не указаны пути к изображениям"}), 400
@@ -97,28 +291,7 @@ def api_download_results(format_type, current_user):
         timestamp = int(time.time())
         result_filename = f"manga_translation_{timestamp}"
         
-        if format_type == 'pdf':
-            # Создаем PDF из изображений
-            pdf_file = create_pdf_from_images(valid_paths, result_filename)
-            return send_file(
-                pdf_file,
-                as_attachment=True,
-                download_name=f"{result_filename}.pdf",
-                mimetype='application/pdf'
-            )
-            
-        elif format_type == 'zip' or format_type == 'cbz':
-            # Создаем ZIP-архив из изображений
-            extension = 'cbz' if format_type == 'cbz' else 'zip'
-            zip_file = create_zip_from_images(valid_paths, result_filename, extension)
-            return send_file(
-                zip_file,
-                as_attachment=True,
-                download_name=f"{result_filename}.{extension}",
-                mimetype='application/zip'
-            )
-            
-        elif format_type == 'png':
+        if format_type == 'png':
             # Если запросили конкретное изображение или все в архиве
             if len(valid_paths) == 1:
                 return send_file(
@@ -127,17 +300,20 @@ def api_download_results(format_type, current_user):
                     download_name=os.path.basename(valid_paths[0]),
                     mimetype='image/png'
                 )
-            else:
-                # Если несколько PNG, упаковываем их в ZIP
-                zip_file = create_zip_from_images(valid_paths, result_filename, 'zip')
-                return send_file(
-                    zip_file,
-                    as_attachment=True,
-                    download_name=f"{result_filename}_png.zip",
-                    mimetype='application/zip'
-                )
-        else:
-            return jsonify({"success": False, "error": f"Неподдерживаемый формат: {format_type}"}), 400
+            # Если несколько PNG, упаковываем их в ZIP без перекодирования
+            image_format = ""
+        
+        try:
+            export_format = get_export_format(EXPORT_FORMAT_ALIASES.get(format_type, format_type))
+            if quality is not None:
+                quality = min(100, max(1, int(quality)))
+            image_format, quality = resolve_export_options(export_format.name, image_format, quality)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        suffix = "_png" if format_type == 'png' else ""
+        download_name = f"{result_filename}{suffix}.{export_format.extension}"
+        return cached_download(format_type, valid_paths, image_format, quality, download_name, job_id, current_user.id)
             
     except Exception as e:
         import traceback
@@ -146,47 +322,108 @@ def api_download_results(format_type, current_user):
         print(error_traceback)
         return jsonify({"success": False, "error": str(e)}), 500
 
-def create_pdf_from_images(image_paths, filename):
-    """Создает PDF-файл из списка изображений без белых полей"""
-    temp_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-    temp_path = temp_file.name
-    temp_file.close()
-    
-    # Создаем PDF-документ без указания размера страницы
-    c = canvas.Canvas(temp_path)
-    
-    for img_path in image_paths:
-        try:
-            # Открываем изображение и определяем его размеры
-            img = PILImage.open(img_path)
-            img_width, img_height = img.size
-            
-            # Устанавливаем размер страницы точно по размеру изображения
-            c.setPageSize((img_width, img_height))
-            
-            # Помещаем изображение на страницу без масштабирования, начиная с левого нижнего угла (0,0)
-            c.drawImage(img_path, 0, 0, width=img_width, height=img_height)
-            c.showPage()  # Завершаем текущую страницу
-            
-        except Exception as e:
-            print(f"Ошибка при добавлении изображения {img_path} в PDF: {e}")
-    
-    c.save()
-    return temp_path
-
-def create_zip_from_images(image_paths, filename, extension='zip'):
-    """Создает ZIP-архив из списка изображений"""
-    temp_file = tempfile.NamedTemporaryFile(suffix=f'.{extension}', delete=False)
-    temp_path = temp_file.name
-    temp_file.close()
-    
-    with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for i, img_path in enumerate(image_paths):
-            try:
-                # Добавляем изображение в архив с упорядоченным именем
-                arcname = f"{i+1:03d}_{os.path.basename(img_path)}"
-                zipf.write(img_path, arcname=arcname)
-            except Exception as e:
-                print(f"Ошибка при добавлении изображения {img_path} в архив: {e}")
-    
-    return temp_path
\ No newline at end of file
+@api_bp.route('/download/<format_type>/<cache_key>', methods=['GET'])
+@api_login_required
+def api_download_cached(format_type, cache_key, current_user):
+    """API для повторного скачивания файла экспорта из кеша (поддерживает If-None-Match)"""
+    cache = get_export_cache()
+    export_name = EXPORT_FORMAT_ALIASES.get(format_type, format_type)
+    if export_name not in EXPORT_FORMATS or not EXPORT_KEY_PATTERN.match(cache_key) or cache is None:
+        return jsonify({"success": False, "error": "Файл экспорта не найден"}), 404
+    # Файл ищется только среди файлов текущего пользователя
+    cached_path = cache.get(cache_key, current_user.id)
+    if cached_path is None:
+        return jsonify({"success": False, "error": "Файл экспорта не найден"}), 404
+    export_format = get_export_format(export_name)
+    return export_response(send_file(
+        cached_path,
+        as_attachment=True,
+        download_name=request.args.get('name') or f"manga_translation_{cache_key[:12]}.{export_format.extension}",
+        mimetype=export_format.mimetype,
+        etag=cache_key,
+        conditional=True
+    ), cache_key)
+
+@api_bp.route('/export/status/<job_id>', methods=['GET'])
+@api_login_required
+def api_export_status(job_id, current_user):
+    """API для получения хода экспорта: готово страниц, всего страниц и статус"""
+    job = get_export_jobs().get(job_id, current_user.id)
+    if job is None:
+        return jsonify({"success": False, "error": "Экспорт не найден"}), 404
+    job.pop('user_id')
+    return jsonify({"success": True, "job": job})
+
+def cached_download(format_type, image_paths, image_format, quality, download_name, job_id, user_id):
+    """
+    Отправляет файл экспорта из кеша или формирует его, одновременно сохраняя в кеш.
+    Ключ кеша возвращается как ETag; если он совпадает с If-None-Match, ответ - 304.
+    Ход формирования файла доступен через /api/export/status/<job_id>
+
+    Args:
+        format_type: Формат из запроса
+        image_paths: Список путей к изображениям в порядке страниц
+        image_format: Итоговый формат страниц
+        quality: Итоговое качество страниц
+        download_name: Имя файла для сохранения
+        job_id: ID экспорта
+        user_id: ID пользователя
+
+    Returns:
+        Response: Ответ с файлом
+    """
+    export_format = get_export_format(EXPORT_FORMAT_ALIASES.get(format_type, format_type))
+    jobs = get_export_jobs()
+    jobs.start(job_id, format_type, len(image_paths), user_id)
+
+    cache = get_export_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(format_type, image_paths, {"image_format": image_format, "quality": quality})
+        # Ключ зависит только от содержимого, поэтому совпадение ETag означает тот же файл
+        if request.if_none_match.contains(cache_key):
+            jobs.finish(job_id, user_id=user_id)
+            return export_response(Response(status=304), cache_key, job_id)
+        cached_path = cache.get(cache_key, user_id)
+        if cached_path is not None:
+            jobs.finish(job_id, user_id=user_id)
+            response = send_file(cached_path, as_attachment=True, download_name=download_name,
+                                 mimetype=export_format.mimetype)
+            return export_response(response, cache_key, job_id)
+
+    failed = []
+    chunks = export_format.stream(image_paths, image_format, quality,
+                                  progress=lambda done, total: jobs.update(job_id, done, total, user_id),
+                                  failed=failed)
+    if cache is not None:
+        # Файл с пропущенными страницами отдается, но не кешируется
+        chunks = cache.stream_and_store(cache_key, chunks, owner=user_id, is_complete=lambda: not failed)
+    response = streaming_download(jobs.track(job_id, chunks, user_id), download_name, export_format.mimetype)
+    return export_response(response, cache_key, job_id)
+
+def export_response(response, cache_key=None, job_id=None):
+    """Добавляет к ответу ETag, ключ файла и ID экспорта"""
+    if cache_key is not None:
+        response.set_etag(cache_key)
+        response.headers['X-Export-Key'] = cache_key
+    if job_id is not None:
+        response.headers['X-Export-Job'] = job_id
+    # Клиент может хранить файл, но должен перепроверять его по ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def streaming_download(chunks, download_name, mimetype):
+    """
+    Отправляет файл по мере формирования (chunked), без временных файлов на диске
+
+    Args:
+        chunks: Генератор частей файла
+        download_name: Имя файла для сохранения
+        mimetype: MIME-тип файла
+
+    Returns:
+        Response: Потоковый ответ
+    """
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+Отправка файлов с кешированием в браузере
+"""
+from flask import request, send_file, abort
+from backend.file_utils.versions import get_file_version
+
+# Срок хранения ответов на URL с версией (1 год)
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+def send_versioned_file(path, mimetype=None):
+    """
+    Отправляет файл с ETag по хешу содержимого.
+    Если URL содержит актуальную версию (v), ответ помечается как неизменяемый
+    и браузер больше не запрашивает его; иначе браузер перепроверяет файл
+    по ETag и получает 304, если файл не изменился
+
+    Args:
+        path: Путь к файлу
+        mimetype: MIME-тип (по умолчанию по расширению)
+
+    Returns:
+        Response: Ответ с файлом или 304
+    """
+    version = get_file_version(path)
+    if version is None:
+        return abort(404)
+
+    response = send_file(path, mimetype=mimetype, etag=version, conditional=True, max_age=0)
+    if request.args.get('v') == version:
+        # Файлы пользователей: кешируются только браузером, не общими прокси
+        response.headers['Cache-Control'] = f'private, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def send_uncached_file(path, mimetype=None):
+    """
+    Отправляет файл, который браузер не должен сохранять (например, исходное
+    изображение вместо миниатюры, которая еще создается)
+
+    Args:
+        path: Путь к файлу
+        mimetype: MIME-тип (по умолчанию по расширению)
+
+    Returns:
+        Response: Ответ с файлом
+    """
+    response = send_file(path, mimetype=mimetype, conditional=False)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
\ No newline at end of file
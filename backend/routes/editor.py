@@ -1,10 +1,13 @@
 from . import editor_bp
-from flask import render_template, request, send_from_directory
+from flask import render_template, request, abort
+from werkzeug.security import safe_join
 import os
 import time
 from backend.manga_editor import MangaEditor
 from backend.config import get_settings
 from backend.auth import api_login_required, login_required, get_current_user
+from backend.file_utils.versions import get_file_version
+from .caching import send_versioned_file
 
 settings = get_settings()
 manga_editor = MangaEditor(settings.editor_sessions_dir)
@@ -57,9 +60,17 @@ def edit_manga(session_id):
         load_time = time.time() - start_time
         print(f"Время загрузки сессии: {load_time:.3f} секунд (use_cache={use_cache}, force_reload={force_reload})")
         
+        # Версии изображений сессии для URL, которые браузер кеширует бессрочно
+        session_dir = os.path.join(manga_editor.sessions_dir, session_id)
+        image_versions = {
+            prefix: get_file_version(os.path.join(session_dir, f"{prefix}_{session_data.get('original_filename', '')}")) or ''
+            for prefix in ('original', 'text_removed', 'translated')
+        }
+        
         return render_template('edit_manga.html', 
                               session_id=session_id, 
                               session_data=session_data,
+                              image_versions=image_versions,
                               all_files=all_files,
                               has_related=has_related,
                               direct_mode=direct_mode,
@@ -76,5 +87,7 @@ def edit_manga(session_id):
 @login_required
 def serve_editor_image(session_id, filename):
     """Обслуживание изображений редактора"""
-    editor_dir = os.path.join(manga_editor.sessions_dir, session_id)
-    return send_from_directory(editor_dir, filename)
\ No newline at end of file
+    image_path = safe_join(manga_editor.sessions_dir, session_id, filename)
+    if image_path is None or not os.path.isfile(image_path):
+        return abort(404)
+    return send_versioned_file(image_path)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from . import main_bp
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, send_file, abort
+from werkzeug.security import safe_join
 import os
 import time
 import concurrent.futures
@@ -7,10 +8,33 @@ import re
 import uuid
 from backend.config import get_settings
 from backend.file_utils.processing import process_single_file, process_manga_folder
-from backend.file_utils.folders import get_manga_folders, natural_sort_key
+from backend.file_utils.archives import is_archive, process_archive
+from backend.file_utils.folders import natural_sort_key
 from backend.models import get_optimal_ocr_engine
 from backend.auth import get_current_user, login_required
 from backend.file_utils.user_files import get_user_directory, ensure_user_directories, save_file
+from backend.image_processing import file_to_base64, INPAINT_MODES, INPAINT_BACKENDS
+from backend.translation import TRANSLATION_BACKENDS
+
+@main_bp.context_processor
+def inject_translation_backends():
+    """Показывает локальную модель перевода в форме, только если она установлена"""
+    local_backend = TRANSLATION_BACKENDS.get('local')
+    return {'local_translation_available': local_backend is not None and local_backend.is_available()}
+
+def inline_translated_images(results):
+    """
+    Встраивает переведенные изображения в результаты для отображения на странице.
+    Файлы кодируются в base64 как есть, без повторного декодирования
+    
+    Args:
+        results: Список результатов обработки
+    """
+    for file_result in results:
+        translated_path = file_result.get('translated_path')
+        if 'translated' in file_result or not translated_path or not os.path.exists(translated_path):
+            continue
+        file_result['translated'], file_result['translated_mime'] = file_to_base64(translated_path)
 
 @main_bp.route('/', methods=['GET', 'POST'])
 @login_required
@@ -26,9 +50,8 @@ def index():
 
     results = None
     error = None
-    
-    # Получаем список папок с мангой для текущего пользователя
-    manga_folders = get_manga_folders(current_user.id)
+    # Переведенные главы из архивов (CBZ), доступные для скачивания
+    translated_archives = []
     
     if request.method == 'POST':
         # Определяем тип формы
@@ -43,6 +66,14 @@ def index():
         
         edit_mode = request.form.get('edit_mode', 'false') == 'true'
 
+        # Метод удаления текста на фоне (тариф качества); пустое значение - из настроек
+        inpaint_method = request.form.get('inpaint_method') or settings.inpaint_method
+        if inpaint_method not in INPAINT_MODES and inpaint_method not in INPAINT_BACKENDS:
+            error = f"Неизвестный метод удаления текста: {inpaint_method}"
+            return render_template('index.html', results=None, error=error, 
+                                 use_gpu=USE_GPU,
+                                 current_user=current_user)
+
         # Получаем языки перевода
         source_language = request.form.get('source_language', 'zh')
         target_language = request.form.get('target_language', 'ru')
@@ -54,7 +85,7 @@ def index():
         if translation_method == 'openai' and not openai_api_key:
             error = "Необходимо указать API ключ OpenAI для перевода через gpt-4o-mini"
             return render_template('index.html', results=None, error=error, 
-                                 manga_folders=manga_folders, use_gpu=USE_GPU,
+                                 use_gpu=USE_GPU,
                                  current_user=current_user)
         
         if form_type == 'individual_files':
@@ -67,15 +98,34 @@ def index():
             # Создаем директории для пользователя
             ensure_user_directories(current_user.id)
             
+            # Архивы глав читаются из загруженного потока без распаковки на диск
+            archive_results = []
+            try:
+                for archive in [file for file in files if is_archive(file.filename)]:
+                    results, cbz_path = process_archive(archive.stream, archive.filename, translation_method,
+                                                 openai_api_key, ocr_engine, edit_mode=edit_mode,
+                                                 source_language=source_language, target_language=target_language,
+                                                 user_id=current_user.id, inpaint_method=inpaint_method)
+                    archive_results.extend(results)
+                    if cbz_path:
+                        translated_archives.append(os.path.basename(cbz_path))
+            except ValueError as e:
+                return render_template('index.html', results=None, error=str(e), 
+                                     use_gpu=USE_GPU,
+                                     current_user=current_user)
+            files = [file for file in files if not is_archive(file.filename)]
+            
             temp_files = []
             results_with_order = []
             
             try:
                 # Увеличиваем количество параллельных задач до 6
-                max_workers = min(12, len(files))
+                max_workers = min(12, len(files)) or 1
                 
                 # Создаем уникальный batch_id для группы файлов
                 batch_id = f"batch_{uuid.uuid4().hex}" if edit_mode else None
+                # Переводы одинаковых текстов переиспользуются в пределах загрузки
+                chapter_id = batch_id or f"chapter_{uuid.uuid4().hex}"
                 print(f"Обработка {len(files)} файлов с batch_id: {batch_id}")
                 
                 # Обрабатываем файлы параллельно
@@ -104,7 +154,9 @@ def index():
                             i,  # Передаем индекс файла
                             source_language,
                             target_language,
-                            current_user.id  # Передаем ID пользователя
+                            current_user.id,  # Передаем ID пользователя
+                            inpaint_method,
+                            chapter_id
                         )
                         # Связываем future с индексом файла и именем файла
                         future_to_index[future] = {
@@ -145,16 +197,16 @@ def index():
                             else:
                                 error = file_result.get('error_message', 'Неизвестная ошибка')
                                 return render_template('index.html', results=None, error=error, 
-                                                     manga_folders=manga_folders, use_gpu=USE_GPU,
+                                                     use_gpu=USE_GPU,
                                                      current_user=current_user)
                         except Exception as e:
                             error = f"Ошибка обработки файла: {str(e)}"
                             return render_template('index.html', results=None, error=error, 
-                                                 manga_folders=manga_folders, use_gpu=USE_GPU,
+                                                 use_gpu=USE_GPU,
                                                  current_user=current_user)
                 
-                # Сортируем результаты по исходному порядку
-                results = sorted(results_with_order, key=lambda x: x['original_index'])
+                # Сортируем результаты по исходному порядку, страницы архивов идут следом
+                results = sorted(results_with_order, key=lambda x: x['original_index']) + archive_results
                 
             except Exception as e:
                 import traceback
@@ -162,7 +214,7 @@ def index():
                 error = f"Ошибка обработки: {str(e)}"
                 print(error_traceback)
                 return render_template('index.html', results=None, error=error, 
-                                     manga_folders=manga_folders, use_gpu=USE_GPU,
+                                     use_gpu=USE_GPU,
                                      current_user=current_user)
             finally:
                 # Удаляем временные файлы
@@ -183,13 +235,13 @@ def index():
                 if not folder_path.startswith(user_books_dir):
                     error = "Доступ запрещен: папка не принадлежит текущему пользователю"
                     return render_template('index.html', results=None, error=error, 
-                                         manga_folders=manga_folders, use_gpu=USE_GPU,
+                                         use_gpu=USE_GPU,
                                          current_user=current_user)
                 
                 results = process_manga_folder(folder_path, translation_method, 
                                              openai_api_key, ocr_engine, edit_mode=edit_mode, 
                                              source_language=source_language, target_language=target_language,
-                                             user_id=current_user.id)
+                                             user_id=current_user.id, inpaint_method=inpaint_method)
             else:
                 # Проверка, выбрана ли папка и выбранные изображения
                 folder_path = request.form.get('folder_path')
@@ -201,7 +253,7 @@ def index():
                     if not folder_path.startswith(user_books_dir):
                         error = "Доступ запрещен: папка не принадлежит текущему пользователю"
                         return render_template('index.html', results=None, error=error, 
-                                             manga_folders=manga_folders, use_gpu=USE_GPU,
+                                             use_gpu=USE_GPU,
                                              current_user=current_user)
                     
                     # Сортируем выбранные изображения по естественному порядку
@@ -210,19 +262,33 @@ def index():
                                                  openai_api_key, ocr_engine, 
                                                  selected_images, edit_mode=edit_mode, 
                                                  source_language=source_language, target_language=target_language,
-                                                 user_id=current_user.id)
+                                                 user_id=current_user.id, inpaint_method=inpaint_method)
                 elif folder_path:
                     error = "Не выбрано ни одного изображения для перевода"
                     return render_template('index.html', results=None, error=error, 
-                                        manga_folders=manga_folders, use_gpu=USE_GPU,
+                                        use_gpu=USE_GPU,
                                         current_user=current_user)
                 else:
                     error = "Не выбрана папка для перевода"
                     return render_template('index.html', results=None, error=error, 
-                                        manga_folders=manga_folders, use_gpu=USE_GPU,
+                                        use_gpu=USE_GPU,
                                         current_user=current_user)
     
+    # Изображения встраиваются в страницу только при ее отображении
+    if results:
+        inline_translated_images(results)
+    
     # Всегда возвращаем шаблон index.html
     return render_template('index.html', results=results, error=error, 
-                          manga_folders=manga_folders, use_gpu=USE_GPU,
-                          current_user=current_user)
\ No newline at end of file
+                          use_gpu=USE_GPU, translated_archives=translated_archives,
+                          current_user=current_user)
+
+@main_bp.route('/translated/<path:filename>')
+@login_required
+def download_translated(filename):
+    """Скачивание переведенного файла пользователя (например, CBZ главы из архива)"""
+    current_user = get_current_user()
+    file_path = safe_join(get_user_directory(current_user.id, "translated"), filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return abort(404)
+    return send_file(file_path, as_attachment=True)
\ No newline at end of file
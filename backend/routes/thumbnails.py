@@ -1,15 +1,28 @@
 from . import thumbnails_bp
-from flask import redirect, url_for, send_from_directory, abort
+from flask import redirect, url_for, abort, request
+from werkzeug.security import safe_join
 import os
-from PIL import Image
+from backend.config import get_settings
 from backend.file_utils.user_files import get_user_directory
+from backend.file_utils.thumbnails import get_thumbnail_generator, select_thumbnail_size, THUMBNAIL_SIZES, THUMBNAIL_SOURCE_EXTENSIONS
 from backend.auth import login_required, get_current_user
+from .caching import send_versioned_file, send_uncached_file
+
+def send_pending_thumbnail(image_path):
+    """
+    Ответ, пока миниатюра создается в фоне: исходное изображение без кеширования,
+    чтобы при следующем запросе браузер получил готовую миниатюру
+    """
+    if not os.path.isfile(image_path) or not image_path.lower().endswith(THUMBNAIL_SOURCE_EXTENSIONS):
+        return abort(404)
+    return send_uncached_file(image_path)
 
 @thumbnails_bp.route('/thumbnails/<user_id>/<folder>/<filename>')
 @login_required
 def serve_user_thumbnail(user_id, folder, filename):
     """
-    Обслуживание миниатюр пользовательских изображений
+    Обслуживание миниатюр пользовательских изображений.
+    Размер задается параметром size (по умолчанию наименьший)
     """
     current_user = get_current_user()
     
@@ -21,48 +34,38 @@ def serve_user_thumbnail(user_id, folder, filename):
     if current_user.id != user_id:
         return abort(403)
     
-    # Путь к оригинальному изображению
-    image_path = os.path.join(get_user_directory(user_id, "books"), folder, filename)
-    
-    # Путь к миниатюре
-    thumbnail_dir = os.path.join(get_user_directory(user_id, "thumbnails"), folder)
-    thumbnail_path = os.path.join(thumbnail_dir, filename)
+    # Путь к оригинальному изображению (имена с переходом вверх по директориям отклоняются)
+    image_path = safe_join(get_user_directory(user_id, "books"), folder, filename)
+    if image_path is None:
+        return abort(404)
     
-    # Создаем миниатюру, если она не существует
-    if not os.path.exists(thumbnail_path):
-        create_thumbnail_for_image(image_path, thumbnail_path)
+    # Миниатюры обычно уже созданы при сохранении файла; если нет - создаются в фоне,
+    # а запрос не ждет пула процессов
+    size = select_thumbnail_size(request.args.get('size', THUMBNAIL_SIZES[0], type=int))
+    thumbnail_path = get_thumbnail_generator().ensure(
+        image_path, get_user_directory(user_id, "thumbnails"), folder, filename, size
+    )
+    if thumbnail_path is None:
+        return send_pending_thumbnail(image_path)
     
-    return send_from_directory(os.path.dirname(thumbnail_path), os.path.basename(thumbnail_path))
+    # URL из списка папок содержит версию миниатюры, такой ответ кешируется браузером бессрочно
+    return send_versioned_file(thumbnail_path, mimetype='image/webp')
 
 @thumbnails_bp.route('/frontend/static/thumbnails/<folder>/<filename>')
 def serve_thumbnail(folder, filename):
     """
     Обслуживание миниатюр изображений (для общих файлов)
     """
-    # Путь к оригинальному изображению
-    image_path = os.path.join('books', folder, filename)
+    settings = get_settings()
     
-    # Путь к миниатюре
-    thumbnail_dir = os.path.join('static', 'thumbnails', folder)
-    thumbnail_path = os.path.join(thumbnail_dir, filename)
+    # Путь к оригинальному изображению (имена с переходом вверх по директориям отклоняются)
+    image_path = safe_join(settings.books_dir, folder, filename)
+    if image_path is None:
+        return abort(404)
     
-    # Создаем миниатюру, если она не существует
-    if not os.path.exists(thumbnail_path):
-        create_thumbnail_for_image(image_path, thumbnail_path)
-    
-    return redirect(url_for('static', filename=f'thumbnails/{folder}/{filename}'))
-
-def create_thumbnail_for_image(image_path, thumbnail_path, size=(150, 150)):
-    """
-    Создание миниатюры для изображения
-    """
-    # Создаем директорию для миниатюры, если она не существует
-    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    size = select_thumbnail_size(request.args.get('size', THUMBNAIL_SIZES[0], type=int))
+    thumbnail_path = get_thumbnail_generator().ensure(image_path, settings.thumbnails_dir, folder, filename, size)
+    if thumbnail_path is None:
+        return send_pending_thumbnail(image_path)
     
-    # Создаем миниатюру
-    try:
-        img = Image.open(image_path)
-        img.thumbnail(size)
-        img.save(thumbnail_path)
-    except Exception as e:
-        print(f"Ошибка при создании миниатюры для {image_path}: {e}")
\ No newline at end of file
+    return redirect(url_for('static', filename=f'thumbnails/{folder}/{os.path.basename(thumbnail_path)}'))
\ No newline at end of file
@@ -2,60 +2,69 @@
 Модуль для перевода текста из манги
 """
 
-from .google_translator import translate_with_google
-from .openai_translator import translate_with_openai
-from .batch import batch_translate_with_openai
+from .client import get_translation_client, TranslationClient
+from .google_translator import translate_with_google, translate_with_google_async
+from .openai_translator import translate_with_openai, translate_with_openai_async
+from .batch import batch_translate_with_openai, batch_translate_with_openai_async
+from .planner import estimate_tokens, plan_batches, plan_translation_batches, plan_chapter_batches
+from .local_translator import get_local_translator, translate_with_local_async
+from .backends import TranslationBackend, TRANSLATION_BACKENDS, get_translation_backend, register_translation_backend
+from .classifier import classify_text, classify_blocks, set_language_rules
+from .dedup import translate_deduplicated, normalize_text, get_chapter_cache
+from .context import with_chapter, get_chapter_context
+from .ratelimit import with_user, get_rate_limiter, get_usage_tracker
+from .resilience import with_deadline, CircuitOpenError, DeadlineExceededError
+from .metrics import get_translation_metrics
 
-def translate_text_blocks(text_blocks, translation_method='google', openai_api_key=None, src_lang='zh', dest_lang='ru'):
+def translate_text_blocks(text_blocks, translation_method='google', openai_api_key=None, src_lang='zh', dest_lang='ru', on_block=None, chapter_id=None, user_id=None):
     """
     Переводит текстовые блоки с использованием выбранного метода перевода
     
     Args:
         text_blocks: Список блоков текста с ключами 'id', 'box', 'text'
-        translation_method: Метод перевода ('google' или 'openai')
+        translation_method: Метод перевода (имя сервиса: 'google', 'openai' или 'local')
         openai_api_key: API ключ OpenAI (если используется translation_method='openai')
         src_lang: Язык оригинала (ja, zh, ko, en и т.д.)
         dest_lang: Язык перевода (ru, en, ja, zh и т.д.)
+        on_block: Функция on_block(индекс блока, перевод), вызываемая по мере готовности
+            каждого блока из потока клиента перевода (для отрисовки до завершения всей страницы)
+        chapter_id: ID главы: одинаковые тексты на страницах главы переводятся один раз,
+            а запросы к OpenAI получают краткое содержание и глоссарий главы
+        user_id: ID пользователя для ограничения частоты запросов и учета расхода
         
     Returns:
         tuple: (переведенные блоки, сообщение об ошибке или None если без ошибок)
     """
-    # Импортируем словари кодов языков для разных сервисов
-    from backend.models.constants import GOOGLE_LANG_CODES, OPENAI_LANG_NAMES
+    from backend.config import get_settings
+    settings = get_settings()
     
     print(f"Перевод {len(text_blocks)} текстовых блоков методом {translation_method} с {src_lang} на {dest_lang}...")
     
-    # Преобразуем коды языков в нужные форматы для разных систем перевода
-    google_src = GOOGLE_LANG_CODES.get(src_lang, 'auto')
-    google_dest = GOOGLE_LANG_CODES.get(dest_lang, 'ru')
-    
-    openai_src = OPENAI_LANG_NAMES.get(src_lang, 'Chinese')
-    openai_dest = OPENAI_LANG_NAMES.get(dest_lang, 'Russian')
-    
     try:
-        if translation_method == 'openai' and not openai_api_key:
+        backend = get_translation_backend(translation_method)
+        if backend.requires_api_key and not openai_api_key:
             raise ValueError("API ключ OpenAI не указан для перевода через gpt-4o-mini")
         
-        if translation_method == 'openai':
-            non_empty_blocks = [b for b in text_blocks if b['text'].strip()]
-            print(f"Отправка {len(non_empty_blocks)} непустых блоков на перевод...")
-            translated_texts = batch_translate_with_openai(
-                text_blocks, openai_api_key, src_lang=openai_src, dest_lang=openai_dest
-            )
-            for i, block in enumerate(text_blocks):
-                if i < len(translated_texts):
-                    block['translated_text'] = translated_texts[i]
-                else:
-                    block['translated_text'] = ""
+        # Блоки без языкового содержания и мусор распознавания не отправляются на перевод
+        if settings.translation_classifier_enabled:
+            to_translate, skipped = classify_blocks(text_blocks, src_lang)
         else:
-            for i, block in enumerate(text_blocks):
-                if block['text'].strip():
-                    translation = translate_with_google(block['text'], src_lang=google_src, dest_lang=google_dest)
-                    block['translated_text'] = translation if translation else "[Ошибка перевода]"
-                    import time
-                    time.sleep(0.5)
-                else:
-                    block['translated_text'] = ""
+            to_translate, skipped = list(range(len(text_blocks))), {}
+        for i, text in skipped.items():
+            text_blocks[i]['translated_text'] = text
+            if on_block is not None and text:
+                on_block(i, text)
+        
+        def on_translated_block(index, translation):
+            on_block(to_translate[index], translation)
+        
+        coro = translate_deduplicated(backend, [text_blocks[i] for i in to_translate], src_lang, dest_lang,
+                                      api_key=openai_api_key, chapter_id=chapter_id,
+                                      on_block=on_translated_block if on_block is not None else None)
+        coro = with_deadline(coro, settings.translation_page_deadline)
+        translations = get_translation_client().run(with_chapter(with_user(coro, user_id), chapter_id))
+        for i, translation in zip(to_translate, translations):
+            text_blocks[i]['translated_text'] = translation
         return text_blocks, None
     except Exception as e:
         error_message = f"Ошибка перевода: {str(e)}"
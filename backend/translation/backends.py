@@ -0,0 +1,141 @@
+"""
+Сервисы перевода с общим интерфейсом
+
+Каждый сервис переводит блоки страницы целиком и сообщает о готовых блоках
+через on_block. Сервисы регистрируются по имени, которое совпадает
+со значением translation_method
+"""
+import asyncio
+from .google_translator import translate_with_google_async
+from .batch import batch_translate_with_openai_async, _is_skipped
+from .local_translator import get_local_translator, translate_with_local_async
+
+class TranslationBackend:
+    """
+    Базовый сервис перевода
+    """
+    name = None
+    # Нужен ли API ключ OpenAI
+    requires_api_key = False
+
+    def is_available(self):
+        """
+        Returns:
+            bool: Доступен ли сервис в текущем окружении
+        """
+        return True
+
+    async def translate_blocks(self, text_blocks, src_lang, dest_lang, api_key=None, on_block=None):
+        """
+        Переводит блоки страницы
+
+        Args:
+            text_blocks: Список блоков текста с ключом 'text'
+            src_lang: Язык оригинала (ja, zh, ko, en и т.д.)
+            dest_lang: Язык перевода (ru, en, ja, zh и т.д.)
+            api_key: API ключ сервиса (если требуется)
+            on_block: Функция on_block(индекс блока, перевод), вызываемая по мере готовности блоков
+
+        Returns:
+            list: Переведенные тексты в порядке блоков
+        """
+        raise NotImplementedError
+
+class GoogleBackend(TranslationBackend):
+    """
+    Google Translate: отдельный запрос на каждый блок, запросы выполняются параллельно
+    """
+    name = 'google'
+
+    async def translate_blocks(self, text_blocks, src_lang, dest_lang, api_key=None, on_block=None):
+        from backend.models.constants import GOOGLE_LANG_CODES
+        google_src = GOOGLE_LANG_CODES.get(src_lang, 'auto')
+        google_dest = GOOGLE_LANG_CODES.get(dest_lang, 'ru')
+
+        async def translate_block(index, block):
+            if not block['text'].strip():
+                return ""
+            translation = await translate_with_google_async(block['text'], src_lang=google_src, dest_lang=google_dest)
+            translation = translation if translation else "[Ошибка перевода]"
+            if on_block is not None:
+                on_block(index, translation)
+            return translation
+
+        return await asyncio.gather(*[translate_block(i, block) for i, block in enumerate(text_blocks)])
+
+class OpenAIBackend(TranslationBackend):
+    """
+    OpenAI gpt-4o-mini: пакетный перевод всех блоков страницы одним запросом
+    """
+    name = 'openai'
+    requires_api_key = True
+
+    async def translate_blocks(self, text_blocks, src_lang, dest_lang, api_key=None, on_block=None):
+        from backend.models.constants import OPENAI_LANG_NAMES
+        translations = await batch_translate_with_openai_async(
+            text_blocks, api_key,
+            src_lang=OPENAI_LANG_NAMES.get(src_lang, 'Chinese'),
+            dest_lang=OPENAI_LANG_NAMES.get(dest_lang, 'Russian'),
+            on_block=on_block
+        )
+        return translations + [""] * (len(text_blocks) - len(translations))
+
+class LocalBackend(TranslationBackend):
+    """
+    Локальная модель CTranslate2 на CPU: все блоки страницы переводятся одним пакетом без сети
+    """
+    name = 'local'
+
+    def is_available(self):
+        return get_local_translator().is_available()
+
+    async def translate_blocks(self, text_blocks, src_lang, dest_lang, api_key=None, on_block=None):
+        texts = [block['text'].strip() for block in text_blocks]
+        indices = [i for i, text in enumerate(texts) if not _is_skipped(text)]
+
+        translated = await translate_with_local_async([texts[i] for i in indices], src_lang, dest_lang)
+
+        # Пропущенные блоки (пустые и пунктуация) остаются без изменений
+        translations = list(texts)
+        for i, translation in zip(indices, translated):
+            translations[i] = translation or "[Ошибка перевода]"
+        if on_block is not None:
+            for i, translation in enumerate(translations):
+                if translation:
+                    on_block(i, translation)
+        return translations
+
+# Зарегистрированные сервисы перевода
+TRANSLATION_BACKENDS = {
+    backend.name: backend
+    for backend in (GoogleBackend(), OpenAIBackend(), LocalBackend())
+}
+
+def register_translation_backend(backend):
+    """
+    Регистрирует сервис перевода
+
+    Args:
+        backend: Экземпляр TranslationBackend с уникальным name
+    """
+    TRANSLATION_BACKENDS[backend.name] = backend
+
+def get_translation_backend(name):
+    """
+    Возвращает сервис перевода по имени
+
+    Args:
+        name: Имя сервиса ('google', 'openai', 'local')
+
+    Returns:
+        TranslationBackend: Сервис перевода
+
+    Raises:
+        ValueError: Неизвестный или недоступный сервис
+    """
+    backend = TRANSLATION_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Неизвестный метод перевода: {name}")
+    if not backend.is_available():
+        raise ValueError(f"Метод перевода {name} недоступен в этой установке")
+    return backend
\ No newline at end of file
@@ -1,104 +1,316 @@
 """
 Модуль для пакетного перевода текстовых блоков
+
+Блоки передаются модели в JSON с идентификаторами, ответ запрашивается
+в режиме structured output по JSON-схеме и сопоставляется по id.
+Блоки распределяются по запросам по бюджету токенов (см. planner),
+пропущенные моделью блоки перезапрашиваются одним дополнительным пакетом
 """
 import re
-import time
-from openai import OpenAI
-from .openai_translator import translate_with_openai
+import copy
+import json
+import asyncio
+from .client import get_translation_client
+from .planner import plan_translation_batches
+from .context import get_chapter_context
+from .metrics import get_translation_metrics
+from .resilience import resilient_call, CircuitOpenError, DeadlineExceededError
+
+# Одиночные знаки пунктуации, которые не отправляются на перевод
+PUNCTUATION_ONLY = ".,!?;:、。！？；："
+
+# Количество пакетов восстановления для блоков, пропущенных моделью
+REPAIR_ATTEMPTS = 1
+
+# JSON-схема ответа модели
+TRANSLATION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "manga_translations",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "translations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer"},
+                            "text": {"type": "string"}
+                        },
+                        "required": ["id", "text"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["translations"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# JSON-схема ответа с обновлением контекста главы; translations идут первыми,
+# чтобы блоки разбирались потоком до получения глоссария и содержания
+CONTEXT_RESPONSE_FORMAT = copy.deepcopy(TRANSLATION_RESPONSE_FORMAT)
+CONTEXT_RESPONSE_SCHEMA = CONTEXT_RESPONSE_FORMAT["json_schema"]["schema"]
+CONTEXT_RESPONSE_SCHEMA["properties"]["glossary"] = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "source": {"type": "string"},
+            "target": {"type": "string"}
+        },
+        "required": ["source", "target"],
+        "additionalProperties": False
+    }
+}
+CONTEXT_RESPONSE_SCHEMA["properties"]["summary"] = {"type": "string"}
+CONTEXT_RESPONSE_SCHEMA["required"] = ["translations", "glossary", "summary"]
+
+# Завершенный элемент массива translations; в strict-режиме ключи идут в порядке схемы
+TRANSLATION_ITEM_PATTERN = re.compile(r'\{\s*"id"\s*:\s*(\d+)\s*,\s*"text"\s*:\s*"((?:[^"\\]|\\.)*)"\s*\}')
+
+class TranslationStreamParser:
+    """
+    Инкрементальный разбор JSON-ответа {"translations": [{"id": N, "text": "..."}]}
+    по мере поступления токенов. Элемент возвращается, как только получена его
+    закрывающая скобка, поэтому обрезанный ответ также разбирается до последнего полного элемента
+    """
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, delta):
+        """
+        Добавляет фрагмент ответа
+
+        Args:
+            delta: Очередной фрагмент текста
+
+        Returns:
+            list: Завершенные элементы [(id блока, перевод)]
+        """
+        self.buffer += delta
+        completed = []
+        end = 0
+        for match in TRANSLATION_ITEM_PATTERN.finditer(self.buffer):
+            try:
+                text = json.loads(f'"{match.group(2)}"')
+            except json.JSONDecodeError:
+                continue
+            completed.append((int(match.group(1)), text.strip()))
+            end = match.end()
+        # В буфере остается только незавершенный хвост
+        self.buffer = self.buffer[end:]
+        return completed
+
+def _is_skipped(text):
+    return not text or (len(text) == 1 and text in PUNCTUATION_ONLY)
+
+def _build_messages(texts, src_lang, dest_lang, context_text=None):
+    """
+    Формирует запрос пакетного перевода
+
+    Args:
+        texts: Список текстов; id блока в запросе - его индекс в списке
+        context_text: Контекст главы (None - запрос без контекста)
 
-def batch_translate_with_openai(text_blocks, api_key, src_lang='Simplified Chinese, 简体中文', dest_lang='Russian', model="gpt-4o-mini"):
+    Returns:
+        list: Сообщения чата
+    """
+    payload = json.dumps(
+        {"blocks": [{"id": block_id, "text": text} for block_id, text in enumerate(texts)]},
+        ensure_ascii=False
+    )
+    messages = [
+        {"role": "system", "content": f"You are a translator of {src_lang} manga into {dest_lang}. Translate the following text fragments accurately and naturally, preserving the conversational tone, humor, and cultural context of manga. Make the translation sound casual and engaging, as if it's spoken by characters in a manga. Return exactly one translation for every input fragment with the same id; never merge, split or renumber fragments."}
+    ]
+    if context_text is not None:
+        messages.append({"role": "system", "content": "The fragments belong to the same chapter. Use the context below to keep names and terms consistent. In 'glossary' list character names and recurring terms from these fragments with the translations you used. In 'summary' return an updated summary of the story so far in two or three sentences, merging the previous summary with these fragments." + (f"\n\n{context_text}" if context_text else "")})
+    messages.append({"role": "user", "content": payload})
+    return messages
+
+def _update_context(context, response_text):
+    """Обновляет контекст главы глоссарием и содержанием из ответа модели"""
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError:
+        return
+    glossary = [(item.get('source', ''), item.get('target', '')) for item in data.get('glossary', [])
+                if isinstance(item, dict)]
+    context.update(summary=data.get('summary'), glossary=glossary)
+
+async def _request_translations(batch, api_key, src_lang, dest_lang, model, add_translation, stream):
+    """
+    Выполняет один пакетный запрос и передает каждый полученный перевод в add_translation
+
+    Args:
+        batch: Список пар (ключ блока, текст); в запросе блоки нумеруются по порядку
+    """
+    from backend.config import get_settings
+    client = get_translation_client()
+    keys = [key for key, _ in batch]
+
+    # Контекст главы прикладывается к запросу в пределах бюджета токенов
+    context = get_chapter_context()
+    if context is not None:
+        context_text = context.render(get_settings().translation_context_max_tokens)
+        response_format = CONTEXT_RESPONSE_FORMAT
+    else:
+        context_text = None
+        response_format = TRANSLATION_RESPONSE_FORMAT
+    messages = _build_messages([text for _, text in batch], src_lang, dest_lang, context_text)
+
+    def add_item(block_id, translation):
+        if 0 <= block_id < len(keys):
+            add_translation(keys[block_id], translation)
+
+    async def stream_request():
+        parser = TranslationStreamParser()
+        parts = []
+        async for delta in client.openai_chat_stream(api_key, messages, model=model, temperature=0.3,
+                                                     response_format=response_format):
+            parts.append(delta)
+            for block_id, translation in parser.feed(delta):
+                add_item(block_id, translation)
+        return "".join(parts)
+
+    if stream:
+        # Потоковый режим: элементы разбираются по мере поступления токенов
+        translated_text = await resilient_call('openai', stream_request)
+    else:
+        translated_text = await client.openai_chat(api_key, messages, model=model, temperature=0.3,
+                                                   response_format=response_format)
+        for block_id, translation in TranslationStreamParser().feed(translated_text):
+            add_item(block_id, translation)
+
+    if context is not None:
+        _update_context(context, translated_text)
+
+async def _translate_texts(texts, api_key, src_lang, dest_lang, model, on_translation=None, stream=False):
+    """
+    Переводит тексты пакетами по бюджету токенов: пакеты отправляются параллельно,
+    пропущенные моделью блоки перезапрашиваются общим пакетом восстановления
+
+    Args:
+        texts: Словарь {ключ блока: текст}
+        on_translation: Функция on_translation(ключ блока, перевод) для каждого полученного блока
+        stream: Читать ответы потоком
+
+    Returns:
+        dict: {ключ блока: перевод} для переведенных блоков
+    """
+    metrics = get_translation_metrics()
+    translations = {}
+
+    def add_translation(key, translation):
+        # Неизвестные ключи игнорируются, блок передается дальше один раз
+        if key in texts and key not in translations and translation:
+            translations[key] = translation
+            if on_translation is not None:
+                on_translation(key, translation)
+
+    pending = dict(texts)
+    for attempt in range(REPAIR_ATTEMPTS + 1):
+        batches = plan_translation_batches(pending)
+        if attempt > 0:
+            print(f"Повторный запрос {len(pending)} пропущенных блоков в {len(batches)} пакетах")
+            metrics.record("openai.repair_requests", len(batches))
+        else:
+            metrics.record("openai.batch_requests", len(batches))
+
+        results = await asyncio.gather(*[
+            _request_translations(batch, api_key, src_lang, dest_lang, model, add_translation, stream)
+            for batch in batches
+        ], return_exceptions=True)
+
+        stop = False
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                print(f"Ошибка пакетного перевода: {str(result)}")
+                # Сервис недоступен или время страницы исчерпано: повторные запросы не помогут
+                stop = stop or isinstance(result, (CircuitOpenError, DeadlineExceededError))
+            missed = sum(1 for key, _ in batch if key not in translations)
+            if attempt == 0:
+                metrics.record("openai.batch_blocks", len(batch))
+                metrics.record("openai.batch_missed", missed)
+                print(f"Доля пропущенных блоков в пакете: {missed}/{len(batch)} ({missed / len(batch):.0%})")
+            else:
+                metrics.record("openai.repair_recovered", len(batch) - missed)
+
+        pending = {key: text for key, text in pending.items() if key not in translations}
+        if not pending or stop:
+            break
+
+    if pending:
+        metrics.record("openai.batch_failed", len(pending))
+    return translations
+
+def _collect_page_texts(text_blocks, on_block=None):
+    """Возвращает {индекс блока: текст} для блоков, которые нужно переводить"""
+    texts = {}
+    for i, block in enumerate(text_blocks):
+        text = block['text'].strip()
+        if not _is_skipped(text):
+            texts[i] = text
+        elif on_block is not None and text:
+            on_block(i, text)
+    return texts
+
+def _page_result(text_blocks, translations):
+    """Формирует список переводов в порядке блоков страницы"""
+    result = []
+    for i, block in enumerate(text_blocks):
+        text = block['text'].strip()
+        if _is_skipped(text):
+            result.append(text)
+        else:
+            result.append(translations.get(i, "[Ошибка перевода]"))
+    return result
+
+async def batch_translate_with_openai_async(text_blocks, api_key, src_lang='Simplified Chinese, 简体中文', dest_lang='Russian', model="gpt-4o-mini", on_block=None):
+    """
+    Асинхронно выполняет пакетный перевод нескольких текстовых блоков через OpenAI
+
+    Args:
+        text_blocks: Список блоков текста с ключами 'id', 'box', 'text'
+        api_key: API ключ OpenAI
+        src_lang: Язык оригинала (человекочитаемое название)
+        dest_lang: Язык перевода (человекочитаемое название)
+        model: Модель OpenAI для перевода
+        on_block: Функция on_block(индекс блока, перевод); если указана, ответ модели
+            читается потоком и каждый блок передается сразу после получения
+            (вызывается из цикла событий клиента перевода)
+
+    Returns:
+        list: Список переведенных текстов
+    """
+    texts = _collect_page_texts(text_blocks, on_block)
+    if not texts:
+        # Пустые блоки и пунктуация возвращаются как есть, по одному на блок
+        return _page_result(text_blocks, {})
+
+    translations = await _translate_texts(texts, api_key, src_lang, dest_lang, model,
+                                          on_translation=on_block, stream=on_block is not None)
+    return _page_result(text_blocks, translations)
+
+def batch_translate_with_openai(text_blocks, api_key, src_lang='Simplified Chinese, 简体中文', dest_lang='Russian', model="gpt-4o-mini", on_block=None):
     """
     Выполняет пакетный перевод нескольких текстовых блоков через OpenAI
-    
+
     Args:
         text_blocks: Список блоков текста с ключами 'id', 'box', 'text'
         api_key: API ключ OpenAI
         src_lang: Язык оригинала (человекочитаемое название)
         dest_lang: Язык перевода (человекочитаемое название)
         model: Модель OpenAI для перевода
-        
+        on_block: Функция on_block(индекс блока, перевод) для потокового режима
+
     Returns:
         list: Список переведенных текстов
     """
-    # Фильтруем непустые блоки и блоки, содержащие более одного символа пунктуации
-    valid_blocks = []
-    original_indices = []
-    for i, block in enumerate(text_blocks):
-        text = block['text'].strip()
-        if text and not (len(text) == 1 and text in ".,!?;:、。！？；："):
-            valid_blocks.append(text)
-            original_indices.append(i)
-    
-    if not valid_blocks:
-        return []
-    
-    # Формируем запрос для пакетного перевода
-    prompt = ""
-    for i, text in enumerate(valid_blocks):
-        prompt += f"[Block {i+1}]: {text}\n\n"
-    
-    try:
-        # Выполняем пакетный перевод через OpenAI
-        client = OpenAI(api_key=api_key)
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": f"You are a translator of {src_lang} manga into {dest_lang}. Translate the following text fragments accurately and naturally, preserving the conversational tone, humor, and cultural context of manga. Make the translation sound casual and engaging, as if it's spoken by characters in a manga. Only return the translation in the same format '[Block X]: translation'."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
-        translated_text = completion.choices[0].message.content.strip()
-        
-        # Парсим результаты
-        translations = {}
-        pattern = re.compile(r'\[Block\s*(\d+)\]\s*:\s*(.*?)(?=\[Block\s*\d+\]|$)', re.DOTALL)
-        matches = pattern.findall(translated_text)
-        
-        for match in matches:
-            try:
-                block_num = int(match[0]) - 1
-                translation = match[1].strip()
-                if 0 <= block_num < len(valid_blocks):
-                    translations[block_num] = translation
-            except (ValueError, IndexError):
-                continue
-        
-        # Формируем результат, сохраняя порядок блоков
-        result = []
-        for i, block in enumerate(text_blocks):
-            text = block['text'].strip()
-            if not text or (len(text) == 1 and text in ".,!?;:、。！？；："):
-                result.append(text)
-                continue
-            try:
-                idx = original_indices.index(i)
-                if idx in translations:
-                    result.append(translations[idx])
-                else:
-                    print(f"Индивидуальный перевод для блока {i}: {text}")
-                    result.append(translate_with_openai(text, api_key, src_lang, dest_lang))
-            except ValueError:
-                result.append("[Ошибка перевода]")
-        return result
-    except Exception as e:
-        print(f"Ошибка пакетного перевода: {str(e)}")
-        
-        # В случае ошибки пакетного перевода, пытаемся перевести каждый блок отдельно
-        result = []
-        for i, block in enumerate(text_blocks):
-            text = block['text'].strip()
-            if not text or (len(text) == 1 and text in ".,!?;:、。！？；："):
-                result.append(text)
-                continue
-            try:
-                if i in original_indices:
-                    print(f"Индивидуальный перевод блока {i}: {text}")
-                    result.append(translate_with_openai(text, api_key, src_lang, dest_lang))
-                    time.sleep(0.2)
-                else:
-                    result.append("")
-            except Exception as e:
-                print(f"Ошибка индивидуального перевода: {str(e)}")
-                result.append("[Ошибка перевода]")
-        return result
\ No newline at end of file
+    return get_translation_client().run(
+        batch_translate_with_openai_async(text_blocks, api_key, src_lang, dest_lang, model, on_block)
+    )
\ No newline at end of file
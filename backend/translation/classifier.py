@@ -0,0 +1,126 @@
+"""
+Классификация текстовых блоков перед переводом
+
+Блоки без языкового содержания (пунктуация, числа, звукоподражания)
+и мусор распознавания не отправляются на перевод:
+первые выводятся как есть, вторые не выводятся
+"""
+import re
+import unicodedata
+from .metrics import get_translation_metrics
+
+# Результаты классификации
+TRANSLATE = 'translate'
+PASSTHROUGH = 'passthrough'
+NOISE = 'noise'
+
+# Правила по языку оригинала:
+#   min_letters - минимум букв для перевода; блоки с меньшим числом букв выводятся как есть
+#   latin_noise_max - блоки только из латиницы/цифр не длиннее этого значения считаются
+#       мусором OCR (для языков без латиницы), 0 - правило отключено. По умолчанию
+#       отключено везде: в манге на ja/zh/ko короткие реплики "OK", "No", "Hi" пишутся
+#       латиницей, и их нельзя отличить от мусора по длине
+#   sfx_patterns - регулярные выражения звукоподражаний, которые выводятся как есть
+LANGUAGE_RULES = {
+    'ja': {
+        'min_letters': 1,
+        'latin_noise_max': 0,
+        # Повтор одного-двух знаков каны: ドドドド, ゴゴゴ, ざわざわ
+        'sfx_patterns': [r'^([぀-ヿー]{1,2})\1{2,}[ー!！?？~〜…・.]*$'],
+    },
+    'zh': {
+        'min_letters': 1,
+        'latin_noise_max': 0,
+        'sfx_patterns': [],
+    },
+    'ko': {
+        'min_letters': 1,
+        'latin_noise_max': 0,
+        # Повтор одного-двух слогов хангыля: 쾅쾅쾅, 두근두근두근
+        'sfx_patterns': [r'^([가-힯]{1,2})\1{2,}[!！?？~….]*$'],
+    },
+}
+
+DEFAULT_RULES = {
+    'min_letters': 1,
+    'latin_noise_max': 0,
+    'sfx_patterns': [],
+}
+
+LATIN_NOISE_PATTERN = re.compile(r'^[A-Za-z0-9]+$')
+
+def set_language_rules(lang, **rules):
+    """
+    Изменяет правила классификации для языка оригинала
+
+    Args:
+        lang: Код языка (ja, zh, ko, en и т.д.)
+        **rules: min_letters, latin_noise_max, sfx_patterns
+    """
+    LANGUAGE_RULES.setdefault(lang, dict(DEFAULT_RULES)).update(rules)
+
+def _count_letters(text):
+    return sum(1 for char in text if unicodedata.category(char).startswith('L'))
+
+def classify_text(text, src_lang='zh'):
+    """
+    Определяет, нужно ли переводить текст блока
+
+    Args:
+        text: Текст блока
+        src_lang: Язык оригинала
+
+    Returns:
+        str: TRANSLATE, PASSTHROUGH (вывести как есть) или NOISE (не выводить)
+    """
+    rules = LANGUAGE_RULES.get(src_lang, DEFAULT_RULES)
+    compact = ''.join(text.split())
+    if not compact:
+        return PASSTHROUGH
+
+    # Пунктуация, числа и символы без букв: "...", "!?", "123", "♥"
+    if _count_letters(compact) < rules['min_letters']:
+        return PASSTHROUGH
+
+    # Короткая латиница в тексте на языке без латиницы - обычно мусор распознавания
+    latin_noise_max = rules['latin_noise_max']
+    if latin_noise_max and len(compact) <= latin_noise_max and LATIN_NOISE_PATTERN.match(compact):
+        return NOISE
+
+    normalized = unicodedata.normalize('NFKC', compact)
+    for pattern in rules['sfx_patterns']:
+        if re.match(pattern, normalized):
+            return PASSTHROUGH
+
+    return TRANSLATE
+
+def classify_blocks(text_blocks, src_lang='zh'):
+    """
+    Разделяет блоки на требующие перевода и не требующие
+
+    Args:
+        text_blocks: Список блоков текста с ключом 'text'
+        src_lang: Язык оригинала
+
+    Returns:
+        tuple: (индексы блоков для перевода, {индекс блока: итоговый текст} для остальных)
+    """
+    metrics = get_translation_metrics()
+    to_translate = []
+    skipped = {}
+    for i, block in enumerate(text_blocks):
+        text = block['text'].strip()
+        category = classify_text(text, src_lang)
+        if category == TRANSLATE:
+            to_translate.append(i)
+            continue
+        skipped[i] = text if category == PASSTHROUGH else ""
+        if text:
+            metrics.record(f"classifier.{category}")
+
+    # Каждый пропущенный непустой блок - сэкономленный запрос (или элемент пакета)
+    saved = sum(1 for i in skipped if text_blocks[i]['text'].strip())
+    if saved:
+        metrics.record("classifier.saved_calls", saved)
+        print(f"Классификатор: {saved} из {len(text_blocks)} блоков не требуют перевода")
+    return to_translate, skipped
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Асинхронный клиент сервисов перевода с постоянным пулом HTTP-соединений
+
+Все запросы выполняются в одном фоновом цикле событий asyncio.
+Для OpenAI используется один клиент на каждый API ключ, поэтому TLS-соединения
+переиспользуются между блоками, страницами и потоками обработки.
+Google Translate вызывается через deep_translator в ограниченном пуле потоков.
+Количество одновременных запросов к каждому сервису ограничивается семафором
+"""
+import asyncio
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from .resilience import resilient_call
+from .ratelimit import get_rate_limiter, get_usage_tracker, current_user_id
+from .planner import estimate_tokens, estimate_output_tokens
+
+# Максимальная длина текста для одного запроса к Google Translate
+GOOGLE_MAX_TEXT_LENGTH = 5000
+
+class TranslationClient:
+    """
+    Пул HTTP-сессий сервисов перевода, работающий в фоновом цикле событий
+    """
+
+    def __init__(self, max_concurrency=8, timeout=60.0, hedge_delay=None):
+        """
+        Args:
+            max_concurrency: Максимум одновременных запросов к одному сервису
+            timeout: Таймаут HTTP-запроса в секундах
+            hedge_delay: Задержка перед дублирующим запросом к Google (None - без дублирования)
+        """
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # Потоки для синхронных запросов deep_translator
+        self._google_executor = None
+
+        # Создаются и используются только внутри цикла событий
+        self._openai_clients = {}
+        self._semaphores = {}
+
+    def _ensure_loop(self):
+        """Запускает фоновый цикл событий при первом обращении"""
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name="translation-client", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def run(self, coro):
+        """
+        Выполняет корутину в цикле событий клиента и ждет результат.
+        Позволяет синхронному коду (потокам обработки) использовать общий пул
+
+        Args:
+            coro: Корутина
+
+        Returns:
+            Результат корутины
+        """
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("TranslationClient.run нельзя вызывать из цикла событий клиента")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def _limits(self):
+        return httpx.Limits(max_connections=self.max_concurrency,
+                            max_keepalive_connections=self.max_concurrency)
+
+    def semaphore(self, backend):
+        """
+        Возвращает семафор, ограничивающий одновременные запросы к сервису
+
+        Args:
+            backend: Имя сервиса ('google', 'openai')
+
+        Returns:
+            asyncio.Semaphore: Семафор
+        """
+        if backend not in self._semaphores:
+            self._semaphores[backend] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[backend]
+
+    def get_google_executor(self):
+        """
+        Возвращает пул потоков для запросов к Google Translate.
+        Размер пула равен лимиту одновременных запросов к сервису
+
+        Returns:
+            ThreadPoolExecutor: Пул потоков
+        """
+        if self._google_executor is None:
+            self._google_executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                       thread_name_prefix='google-translate')
+        return self._google_executor
+
+    def get_openai_client(self, api_key):
+        """
+        Возвращает клиент OpenAI для API ключа (один на ключ)
+
+        Args:
+            api_key: API ключ OpenAI
+
+        Returns:
+            openai.AsyncOpenAI: Клиент OpenAI
+        """
+        if api_key not in self._openai_clients:
+            from openai import AsyncOpenAI
+            # Повторы выполняет resilient_call, встроенные повторы SDK отключены
+            self._openai_clients[api_key] = AsyncOpenAI(
+                api_key=api_key,
+                max_retries=0,
+                http_client=httpx.AsyncClient(timeout=self.timeout, limits=self._limits())
+            )
+        return self._openai_clients[api_key]
+
+    async def google_translate(self, text, src_lang, dest_lang):
+        """
+        Переводит текст через Google Translate
+
+        Args:
+            text: Текст для перевода
+            src_lang: Язык оригинала в формате Google Translate
+            dest_lang: Язык перевода в формате Google Translate
+
+        Returns:
+            str: Переведенный текст
+        """
+        from deep_translator import GoogleTranslator
+
+        if len(text) > GOOGLE_MAX_TEXT_LENGTH:
+            raise ValueError(f"Текст длиннее {GOOGLE_MAX_TEXT_LENGTH} символов")
+
+        loop = asyncio.get_running_loop()
+
+        def translate():
+            return GoogleTranslator(source=src_lang, target=dest_lang).translate(text)
+
+        async def request():
+            await get_rate_limiter().acquire('google')
+            async with self.semaphore('google'):
+                return await loop.run_in_executor(self.get_google_executor(), translate)
+
+        # Запросы к Google дешевые и идемпотентные, поэтому медленный запрос дублируется
+        return await resilient_call('google', request, hedge_delay=self.hedge_delay)
+
+    async def openai_chat(self, api_key, messages, model="gpt-4o-mini", temperature=0.3, **kwargs):
+        """
+        Выполняет запрос chat.completions к OpenAI
+
+        Args:
+            api_key: API ключ OpenAI
+            messages: Сообщения чата
+            model: Модель OpenAI
+            temperature: Температура
+
+        Returns:
+            str: Текст ответа модели
+        """
+        estimated_tokens = self._estimate_chat_tokens(messages)
+
+        async def request():
+            await get_rate_limiter().acquire('openai', api_key, estimated_tokens)
+            async with self.semaphore('openai'):
+                completion = await self.get_openai_client(api_key).chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    **kwargs
+                )
+            self._record_usage(api_key, model, completion.usage, estimated_tokens)
+            return completion
+
+        completion = await resilient_call('openai', request)
+        return completion.choices[0].message.content.strip()
+
+    async def openai_chat_stream(self, api_key, messages, model="gpt-4o-mini", temperature=0.3, **kwargs):
+        """
+        Выполняет потоковый запрос chat.completions к OpenAI.
+        Повторы при ошибках выполняет вызывающий код (см. resilient_call),
+        так как при обрыве потока ответ нужно разбирать заново
+
+        Args:
+            api_key: API ключ OpenAI
+            messages: Сообщения чата
+            model: Модель OpenAI
+            temperature: Температура
+
+        Yields:
+            str: Очередной фрагмент текста ответа
+        """
+        estimated_tokens = self._estimate_chat_tokens(messages)
+        await get_rate_limiter().acquire('openai', api_key, estimated_tokens)
+        async with self.semaphore('openai'):
+            stream = await self.get_openai_client(api_key).chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs
+            )
+            async for chunk in stream:
+                # Последний фрагмент потока содержит только расход токенов
+                if chunk.usage is not None:
+                    self._record_usage(api_key, model, chunk.usage, estimated_tokens)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+    @staticmethod
+    def _estimate_chat_tokens(messages):
+        """Оценка токенов запроса и ответа для ограничителя TPM"""
+        prompt_tokens = sum(estimate_tokens(message['content']) for message in messages)
+        return prompt_tokens + estimate_output_tokens(messages[-1]['content'])
+
+    @staticmethod
+    def _record_usage(api_key, model, usage, estimated_tokens):
+        """Учитывает фактический расход токенов запроса"""
+        if usage is None:
+            return
+        get_rate_limiter().settle('openai', api_key, estimated_tokens, usage.total_tokens)
+        get_usage_tracker().record_tokens('openai', current_user_id.get(), api_key, model,
+                                          usage.prompt_tokens, usage.completion_tokens)
+
+    async def _aclose(self):
+        for client in self._openai_clients.values():
+            await client.close()
+        self._openai_clients = {}
+        if self._google_executor is not None:
+            self._google_executor.shutdown(wait=False, cancel_futures=True)
+            self._google_executor = None
+
+    def close(self):
+        """Закрывает HTTP-сессии и останавливает цикл событий"""
+        if self._loop is None:
+            return
+        try:
+            self.run(self._aclose())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+            self._thread = None
+
+# Глобальный экземпляр клиента
+translation_client = None
+translation_client_lock = threading.Lock()
+
+def get_translation_client():
+    """
+    Возвращает общий клиент сервисов перевода
+
+    Returns:
+        TranslationClient: Клиент
+    """
+    global translation_client
+    with translation_client_lock:
+        if translation_client is None:
+            from backend.config import get_settings
+            settings = get_settings()
+            translation_client = TranslationClient(
+                max_concurrency=settings.translation_max_concurrency,
+                timeout=settings.translation_request_timeout,
+                hedge_delay=settings.translation_hedge_delay or None
+            )
+            atexit.register(translation_client.close)
+    return translation_client
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Контекст главы для перевода через OpenAI
+
+Для каждой главы хранятся краткое содержание и глоссарий (имена, термины
+и их переводы). Они обновляются ответами модели и прикладываются к каждому
+пакету в пределах бюджета токенов, поэтому перевод имен остается единым
+без пересылки всей истории. Текст контекста кешируется до следующего обновления
+"""
+import contextvars
+from collections import OrderedDict
+from .planner import estimate_tokens
+
+# Количество глав, контекст которых хранится в памяти
+CONTEXT_CACHE_SIZE = 16
+
+# Максимум терминов глоссария главы
+GLOSSARY_MAX_TERMS = 200
+
+# Глава, блоки которой переводятся; задачи asyncio наследуют ее
+current_chapter_id = contextvars.ContextVar('translation_chapter_id', default=None)
+
+async def with_chapter(coro, chapter_id):
+    """
+    Выполняет корутину перевода в контексте главы
+
+    Args:
+        coro: Корутина перевода
+        chapter_id: ID главы (None - без контекста)
+
+    Returns:
+        Результат корутины
+    """
+    token = current_chapter_id.set(chapter_id)
+    try:
+        return await coro
+    finally:
+        current_chapter_id.reset(token)
+
+class ChapterContext:
+    """
+    Краткое содержание и глоссарий одной главы
+    """
+
+    def __init__(self):
+        self.summary = ""
+        self.glossary = OrderedDict()
+        self._rendered = {}
+
+    def update(self, summary=None, glossary=None):
+        """
+        Обновляет контекст по ответу модели
+
+        Args:
+            summary: Новое краткое содержание
+            glossary: Список пар (оригинал, перевод)
+        """
+        for source, target in glossary or []:
+            source, target = source.strip(), target.strip()
+            if source and target:
+                self.glossary[source] = target
+                self.glossary.move_to_end(source)
+        while len(self.glossary) > GLOSSARY_MAX_TERMS:
+            self.glossary.popitem(last=False)
+        if summary and summary.strip():
+            self.summary = summary.strip()
+        self._rendered = {}
+
+    def render(self, max_tokens):
+        """
+        Формирует текст контекста в пределах бюджета токенов.
+        Краткое содержание занимает не больше половины бюджета,
+        остальное - последние добавленные термины глоссария
+
+        Args:
+            max_tokens: Бюджет токенов
+
+        Returns:
+            str: Текст контекста или пустая строка
+        """
+        if max_tokens in self._rendered:
+            return self._rendered[max_tokens]
+
+        parts = []
+        used = 0
+        if self.summary:
+            summary = self.summary
+            while summary and estimate_tokens(summary) > max_tokens // 2:
+                summary = summary[:int(len(summary) * 0.8)]
+            if summary:
+                parts.append(f"Story so far: {summary}")
+                used += estimate_tokens(parts[-1])
+
+        terms = []
+        for source, target in reversed(self.glossary.items()):
+            line = f"{source} = {target}"
+            cost = estimate_tokens(line) + 1
+            if used + cost > max_tokens:
+                break
+            terms.append(line)
+            used += cost
+        if terms:
+            parts.append("Glossary (keep these translations consistent):\n" + "\n".join(reversed(terms)))
+
+        self._rendered[max_tokens] = "\n\n".join(parts)
+        return self._rendered[max_tokens]
+
+class ChapterContextStore:
+    """
+    Контексты глав, обработанных последними. Используется из цикла событий клиента перевода
+    """
+
+    def __init__(self, max_chapters=CONTEXT_CACHE_SIZE):
+        self.max_chapters = max_chapters
+        self._contexts = OrderedDict()
+
+    def get(self, chapter_id):
+        """
+        Возвращает контекст главы, создавая его при необходимости
+
+        Args:
+            chapter_id: ID главы
+
+        Returns:
+            ChapterContext: Контекст
+        """
+        if chapter_id in self._contexts:
+            self._contexts.move_to_end(chapter_id)
+        else:
+            self._contexts[chapter_id] = ChapterContext()
+            while len(self._contexts) > self.max_chapters:
+                self._contexts.popitem(last=False)
+        return self._contexts[chapter_id]
+
+# Глобальное хранилище контекстов глав
+context_store = ChapterContextStore()
+
+def get_chapter_context():
+    """
+    Возвращает контекст текущей главы, если контекст включен в настройках
+
+    Returns:
+        ChapterContext: Контекст или None
+    """
+    from backend.config import get_settings
+    chapter_id = current_chapter_id.get()
+    if chapter_id is None or not get_settings().translation_context_enabled:
+        return None
+    return context_store.get(chapter_id)
\ No newline at end of file
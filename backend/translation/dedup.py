@@ -0,0 +1,210 @@
+"""
+Дедупликация текстов перед переводом
+
+Тексты блоков нормализуются, одинаковые тексты переводятся один раз,
+а результат раздается всем блокам с этим текстом. В пределах главы
+переводы кешируются: страницы, которые обрабатываются параллельно,
+ожидают уже отправленный перевод вместо повторного запроса
+"""
+import asyncio
+import re
+import unicodedata
+from collections import OrderedDict
+from threading import Lock
+from .metrics import get_translation_metrics
+
+# Количество глав, переводы которых хранятся в кеше
+CHAPTER_CACHE_SIZE = 16
+
+# Маркер ошибки перевода, который не кешируется
+TRANSLATION_ERROR = "[Ошибка перевода]"
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def normalize_text(text):
+    """
+    Нормализует текст блока для сравнения: приводит полноширинные символы и
+    многоточия к обычной форме (NFKC) и схлопывает пробелы и переводы строк
+
+    Args:
+        text: Текст блока
+
+    Returns:
+        str: Нормализованный текст
+    """
+    return WHITESPACE_PATTERN.sub(' ', unicodedata.normalize('NFKC', text or '')).strip()
+
+class ChapterTranslationCache:
+    """
+    Переводы глав, обработанных последними. Значения - asyncio.Future,
+    поэтому используется только из цикла событий клиента перевода;
+    статистика доступна из любого потока
+    """
+
+    def __init__(self, max_chapters=CHAPTER_CACHE_SIZE):
+        self.max_chapters = max_chapters
+        self._chapters = OrderedDict()
+        self._stats = OrderedDict()
+        self._stats_lock = Lock()
+
+    def _chapter(self, chapter_id):
+        if chapter_id in self._chapters:
+            self._chapters.move_to_end(chapter_id)
+        else:
+            self._chapters[chapter_id] = {}
+            while len(self._chapters) > self.max_chapters:
+                self._chapters.popitem(last=False)
+        return self._chapters[chapter_id]
+
+    def get(self, chapter_id, key):
+        return self._chapter(chapter_id).get(key)
+
+    def put(self, chapter_id, key, future):
+        self._chapter(chapter_id)[key] = future
+
+    def discard(self, chapter_id, key):
+        self._chapters.get(chapter_id, {}).pop(key, None)
+
+    def record(self, chapter_id, blocks, unique, translated):
+        """
+        Учитывает статистику дедупликации страницы
+
+        Args:
+            chapter_id: ID главы
+            blocks: Количество непустых блоков
+            unique: Количество уникальных текстов страницы
+            translated: Количество текстов, отправленных на перевод
+        """
+        with self._stats_lock:
+            stats = self._stats.setdefault(chapter_id, {'blocks': 0, 'unique': 0, 'translated': 0})
+            stats['blocks'] += blocks
+            stats['unique'] += unique
+            stats['translated'] += translated
+            self._stats.move_to_end(chapter_id)
+            while len(self._stats) > self.max_chapters:
+                self._stats.popitem(last=False)
+
+    def get_stats(self, chapter_id):
+        """
+        Возвращает статистику дедупликации главы
+
+        Args:
+            chapter_id: ID главы
+
+        Returns:
+            dict: blocks, unique, translated и dedup_ratio - доля блоков, не отправленных на перевод
+        """
+        with self._stats_lock:
+            stats = dict(self._stats.get(chapter_id, {'blocks': 0, 'unique': 0, 'translated': 0}))
+        stats['dedup_ratio'] = 1 - stats['translated'] / stats['blocks'] if stats['blocks'] else 0.0
+        return stats
+
+# Глобальный кеш переводов глав
+chapter_cache = ChapterTranslationCache()
+
+def get_chapter_cache():
+    """
+    Возвращает кеш переводов глав
+
+    Returns:
+        ChapterTranslationCache: Кеш
+    """
+    return chapter_cache
+
+async def translate_deduplicated(backend, text_blocks, src_lang, dest_lang, api_key=None, on_block=None, chapter_id=None):
+    """
+    Переводит блоки страницы, отправляя каждый уникальный текст один раз
+
+    Args:
+        backend: Сервис перевода (TranslationBackend)
+        text_blocks: Список блоков текста с ключом 'text'
+        src_lang: Язык оригинала
+        dest_lang: Язык перевода
+        api_key: API ключ сервиса
+        on_block: Функция on_block(индекс блока, перевод)
+        chapter_id: ID главы для переиспользования переводов между страницами
+            (None - дедупликация только в пределах страницы)
+
+    Returns:
+        list: Переведенные тексты в порядке блоков
+    """
+    loop = asyncio.get_running_loop()
+    metrics = get_translation_metrics()
+
+    # Группируем блоки по нормализованному тексту
+    groups = OrderedDict()
+    for i, block in enumerate(text_blocks):
+        groups.setdefault(normalize_text(block['text']), []).append(i)
+
+    translations = [""] * len(text_blocks)
+
+    def fan_out(text, translation):
+        for i in groups[text]:
+            translations[i] = translation
+            if on_block is not None and translation:
+                on_block(i, translation)
+
+    # Тексты, которые переводит эта страница, и тексты, уже переводимые другими страницами главы
+    own = OrderedDict()
+    shared = {}
+    for text in groups:
+        if not text:
+            continue
+        key = (backend.name, src_lang, dest_lang, text)
+        future = chapter_cache.get(chapter_id, key) if chapter_id is not None else None
+        if future is not None:
+            shared[text] = future
+        else:
+            future = loop.create_future()
+            if chapter_id is not None:
+                chapter_cache.put(chapter_id, key, future)
+            own[text] = (key, future)
+
+    blocks_count = sum(len(indices) for text, indices in groups.items() if text)
+    metrics.record("dedup.blocks", blocks_count)
+    metrics.record("dedup.translated", len(own))
+    if chapter_id is not None:
+        chapter_cache.record(chapter_id, blocks_count, len(own) + len(shared), len(own))
+    if blocks_count:
+        print(f"Дедупликация: {blocks_count} блоков, {len(own)} отправлено на перевод, "
+              f"{len(shared)} переиспользовано из главы")
+
+    own_texts = list(own)
+
+    def resolve(text, translation):
+        key, future = own[text]
+        if future.done():
+            return
+        if translation and translation != TRANSLATION_ERROR:
+            future.set_result(translation)
+        else:
+            # Ошибки не кешируются: другие страницы запросят перевод заново
+            future.set_result(None)
+            if chapter_id is not None:
+                chapter_cache.discard(chapter_id, key)
+        fan_out(text, translation)
+
+    async def translate_own():
+        if not own_texts:
+            return
+        try:
+            results = await backend.translate_blocks(
+                [{'text': text} for text in own_texts], src_lang, dest_lang, api_key=api_key,
+                on_block=lambda index, translation: resolve(own_texts[index], translation)
+            )
+        except BaseException:
+            for text in own_texts:
+                resolve(text, None)
+            raise
+        for text, translation in zip(own_texts, results):
+            resolve(text, translation)
+        # Тексты, для которых сервис не вернул перевод: другие страницы главы не должны ждать их
+        for text in own_texts:
+            resolve(text, TRANSLATION_ERROR)
+
+    async def wait_shared(text, future):
+        translation = await asyncio.shield(future)
+        fan_out(text, translation or TRANSLATION_ERROR)
+
+    await asyncio.gather(translate_own(), *[wait_shared(text, future) for text, future in shared.items()])
+    return translations
\ No newline at end of file
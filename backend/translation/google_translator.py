@@ -1,11 +1,11 @@
 """
 Модуль для перевода с помощью Google Translate
 """
-from deep_translator import GoogleTranslator
+from .client import get_translation_client
 
-def translate_with_google(text, src_lang='zh-CN', dest_lang='ru'):
+async def translate_with_google_async(text, src_lang='zh-CN', dest_lang='ru'):
     """
-    Переводит текст с использованием Google Translate
+    Асинхронно переводит текст с использованием Google Translate через общий пул соединений
     
     Args:
         text: Текст для перевода
@@ -19,9 +19,21 @@ def translate_with_google(text, src_lang='zh-CN', dest_lang='ru'):
         if not text.strip():
             return ""
             
-        translator = GoogleTranslator(source=src_lang, target=dest_lang)
-        translation = translator.translate(text)
-        return translation
+        return await get_translation_client().google_translate(text, src_lang, dest_lang)
     except Exception as e:
         print(f"Ошибка перевода через Google Translate: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def translate_with_google(text, src_lang='zh-CN', dest_lang='ru'):
+    """
+    Переводит текст с использованием Google Translate
+    
+    Args:
+        text: Текст для перевода
+        src_lang: Язык оригинала в формате Google Translate
+        dest_lang: Язык перевода в формате Google Translate
+        
+    Returns:
+        str: Переведенный текст или None в случае ошибки
+    """
+    return get_translation_client().run(translate_with_google_async(text, src_lang, dest_lang))
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+Модуль для локального перевода моделью CTranslate2 (NLLB или MarianMT) на CPU
+
+Модель загружается один раз и переводит блоки страницы пакетами,
+сеть и внешние сервисы не используются
+"""
+import asyncio
+import os
+from threading import Lock
+
+class LocalTranslator:
+    """
+    Локальная модель перевода CTranslate2 с токенизатором transformers
+    """
+
+    def __init__(self, model_path, model_family='nllb', compute_type='int8', batch_size=16, beam_size=2, threads=0):
+        """
+        Args:
+            model_path: Путь к модели, сконвертированной ct2-transformers-converter
+                (вместе с файлами токенизатора)
+            model_family: 'nllb' - многоязычная модель с языковыми токенами,
+                'marian' - модель для одной пары языков
+            compute_type: Тип вычислений CTranslate2 ('int8' - квантизация для CPU)
+            batch_size: Максимум блоков в одном пакете инференса
+            beam_size: Ширина лучевого поиска
+            threads: Потоков на перевод (0 - по числу ядер)
+        """
+        self.model_path = model_path
+        self.model_family = model_family
+        self.compute_type = compute_type
+        self.batch_size = batch_size
+        self.beam_size = beam_size
+        self.threads = threads
+
+        self._translator = None
+        self._tokenizers = {}
+        self._lock = Lock()
+
+    def is_available(self):
+        """
+        Returns:
+            bool: Установлены ли зависимости и есть ли модель на диске
+        """
+        try:
+            import ctranslate2  # noqa: F401
+            import transformers  # noqa: F401
+        except ImportError:
+            return False
+        return os.path.isdir(self.model_path)
+
+    def _get_translator(self):
+        # Модель загружается один раз при первом использовании
+        with self._lock:
+            if self._translator is None:
+                import ctranslate2
+                self._translator = ctranslate2.Translator(
+                    self.model_path,
+                    device='cpu',
+                    compute_type=self.compute_type,
+                    intra_threads=self.threads
+                )
+                print(f"Загружена локальная модель перевода: {self.model_path} ({self.compute_type})")
+            return self._translator
+
+    def _get_tokenizer(self, src_code):
+        with self._lock:
+            if src_code not in self._tokenizers:
+                from transformers import AutoTokenizer
+                kwargs = {'src_lang': src_code} if self.model_family == 'nllb' else {}
+                self._tokenizers[src_code] = AutoTokenizer.from_pretrained(self.model_path, **kwargs)
+            return self._tokenizers[src_code]
+
+    def translate_batch(self, texts, src_lang, dest_lang):
+        """
+        Переводит список текстов пакетами
+
+        Args:
+            texts: Список текстов
+            src_lang: Язык оригинала (ja, zh, ko, en и т.д.)
+            dest_lang: Язык перевода (ru, en, ja, zh и т.д.)
+
+        Returns:
+            list: Переведенные тексты в том же порядке
+        """
+        from backend.models.constants import NLLB_LANG_CODES
+
+        if not texts:
+            return []
+
+        src_code = NLLB_LANG_CODES.get(src_lang, src_lang)
+        dest_code = NLLB_LANG_CODES.get(dest_lang, dest_lang)
+
+        translator = self._get_translator()
+        tokenizer = self._get_tokenizer(src_code)
+
+        source = [tokenizer.convert_ids_to_tokens(tokenizer.encode(text)) for text in texts]
+        target_prefix = [[dest_code]] * len(source) if self.model_family == 'nllb' else None
+
+        results = translator.translate_batch(
+            source,
+            target_prefix=target_prefix,
+            max_batch_size=self.batch_size,
+            beam_size=self.beam_size
+        )
+
+        translations = []
+        for result in results:
+            tokens = result.hypotheses[0]
+            # Первый токен гипотезы NLLB - код языка перевода
+            if target_prefix is not None:
+                tokens = tokens[1:]
+            translations.append(tokenizer.decode(tokenizer.convert_tokens_to_ids(tokens), skip_special_tokens=True).strip())
+        return translations
+
+# Глобальный экземпляр локального переводчика
+local_translator = None
+local_translator_lock = Lock()
+
+def get_local_translator():
+    """
+    Возвращает общий локальный переводчик с параметрами из настроек
+
+    Returns:
+        LocalTranslator: Переводчик
+    """
+    global local_translator
+    with local_translator_lock:
+        if local_translator is None:
+            from backend.config import get_settings
+            settings = get_settings()
+            local_translator = LocalTranslator(
+                settings.local_translation_model_path,
+                model_family=settings.local_translation_model_family,
+                compute_type=settings.local_translation_compute_type,
+                batch_size=settings.local_translation_batch_size,
+                beam_size=settings.local_translation_beam_size,
+                threads=settings.local_translation_threads
+            )
+    return local_translator
+
+async def translate_with_local_async(texts, src_lang='zh', dest_lang='ru'):
+    """
+    Асинхронно переводит тексты локальной моделью. Инференс выполняется
+    в пуле потоков, чтобы не блокировать цикл событий клиента перевода
+
+    Args:
+        texts: Список текстов
+        src_lang: Язык оригинала (ja, zh, ko, en и т.д.)
+        dest_lang: Язык перевода (ru, en, ja, zh и т.д.)
+
+    Returns:
+        list: Переведенные тексты
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, get_local_translator().translate_batch, texts, src_lang, dest_lang)
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Счетчики метрик подсистемы перевода
+"""
+from threading import Lock
+
+class TranslationMetrics:
+    """
+    Потокобезопасные накопительные счетчики (количество повторов, время ожидания и т.п.)
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = Lock()
+
+    def record(self, name, value=1):
+        """
+        Увеличивает счетчик
+
+        Args:
+            name: Имя счетчика (например, 'google.retries')
+            value: Величина приращения
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get(self, name, default=0):
+        """
+        Возвращает значение счетчика
+
+        Args:
+            name: Имя счетчика
+            default: Значение, если счетчик еще не создан
+
+        Returns:
+            Значение счетчика
+        """
+        with self._lock:
+            return self._counters.get(name, default)
+
+    def snapshot(self):
+        """
+        Возвращает копию всех счетчиков
+
+        Returns:
+            dict: {имя счетчика: значение}
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        """Сбрасывает все счетчики"""
+        with self._lock:
+            self._counters.clear()
+
+# Глобальные метрики перевода
+translation_metrics = TranslationMetrics()
+
+def get_translation_metrics():
+    """
+    Возвращает глобальные метрики перевода
+
+    Returns:
+        TranslationMetrics: Метрики
+    """
+    return translation_metrics
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+Планирование пакетов перевода по бюджету токенов
+
+Блоки упаковываются в запросы так, чтобы оценка входных и выходных токенов
+каждого запроса не превышала заданных лимитов. Одна и та же логика используется
+для пакетов одной страницы и для пакетов всей главы
+"""
+import math
+import re
+
+# Символы, которые токенизатор кодирует примерно одним токеном на символ (CJK, кана, хангыль)
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+# Накладные расходы на один блок в JSON запроса и ответа ({"id": N, "text": ""})
+ITEM_TOKEN_OVERHEAD = 12
+
+# Отношение длины перевода к длине оригинала в токенах (с запасом для кириллицы)
+OUTPUT_TOKEN_RATIO = 2.0
+
+def estimate_tokens(text):
+    """
+    Грубая оценка количества токенов текста без загрузки токенизатора
+
+    Args:
+        text: Текст
+
+    Returns:
+        int: Оценка количества токенов
+    """
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def estimate_output_tokens(text):
+    """
+    Оценка количества токенов перевода текста
+
+    Args:
+        text: Текст оригинала
+
+    Returns:
+        int: Оценка количества токенов ответа
+    """
+    return math.ceil(estimate_tokens(text) * OUTPUT_TOKEN_RATIO)
+
+def plan_batches(items, max_input_tokens, max_output_tokens, max_items=0):
+    """
+    Упаковывает блоки в пакеты, сохраняя их порядок
+
+    Args:
+        items: Список пар (id, текст)
+        max_input_tokens: Лимит входных токенов на пакет
+        max_output_tokens: Лимит выходных токенов на пакет
+        max_items: Лимит блоков в пакете (0 - без ограничения)
+
+    Returns:
+        list: Список пакетов, каждый - список пар (id, текст).
+              Блок, превышающий лимит сам по себе, отправляется отдельным пакетом
+    """
+    batches = []
+    current = []
+    input_tokens = 0
+    output_tokens = 0
+
+    for item_id, text in items:
+        item_input = estimate_tokens(text) + ITEM_TOKEN_OVERHEAD
+        item_output = estimate_output_tokens(text) + ITEM_TOKEN_OVERHEAD
+
+        if current and (input_tokens + item_input > max_input_tokens
+                        or output_tokens + item_output > max_output_tokens
+                        or (max_items and len(current) >= max_items)):
+            batches.append(current)
+            current = []
+            input_tokens = 0
+            output_tokens = 0
+
+        current.append((item_id, text))
+        input_tokens += item_input
+        output_tokens += item_output
+
+    if current:
+        batches.append(current)
+    return batches
+
+def plan_translation_batches(texts):
+    """
+    Планирует пакеты запросов с лимитами из настроек
+
+    Args:
+        texts: Словарь {ключ блока: текст}; ключ - любое хешируемое значение
+
+    Returns:
+        list: Список пакетов (ключ блока, текст)
+    """
+    from backend.config import get_settings
+    settings = get_settings()
+    return plan_batches(
+        list(texts.items()),
+        settings.openai_batch_max_input_tokens,
+        settings.openai_batch_max_output_tokens,
+        settings.openai_batch_max_blocks
+    )
+
+def plan_chapter_batches(pages):
+    """
+    Планирует пакеты для всех страниц главы. Одинаковые после нормализации
+    тексты разных страниц попадают в пакеты один раз, как при дедупликации
+    переводов главы (см. dedup)
+
+    Args:
+        pages: Список страниц, каждая - список текстов блоков
+
+    Returns:
+        tuple: (список пакетов (нормализованный текст, текст),
+                для каждой страницы - список нормализованных текстов ее блоков)
+    """
+    from .dedup import normalize_text
+    unique = {}
+    page_keys = []
+    for texts in pages:
+        keys = [normalize_text(text) for text in texts]
+        for key, text in zip(keys, texts):
+            if key and key not in unique:
+                unique[key] = text
+        page_keys.append(keys)
+    return plan_translation_batches(unique), page_keys
\ No newline at end of file
@@ -0,0 +1,296 @@
+"""
+Ограничение частоты запросов к сервисам перевода и учет расхода
+
+Для каждого API ключа и каждого пользователя ведутся корзины запросов в минуту (RPM)
+и токенов в минуту (TPM). Ожидающие запросы стоят в очереди своего пользователя,
+очереди обслуживаются по кругу, поэтому один пользователь с большой главой
+не блокирует остальных. Используется только из цикла событий клиента перевода
+"""
+import asyncio
+import contextvars
+import hashlib
+import time
+from collections import OrderedDict, deque
+from threading import Lock
+from .resilience import current_deadline, DeadlineExceededError
+
+# Цены моделей OpenAI в долларах за 1M токенов (запрос, ответ)
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+}
+
+# Пользователь, от имени которого выполняется перевод; задачи asyncio наследуют его
+current_user_id = contextvars.ContextVar('translation_user_id', default=None)
+
+async def with_user(coro, user_id):
+    """
+    Выполняет корутину перевода от имени пользователя
+
+    Args:
+        coro: Корутина перевода
+        user_id: ID пользователя (None - анонимно)
+
+    Returns:
+        Результат корутины
+    """
+    token = current_user_id.set(user_id)
+    try:
+        return await coro
+    finally:
+        current_user_id.reset(token)
+
+def key_label(api_key):
+    """Короткий идентификатор API ключа для статистики (сам ключ не хранится)"""
+    if not api_key:
+        return 'shared'
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+class TokenBucket:
+    """
+    Корзина с равномерным пополнением: per_minute единиц в минуту,
+    емкость - минутный запас
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        """
+        Returns:
+            float: Время в секундах, через которое в корзине будет amount единиц
+        """
+        self._refill()
+        # Запрос больше емкости ждет полной корзины, иначе он не выполнился бы никогда
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta):
+        """Корректирует уровень после получения фактического расхода"""
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+class RateLimiter:
+    """
+    Ограничитель запросов с корзинами на API ключ и на пользователя
+    и справедливой очередью между пользователями
+    """
+
+    def __init__(self, limits):
+        """
+        Args:
+            limits: {сервис: {'key_rpm', 'key_tpm', 'user_rpm', 'user_tpm'}}, 0 - без ограничения
+        """
+        self.limits = limits
+        self._buckets = {}
+        self._queues = OrderedDict()
+        self._timer = None
+
+    def _bucket(self, name, per_minute):
+        if not per_minute:
+            return None
+        if name not in self._buckets:
+            self._buckets[name] = TokenBucket(per_minute)
+        return self._buckets[name]
+
+    def _requirements(self, backend, user_id, api_key, tokens):
+        limits = self.limits.get(backend, {})
+        key = key_label(api_key)
+        requirements = [
+            (self._bucket((backend, 'key', key, 'rpm'), limits.get('key_rpm')), 1),
+            (self._bucket((backend, 'key', key, 'tpm'), limits.get('key_tpm')), tokens),
+            (self._bucket((backend, 'user', user_id, 'rpm'), limits.get('user_rpm')), 1),
+            (self._bucket((backend, 'user', user_id, 'tpm'), limits.get('user_tpm')), tokens),
+        ]
+        return [(bucket, amount) for bucket, amount in requirements if bucket is not None and amount]
+
+    def _dispatch(self):
+        """Выдает разрешения очередям пользователей по кругу"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        min_wait = None
+        granted = True
+        while granted:
+            granted = False
+            for user_id in list(self._queues):
+                queue = self._queues[user_id]
+                # Отмененные ожидания (например, дублирующий запрос) пропускаются
+                while queue and queue[0][0].done():
+                    queue.popleft()
+                if not queue:
+                    del self._queues[user_id]
+                    continue
+
+                future, backend, api_key, tokens = queue[0]
+                requirements = self._requirements(backend, user_id, api_key, tokens)
+                wait = max((bucket.wait_time(amount) for bucket, amount in requirements), default=0.0)
+                if wait > 0:
+                    min_wait = wait if min_wait is None else min(min_wait, wait)
+                    continue
+
+                for bucket, amount in requirements:
+                    bucket.consume(amount)
+                queue.popleft()
+                future.set_result(None)
+                # Пользователь, получивший разрешение, переходит в конец круга
+                self._queues.move_to_end(user_id)
+                granted = True
+                break
+
+        if self._queues and min_wait is not None:
+            self._timer = asyncio.get_running_loop().call_later(min_wait, self._dispatch)
+
+    async def acquire(self, backend, api_key=None, tokens=0):
+        """
+        Ожидает разрешения на запрос
+
+        Args:
+            backend: Имя сервиса
+            api_key: API ключ (None - общий ключ сервиса)
+            tokens: Оценка токенов запроса и ответа
+
+        Returns:
+            float: Время ожидания в секундах
+
+        Raises:
+            DeadlineExceededError: Бюджет времени страницы исчерпан во время ожидания
+        """
+        user_id = current_user_id.get()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queues.setdefault(user_id, deque()).append((future, backend, api_key, tokens))
+        started = time.monotonic()
+        self._dispatch()
+
+        if not future.done():
+            deadline = current_deadline.get()
+            remaining = deadline.remaining() if deadline is not None else None
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError(f"Исчерпан бюджет времени в очереди запросов к {backend}")
+
+        waited = time.monotonic() - started
+        get_usage_tracker().record_wait(backend, user_id, api_key, waited)
+        return waited
+
+    def settle(self, backend, api_key, estimated_tokens, actual_tokens):
+        """
+        Корректирует корзины токенов по фактическому расходу запроса
+
+        Args:
+            backend: Имя сервиса
+            api_key: API ключ
+            estimated_tokens: Оценка, списанная при acquire
+            actual_tokens: Фактический расход
+        """
+        user_id = current_user_id.get()
+        delta = actual_tokens - estimated_tokens
+        for name in ((backend, 'key', key_label(api_key), 'tpm'), (backend, 'user', user_id, 'tpm')):
+            bucket = self._buckets.get(name)
+            if bucket is not None:
+                bucket.adjust(delta)
+
+class UsageTracker:
+    """
+    Учет расхода по пользователям и API ключам: запросы, токены,
+    стоимость и время ожидания в очереди
+    """
+
+    def __init__(self):
+        self._usage = {}
+        self._lock = Lock()
+
+    def _entry(self, backend, user_id, api_key):
+        key = (backend, user_id, key_label(api_key))
+        if key not in self._usage:
+            self._usage[key] = {
+                'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                'cost_usd': 0.0, 'wait_seconds': 0.0
+            }
+        return self._usage[key]
+
+    def record_wait(self, backend, user_id, api_key, seconds):
+        with self._lock:
+            entry = self._entry(backend, user_id, api_key)
+            entry['requests'] += 1
+            entry['wait_seconds'] += seconds
+
+    def record_tokens(self, backend, user_id, api_key, model, prompt_tokens, completion_tokens):
+        prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        with self._lock:
+            entry = self._entry(backend, user_id, api_key)
+            entry['prompt_tokens'] += prompt_tokens
+            entry['completion_tokens'] += completion_tokens
+            entry['cost_usd'] += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def get_usage(self, user_id=None):
+        """
+        Возвращает расход
+
+        Args:
+            user_id: ID пользователя (None - все пользователи)
+
+        Returns:
+            list: Записи с ключами backend, user_id, api_key и счетчиками
+        """
+        with self._lock:
+            return [
+                dict(counters, backend=backend, user_id=entry_user, api_key=key)
+                for (backend, entry_user, key), counters in self._usage.items()
+                if user_id is None or entry_user == user_id
+            ]
+
+# Глобальные ограничитель и учет расхода
+rate_limiter = None
+usage_tracker = UsageTracker()
+
+def get_rate_limiter():
+    """
+    Возвращает ограничитель запросов с лимитами из настроек
+
+    Returns:
+        RateLimiter: Ограничитель
+    """
+    global rate_limiter
+    if rate_limiter is None:
+        from backend.config import get_settings
+        settings = get_settings()
+        rate_limiter = RateLimiter({
+            'openai': {
+                'key_rpm': settings.openai_key_rpm,
+                'key_tpm': settings.openai_key_tpm,
+                'user_rpm': settings.openai_user_rpm,
+                'user_tpm': settings.openai_user_tpm,
+            },
+            'google': {
+                'key_rpm': settings.google_rpm,
+                'user_rpm': settings.google_user_rpm,
+            },
+        })
+    return rate_limiter
+
+def get_usage_tracker():
+    """
+    Возвращает учет расхода сервисов перевода
+
+    Returns:
+        UsageTracker: Учет расхода
+    """
+    return usage_tracker
\ No newline at end of file
@@ -0,0 +1,360 @@
+"""
+Устойчивость запросов к сервисам перевода: повторы с экспоненциальной задержкой,
+автоматический выключатель (circuit breaker), дублирующие запросы для хвостовых
+задержек и бюджет времени на страницу
+"""
+import asyncio
+import contextvars
+import datetime
+import email.utils
+import random
+import time
+from threading import Lock
+from .metrics import get_translation_metrics
+
+# HTTP-коды, при которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Исключения сетевого уровня (httpx и openai), при которых запрос повторяется
+RETRYABLE_ERROR_NAMES = {
+    'APIConnectionError', 'APITimeoutError', 'TimeoutException', 'ConnectTimeout',
+    'ReadTimeout', 'WriteTimeout', 'PoolTimeout', 'ConnectError', 'ReadError',
+    'RemoteProtocolError', 'TransportError', 'NetworkError',
+    # requests и deep_translator (Google Translate)
+    'ConnectionError', 'Timeout', 'TooManyRequests', 'RequestError'
+}
+
+class CircuitOpenError(Exception):
+    """Сервис временно отключен автоматическим выключателем"""
+
+class DeadlineExceededError(Exception):
+    """Исчерпан бюджет времени на перевод страницы"""
+
+class Deadline:
+    """
+    Бюджет времени на перевод страницы
+    """
+
+    def __init__(self, seconds):
+        """
+        Args:
+            seconds: Длительность бюджета в секундах (None или 0 - без ограничения)
+        """
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self):
+        """
+        Returns:
+            float: Оставшееся время в секундах (None - без ограничения)
+        """
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+# Бюджет текущей страницы; задачи asyncio наследуют его от родительской корутины
+current_deadline = contextvars.ContextVar('translation_deadline', default=None)
+
+async def with_deadline(coro, seconds):
+    """
+    Выполняет корутину перевода страницы в рамках бюджета времени.
+    Все запросы, запущенные корутиной, прекращают повторы по исчерпании бюджета
+
+    Args:
+        coro: Корутина перевода страницы
+        seconds: Бюджет в секундах (None или 0 - без ограничения)
+
+    Returns:
+        Результат корутины
+    """
+    token = current_deadline.set(Deadline(seconds))
+    try:
+        return await coro
+    finally:
+        current_deadline.reset(token)
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель сервиса: после серии ошибок запросы
+    к сервису отклоняются сразу, пока не истечет время восстановления
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        """
+        Args:
+            name: Имя сервиса
+            failure_threshold: Количество ошибок подряд для размыкания
+            reset_timeout: Время в секундах до пробного запроса
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # В полуоткрытом состоянии выполняется пробный запрос
+        self.probing = False
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def acquire(self):
+        """
+        Запрашивает разрешение на запрос. В полуоткрытом состоянии проходит
+        только один пробный запрос, остальные отклоняются до его результата
+
+        Returns:
+            str: 'request', 'probe' (пробный запрос) или None, если запрос отклонен
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return 'request'
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                return None
+            self.probing = True
+            return 'probe'
+
+    def allow(self):
+        """
+        Returns:
+            bool: Можно ли отправить запрос
+        """
+        return self.acquire() is not None
+
+    def release_probe(self):
+        """Снимает пробный запрос, который завершился без результата для выключателя"""
+        with self._lock:
+            self.probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.probing = False
+            self.failures += 1
+            # В полуоткрытом состоянии одна ошибка снова размыкает выключатель
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    print(f"Сервис перевода {self.name} временно отключен после {self.failures} ошибок")
+                self.opened_at = time.monotonic()
+
+# Выключатели по сервисам
+circuit_breakers = {}
+circuit_breakers_lock = Lock()
+
+def get_circuit_breaker(backend):
+    """
+    Возвращает выключатель для сервиса перевода
+
+    Args:
+        backend: Имя сервиса
+
+    Returns:
+        CircuitBreaker: Выключатель
+    """
+    from backend.config import get_settings
+    with circuit_breakers_lock:
+        if backend not in circuit_breakers:
+            settings = get_settings()
+            circuit_breakers[backend] = CircuitBreaker(
+                backend,
+                failure_threshold=settings.translation_breaker_threshold,
+                reset_timeout=settings.translation_breaker_reset
+            )
+        return circuit_breakers[backend]
+
+def get_status_code(exc):
+    """Извлекает HTTP-код из исключения httpx/openai"""
+    status_code = getattr(exc, 'status_code', None)
+    if status_code is None:
+        response = getattr(exc, 'response', None)
+        status_code = getattr(response, 'status_code', None)
+    return status_code
+
+def is_retryable(exc):
+    """
+    Определяет, стоит ли повторять запрос после ошибки
+
+    Args:
+        exc: Исключение
+
+    Returns:
+        bool: True для временных ошибок
+    """
+    status_code = get_status_code(exc)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(exc).__mro__)
+
+def get_retry_after(exc):
+    """
+    Извлекает задержку из заголовка Retry-After ответа
+
+    Args:
+        exc: Исключение
+
+    Returns:
+        float: Задержка в секундах или None
+    """
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        # Дата без часового пояса (-0000) считается UTC, а не локальным временем
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, parsed.timestamp() - time.time())
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """
+    Экспоненциальная задержка с полным случайным разбросом (full jitter)
+
+    Args:
+        attempt: Номер повтора (с 1)
+        base_delay: Базовая задержка
+        max_delay: Максимальная задержка
+
+    Returns:
+        float: Задержка в секундах
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+async def _hedged(request_factory, hedge_delay, backend):
+    """
+    Выполняет запрос и, если он не завершился за hedge_delay, отправляет дублирующий.
+    Возвращается первый успешный ответ, оставшийся запрос отменяется
+    """
+    metrics = get_translation_metrics()
+    primary = asyncio.ensure_future(request_factory())
+    hedge = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        metrics.record(f"{backend}.hedges")
+        hedge = asyncio.ensure_future(request_factory())
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        metrics.record(f"{backend}.hedge_wins")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # Оставшиеся запросы отменяются, в том числе при отмене по бюджету времени
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
+
+async def resilient_call(backend, request_factory, hedge_delay=None):
+    """
+    Выполняет запрос к сервису перевода с повторами, выключателем и бюджетом времени
+
+    Args:
+        backend: Имя сервиса ('google', 'openai')
+        request_factory: Функция без аргументов, возвращающая новую корутину запроса
+        hedge_delay: Задержка перед дублирующим запросом в секундах (None - без дублирования)
+
+    Returns:
+        Результат запроса
+
+    Raises:
+        CircuitOpenError: Сервис отключен выключателем
+        DeadlineExceededError: Исчерпан бюджет времени страницы
+    """
+    from backend.config import get_settings
+    settings = get_settings()
+    metrics = get_translation_metrics()
+    breaker = get_circuit_breaker(backend)
+    deadline = current_deadline.get()
+
+    attempt = 0
+    while True:
+        if deadline is not None and deadline.expired:
+            metrics.record(f"{backend}.deadline_exceeded")
+            raise DeadlineExceededError(f"Исчерпан бюджет времени на перевод ({backend})")
+        permit = breaker.acquire()
+        if permit is None:
+            metrics.record(f"{backend}.breaker_rejections")
+            raise CircuitOpenError(f"Сервис перевода {backend} временно недоступен")
+
+        attempt += 1
+        metrics.record(f"{backend}.requests")
+        if hedge_delay:
+            request = _hedged(request_factory, hedge_delay, backend)
+        else:
+            request = request_factory()
+        try:
+            try:
+                # Запрос, уже отправленный к сервису, тоже ограничен остатком бюджета
+                result = await asyncio.wait_for(request, deadline.remaining() if deadline is not None else None)
+            finally:
+                if permit == 'probe':
+                    breaker.release_probe()
+            breaker.record_success()
+            return result
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) and deadline is not None and deadline.expired:
+                metrics.record(f"{backend}.deadline_exceeded")
+                raise DeadlineExceededError(f"Исчерпан бюджет времени на перевод ({backend})") from None
+            if not is_retryable(e):
+                raise
+            breaker.record_failure()
+            if attempt >= settings.translation_max_attempts:
+                metrics.record(f"{backend}.exhausted")
+                raise
+
+            # Задержка: Retry-After сервиса или экспоненциальная с разбросом
+            delay = get_retry_after(e)
+            if delay is None:
+                delay = backoff_delay(attempt, settings.translation_backoff_base, settings.translation_backoff_max)
+            if deadline is not None:
+                remaining = deadline.remaining()
+                if remaining is not None and delay >= remaining:
+                    metrics.record(f"{backend}.deadline_exceeded")
+                    raise DeadlineExceededError(f"Исчерпан бюджет времени на перевод ({backend})") from e
+
+            metrics.record(f"{backend}.retries")
+            metrics.record(f"{backend}.retry_wait_seconds", delay)
+            print(f"Повтор запроса к {backend} через {delay:.2f} с (попытка {attempt}): {e}")
+            await asyncio.sleep(delay)
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+Бенчмарк экспорта: время и размер PDF/CBZ для главы из 100 страниц
+
+Сравнивает прежний экспорт маршрута /api/download (PDF через reportlab со страницами
+по размеру изображений, ZIP/CBZ с ZIP_DEFLATED, оба во временный файл) с текущим
+потоковым экспортом export_images.
+Страницы генерируются в PNG: рамки панелей, растровый тон, линии рисунка и текст.
+Кеш подготовленных страниц сбрасывается перед каждым прогоном
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_export [--pages 100]
+"""
+import argparse
+import os
+import tempfile
+import time
+import zipfile
+import numpy as np
+from PIL import Image, ImageDraw
+from backend.file_utils import export
+from backend.file_utils.export import export_images, get_export_pool
+
+PAGE_SIZE = (1200, 1800)
+
+def make_page(path, seed):
+    """Страница манги в оттенках серого с панелями, растровым тоном, линиями и текстом"""
+    rng = np.random.default_rng(seed)
+    width, height = PAGE_SIZE
+    pixels = np.full((height, width), 255, dtype=np.uint8)
+    # Растровый тон в верхней панели
+    yy, xx = np.mgrid[0:height // 3, 0:width]
+    pixels[:height // 3][(yy % 6 < 3) & (xx % 6 < 3)] = 200
+
+    img = Image.fromarray(pixels, 'L').convert('RGB')
+    draw = ImageDraw.Draw(img)
+    # Линии рисунка в нижней панели
+    for _ in range(300):
+        x, y = rng.integers(40, width - 40), rng.integers(2 * height // 3 + 40, height - 40)
+        dx, dy = rng.integers(-120, 120, size=2)
+        draw.line([(x, y), (x + dx, y + dy)], fill='black', width=int(rng.integers(1, 4)))
+    for top in (0, height // 3, 2 * height // 3):
+        draw.rectangle([20, top + 20, width - 20, top + height // 3 - 20], outline='black', width=6)
+    for line in range(12):
+        draw.text((120, height // 3 + 60 + line * 36), f"Страница {seed}, строка {line}: " + "текст " * 8, fill='black')
+    img.save(path)
+
+def legacy_pdf(image_paths):
+    """
+    Прежний экспорт PDF из /api/download (create_pdf_from_images): reportlab,
+    страница по размеру изображения, результат во временном файле для send_file
+    """
+    from reportlab.pdfgen import canvas
+    temp_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    temp_path = temp_file.name
+    temp_file.close()
+    c = canvas.Canvas(temp_path)
+    for img_path in image_paths:
+        with Image.open(img_path) as img:
+            img_width, img_height = img.size
+        c.setPageSize((img_width, img_height))
+        c.drawImage(img_path, 0, 0, width=img_width, height=img_height)
+        c.showPage()
+    c.save()
+    return temp_path
+
+def legacy_zip(image_paths, extension='cbz'):
+    """
+    Прежний экспорт ZIP/CBZ из /api/download (create_zip_from_images): ZIP_DEFLATED,
+    результат во временном файле для send_file
+    """
+    temp_file = tempfile.NamedTemporaryFile(suffix=f'.{extension}', delete=False)
+    temp_path = temp_file.name
+    temp_file.close()
+    with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for i, img_path in enumerate(image_paths):
+            zipf.write(img_path, arcname=f"{i+1:03d}_{os.path.basename(img_path)}")
+    return temp_path
+
+def run_legacy(function, image_paths):
+    """
+    Returns:
+        tuple: (секунды, байты). Время включает запись временного файла
+    """
+    started = time.perf_counter()
+    temp_path = function(image_paths)
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(temp_path)
+    os.remove(temp_path)
+    return elapsed, size
+
+def run_current(format_name, image_paths):
+    """
+    Returns:
+        tuple: (секунды, байты)
+    """
+    export.prepared_image_cache = None
+    size = 0
+    started = time.perf_counter()
+    for chunk in export_images(format_name, image_paths):
+        size += len(chunk)
+    return time.perf_counter() - started, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=100, help="Количество страниц")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        image_paths = []
+        for i in range(args.pages):
+            path = os.path.join(directory, f"{i + 1:03d}.png")
+            make_page(path, i)
+            image_paths.append(path)
+        source_size = sum(os.path.getsize(path) for path in image_paths)
+
+        # Запуск процессов пула не входит в измерения
+        list(export_images('cbz', image_paths[:1]))
+
+        rows = []
+        try:
+            rows.append(("PDF, reportlab (прежний)",) + run_legacy(legacy_pdf, image_paths))
+        except ImportError:
+            print("reportlab не установлен, прежний PDF пропущен")
+        rows.append(("PDF, потоковый",) + run_current('pdf', image_paths))
+        rows.append(("CBZ, ZIP_DEFLATED (прежний)",) + run_legacy(legacy_zip, image_paths))
+        rows.append(("CBZ, потоковый",) + run_current('cbz', image_paths))
+        rows.append(("CBZ WebP, потоковый",) + run_current('cbz-webp', image_paths))
+
+    print(f"Страниц: {args.pages}, исходные PNG: {source_size / 1024 / 1024:.1f} МБ")
+    print(f"{'Способ':<30}{'время, с':>10}{'размер, МБ':>12}")
+    for name, seconds, size in rows:
+        print(f"{name:<30}{seconds:>10.2f}{size / 1024 / 1024:>12.1f}")
+    get_export_pool().shutdown()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
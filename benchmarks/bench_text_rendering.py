@@ -0,0 +1,123 @@
+"""
+Бенчмарк рендеринга текста: количество вызовов draw.text и время на страницу
+
+Сравнивает прежнюю обводку (повторная отрисовка строки в 8 или 20 смещениях
+перед основным текстом) с текущей отрисовкой через stroke_width/stroke_fill.
+Страница: 30 блоков по 4 строки, треть блоков на темном фоне (усиленная обводка).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_text_rendering [--pages 20]
+"""
+import argparse
+import time
+from contextlib import contextmanager
+import numpy as np
+from PIL import Image, ImageDraw
+from backend.image_processing import text_rendering
+from backend.image_processing.text_rendering import wrap_text, _text_width
+
+PAGE_SIZE = (1200, 1800)
+BLOCKS_PER_PAGE = 30
+SAMPLE_TEXT = "Мы должны успеть до заката, иначе ворота закроются и нам придется ждать до утра"
+
+def legacy_draw_wrapped_text(draw, font, text, box, outline_strength=1, align='center', line_spacing=6):
+    """Прежняя отрисовка: обводка повторными вызовами draw.text со смещениями"""
+    x_min, y_min, x_max, y_max = box
+    left, top, right, bottom = font.getbbox('А')
+    char_height = bottom - top
+    wrapped_text = wrap_text(font, text, x_max - x_min - 15)
+    if not wrapped_text:
+        return
+
+    if outline_strength == 1:
+        offsets = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+    else:
+        offsets = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3)
+                   if (dx or dy) and not (abs(dx) == 2 and abs(dy) == 2)]
+
+    text_height_total = len(wrapped_text) * (char_height + line_spacing)
+    y_start = y_min + ((y_max - y_min - text_height_total) / 2)
+    for i, line in enumerate(wrapped_text):
+        if not line:
+            continue
+        text_width = _text_width(font, line)
+        if align == 'left':
+            x_pos = x_min + 5
+        elif align == 'right':
+            x_pos = x_max - text_width - 5
+        else:
+            x_pos = x_min + ((x_max - x_min - text_width) / 2)
+        y_pos = y_start + (i * (char_height + line_spacing))
+        for dx, dy in offsets:
+            draw.text((x_pos + dx, y_pos + dy), line, fill="white", font=font)
+        draw.text((x_pos, y_pos), line, fill="black", font=font)
+
+def make_page():
+    """Страница с блоками текста; каждый третий блок лежит на темной области"""
+    img = Image.new('RGB', PAGE_SIZE, 'white')
+    draw = ImageDraw.Draw(img)
+    blocks, dark_boxes = [], []
+    columns, rows = 5, 6
+    cell_w, cell_h = PAGE_SIZE[0] // columns, PAGE_SIZE[1] // rows
+    for index in range(BLOCKS_PER_PAGE):
+        x, y = (index % columns) * cell_w, (index // columns) * cell_h
+        box = [x + 10, y + 10, x + cell_w - 10, y + cell_h - 10]
+        if index % 3 == 0:
+            draw.rectangle(box, fill=(40, 40, 40))
+            dark_boxes.append(tuple(box))
+        blocks.append({'box': box, 'translated_text': SAMPLE_TEXT})
+    return img, blocks, dark_boxes
+
+@contextmanager
+def count_text_calls():
+    """Считает вызовы ImageDraw.text"""
+    counter = {'calls': 0}
+    original = ImageDraw.ImageDraw.text
+
+    def counted(self, *args, **kwargs):
+        counter['calls'] += 1
+        return original(self, *args, **kwargs)
+
+    ImageDraw.ImageDraw.text = counted
+    try:
+        yield counter
+    finally:
+        ImageDraw.ImageDraw.text = original
+
+def run(renderer, pages):
+    """
+    Returns:
+        tuple: (вызовов draw.text на страницу, мс на страницу, последнее изображение)
+    """
+    original = text_rendering.draw_wrapped_text
+    text_rendering.draw_wrapped_text = renderer
+    try:
+        with count_text_calls() as counter:
+            elapsed = 0.0
+            for _ in range(pages):
+                img, blocks, dark_boxes = make_page()
+                started = time.perf_counter()
+                text_rendering.render_text_blocks(img, blocks, dark_boxes)
+                elapsed += time.perf_counter() - started
+    finally:
+        text_rendering.draw_wrapped_text = original
+    return counter['calls'] / pages, elapsed * 1000 / pages, img
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=20, help="Количество страниц")
+    args = parser.parse_args()
+
+    legacy_calls, legacy_ms, legacy_img = run(legacy_draw_wrapped_text, args.pages)
+    stroke_calls, stroke_ms, stroke_img = run(text_rendering.draw_wrapped_text, args.pages)
+
+    diff = np.abs(np.asarray(legacy_img, dtype=np.int16) - np.asarray(stroke_img, dtype=np.int16))
+    print(f"{'Способ':<22}{'draw.text/стр.':>16}{'мс/стр.':>10}")
+    print(f"{'Смещения (прежний)':<22}{legacy_calls:>16.0f}{legacy_ms:>10.1f}")
+    print(f"{'stroke_width':<22}{stroke_calls:>16.0f}{stroke_ms:>10.1f}")
+    print(f"Сокращение вызовов: в {legacy_calls / max(stroke_calls, 1):.1f} раза, "
+          f"ускорение: в {legacy_ms / max(stroke_ms, 1e-9):.1f} раза")
+    print(f"Отличающихся пикселей: {np.mean(diff.max(axis=2) > 32):.2%}")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
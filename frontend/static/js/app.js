@@ -8,6 +8,7 @@ import Notification from './modules/notification.js';
 import Navigation from './modules/navigation.js';
 import TranslationSettings from './modules/translation.js';
 import Download from './modules/download.js';
+import Library from './modules/library.js';
 import { addEventHandler, getElement, getElements } from './utils/helpers.js';
 
 // Инициализация всех компонентов
@@ -193,16 +194,23 @@ function updateFileCount() {
             const previewContainer = document.createElement('div');
             previewContainer.className = 'image-preview';
             
-            // Создаем элемент изображения
-            const img = document.createElement('img');
-            const reader = new FileReader();
-            
-            reader.onload = function(e) {
-                img.src = e.target.result;
-            };
-            
-            reader.readAsDataURL(file);
-            previewContainer.appendChild(img);
+            if (file.type.startsWith('image/')) {
+                // Создаем элемент изображения
+                const img = document.createElement('img');
+                const reader = new FileReader();
+                
+                reader.onload = function(e) {
+                    img.src = e.target.result;
+                };
+                
+                reader.readAsDataURL(file);
+                previewContainer.appendChild(img);
+            } else {
+                // Архив главы (CBZ/ZIP/CBR/RAR) не читается в браузере, показываем значок
+                const icon = document.createElement('i');
+                icon.className = 'fas fa-file-archive fa-3x';
+                previewContainer.appendChild(icon);
+            }
             
             // Создаем элемент с именем файла
             const fileName = document.createElement('div');
@@ -229,14 +237,8 @@ function updateFileCount() {
  * Инициализация папок с мангой
  */
 function initFolders() {
-    // Обработчики для выбора всех изображений в папке
-    const selectAllCheckboxes = getElements('[id^="select-all-"]');
-    selectAllCheckboxes.forEach(checkbox => {
-        const folderId = checkbox.id.replace('select-all-', '');
-        checkbox.addEventListener('change', () => {
-            selectAllImages(folderId);
-        });
-    });
+    // Папки загружаются постранично; обработчики выбора добавляются при создании папок
+    Library.init();
 }
 
 /**
@@ -42,6 +42,14 @@ const Download = {
             console.warn("Кнопка скачивания ZIP не найдена");
         }
 
+        // Дополнительные форматы: CBZ со страницами в WebP и EPUB
+        [['download-cbz-webp', 'cbz-webp'], ['download-epub', 'epub']].forEach(([buttonId, format]) => {
+            const button = document.getElementById(buttonId);
+            if (button) {
+                button.addEventListener('click', () => Download.downloadResults(format));
+            }
+        });
+
         console.log("Модуль скачивания инициализирован");
     },
 
@@ -86,6 +94,12 @@ const Download = {
                     <button id="download-zip" class="btn btn-primary download-btn">
                         <i class="fas fa-file-archive"></i> ZIP
                     </button>
+                    <button id="download-cbz-webp" class="btn btn-primary download-btn">
+                        <i class="fas fa-book"></i> CBZ (WebP)
+                    </button>
+                    <button id="download-epub" class="btn btn-primary download-btn">
+                        <i class="fas fa-book-open"></i> EPUB
+                    </button>
                 </div>
             `;
             
@@ -101,7 +115,7 @@ const Download = {
 
     /**
      * Скачивает результаты перевода в выбранном формате
-     * @param {string} format - Формат файла (pdf, zip, cbz)
+     * @param {string} format - Формат файла (pdf, zip, cbz, cbz-webp, epub)
      */
     downloadResults: async (format) => {
         // Собираем пути ко всем обработанным изображениям
@@ -158,9 +172,24 @@ const Download = {
             spinnerContainer.style.display = 'flex';
         }
         
+        // Показываем ход экспорта в тексте спиннера
+        const spinnerText = spinnerContainer ? spinnerContainer.querySelector('.spinner-text') : null;
+        const defaultSpinnerText = spinnerText ? spinnerText.textContent : '';
+        const jobId = `${Date.now()}_${Math.random().toString(36).slice(2)}`;
+        const progressTimer = setInterval(async () => {
+            const job = await API.getExportStatus(jobId);
+            if (job && spinnerText && job.total) {
+                spinnerText.textContent = `Подготовка файла: ${job.done} из ${job.total} страниц`;
+            }
+        }, 1000);
+        
         try {
             // Отправляем запрос на создание файла выбранного формата
-            const result = await API.downloadResults(format, imagePaths);
+            const result = await API.downloadResults(format, imagePaths, jobId);
+            clearInterval(progressTimer);
+            if (spinnerText) {
+                spinnerText.textContent = defaultSpinnerText;
+            }
             
             // Скрываем спиннер
             if (spinnerContainer) {
@@ -193,6 +222,11 @@ const Download = {
             
             Notification.success(`Скачивание ${format.toUpperCase()} началось`);
         } catch (error) {
+            clearInterval(progressTimer);
+            if (spinnerText) {
+                spinnerText.textContent = defaultSpinnerText;
+            }
+            
             // Скрываем спиннер в случае ошибки
             if (spinnerContainer) {
                 spinnerContainer.style.display = 'none';
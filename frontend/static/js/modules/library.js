@@ -0,0 +1,278 @@
+/**
+ * Модуль постраничной загрузки папок с мангой
+ * Папки подгружаются при прокрутке списка, изображения папки - при ее раскрытии
+ * и прокрутке сетки изображений
+ */
+
+import API from '../utils/api.js';
+import Notification from './notification.js';
+
+const Library = {
+    // Курсор следующей страницы папок (null - первая страница)
+    cursor: null,
+    // Все папки загружены
+    finished: false,
+    loading: false,
+    // Счетчик ID папок на странице; ID не зависят от порядка папок на сервере
+    nextFolderId: 0,
+    observer: null,
+
+    /**
+     * Инициализирует список папок
+     */
+    init: () => {
+        const list = document.getElementById('folders-list');
+        const sentinel = document.getElementById('folders-sentinel');
+        if (!list || !sentinel) return;
+
+        if ('IntersectionObserver' in window) {
+            Library.observer = new IntersectionObserver((entries) => {
+                entries.forEach(entry => {
+                    if (!entry.isIntersecting) return;
+                    if (entry.target === sentinel) {
+                        Library.loadFolders();
+                    } else {
+                        Library.loadImages(entry.target.closest('.folder-item'));
+                    }
+                });
+            }, { rootMargin: '400px' });
+            Library.observer.observe(sentinel);
+        }
+        Library.loadFolders();
+    },
+
+    /**
+     * Загружает следующую страницу папок
+     */
+    loadFolders: async () => {
+        if (Library.loading || Library.finished) return;
+        Library.loading = true;
+
+        try {
+            const page = await API.getLibraryFolders(Library.cursor);
+            const list = document.getElementById('folders-list');
+            page.folders.forEach(folder => list.appendChild(Library.createFolder(folder)));
+
+            Library.cursor = page.next_cursor;
+            Library.finished = !page.next_cursor;
+            if (page.total === 0) {
+                document.getElementById('folders-form').style.display = 'none';
+                document.getElementById('folders-empty').style.display = '';
+            }
+        } catch (error) {
+            console.error('Ошибка загрузки папок:', error);
+            Notification.error('Не удалось загрузить список папок');
+            Library.finished = true;
+        } finally {
+            Library.loading = false;
+        }
+
+        const sentinel = document.getElementById('folders-sentinel');
+        if (Library.finished) {
+            if (Library.observer) Library.observer.unobserve(sentinel);
+        } else if (Library.observer) {
+            // Повторное наблюдение сообщает о пересечении, если конец списка все еще виден
+            Library.observer.unobserve(sentinel);
+            Library.observer.observe(sentinel);
+        } else {
+            // Без IntersectionObserver все страницы загружаются сразу
+            Library.loadFolders();
+        }
+    },
+
+    /**
+     * Создает элемент папки с пустой сеткой изображений
+     * @param {Object} folder - Папка (name, path, image_count)
+     * @returns {Element} - Элемент папки
+     */
+    createFolder: (folder) => {
+        const folderId = String(Library.nextFolderId++);
+        const item = document.createElement('div');
+        item.className = 'folder-item';
+        item.dataset.folderId = folderId;
+        item.dataset.folderName = folder.name;
+        item.innerHTML = `
+            <div class="folder-header">
+                <div class="folder-name">
+                    <i class="fas fa-folder"></i>
+                    <span></span>
+                </div>
+                <div class="folder-count">
+                    <span class="badge">${folder.image_count} изображений</span>
+                    <i class="fas fa-chevron-down folder-icon-${folderId}"></i>
+                </div>
+            </div>
+            <div id="folder-content-${folderId}" class="folder-content">
+                <div class="folder-toolbar">
+                    <div class="checkbox-option">
+                        <input type="checkbox" id="select-all-${folderId}">
+                        <label for="select-all-${folderId}" class="checkbox-label">
+                            <i class="fas fa-check-square"></i> Выбрать все
+                        </label>
+                    </div>
+                    <div>
+                        <span id="selected-count-${folderId}">0</span> из ${folder.image_count} выбрано
+                    </div>
+                </div>
+
+                <div class="folder-images-grid"></div>
+                <div class="folder-images-sentinel"></div>
+
+                <div class="folder-actions">
+                    <button type="submit" name="folder_path" class="btn btn-primary">
+                        <i class="fas fa-language"></i> Перевести выбранные
+                    </button>
+                    <button type="submit" name="translate_all_folder" class="btn btn-secondary">
+                        <i class="fas fa-folder-open"></i> Перевести всю папку
+                    </button>
+                </div>
+            </div>
+        `;
+
+        // Имена и пути задаются через свойства, чтобы не разбирать их как HTML
+        item.querySelector('.folder-name span').textContent = folder.name;
+        item.querySelectorAll('.folder-actions button').forEach(button => {
+            button.value = folder.path;
+        });
+
+        item.querySelector('.folder-header').addEventListener('click', () => {
+            window.toggleFolder(folderId);
+            Library.loadImages(item);
+        });
+        item.querySelector(`#select-all-${folderId}`).addEventListener('change', () => {
+            window.selectAllImages(folderId);
+        });
+
+        // При выборе всех изображений перед отправкой догружаются оставшиеся страницы,
+        // иначе на перевод ушли бы только уже показанные изображения
+        const translateSelected = item.querySelector('.folder-actions button[name="folder_path"]');
+        translateSelected.addEventListener('click', async (event) => {
+            const selectAll = document.getElementById(`select-all-${folderId}`);
+            if (!selectAll.checked || item.dataset.finished === 'true') return;
+            event.preventDefault();
+
+            translateSelected.disabled = true;
+            try {
+                await Library.loadAllImages(item);
+            } finally {
+                translateSelected.disabled = false;
+            }
+            if (item.dataset.failed === 'true') return;
+            translateSelected.form.requestSubmit(translateSelected);
+        });
+        return item;
+    },
+
+    // Загружаемые страницы изображений по ID папки
+    pending: {},
+
+    /**
+     * Загружает следующую страницу изображений папки. Повторный вызов во время
+     * загрузки возвращает ту же загрузку
+     * @param {Element} item - Элемент папки
+     * @returns {Promise<void>}
+     */
+    fetchImages: (item) => {
+        const folderId = item.dataset.folderId;
+        if (Library.pending[folderId]) return Library.pending[folderId];
+        if (item.dataset.finished === 'true') return Promise.resolve();
+
+        Library.pending[folderId] = (async () => {
+            try {
+                const page = await API.getLibraryImages(item.dataset.folderName, item.dataset.cursor || null);
+                const grid = item.querySelector('.folder-images-grid');
+                const selectAll = document.getElementById(`select-all-${folderId}`);
+                page.images.forEach(image => {
+                    grid.appendChild(Library.createImage(folderId, image, grid.children.length + 1, selectAll.checked));
+                });
+                window.updateSelectedCount(folderId);
+
+                item.dataset.cursor = page.next_cursor || '';
+                if (!page.next_cursor) {
+                    item.dataset.finished = 'true';
+                }
+            } catch (error) {
+                console.error('Ошибка загрузки изображений папки:', error);
+                Notification.error('Не удалось загрузить изображения папки');
+                item.dataset.finished = 'true';
+                item.dataset.failed = 'true';
+            } finally {
+                delete Library.pending[folderId];
+            }
+        })();
+        return Library.pending[folderId];
+    },
+
+    /**
+     * Загружает все оставшиеся страницы изображений папки
+     * @param {Element} item - Элемент папки
+     * @returns {Promise<void>}
+     */
+    loadAllImages: async (item) => {
+        while (item.dataset.finished !== 'true') {
+            await Library.fetchImages(item);
+        }
+    },
+
+    /**
+     * Загружает следующую страницу изображений раскрытой папки
+     * @param {Element} item - Элемент папки
+     */
+    loadImages: async (item) => {
+        if (!item || item.dataset.finished === 'true') return;
+        const folderId = item.dataset.folderId;
+        const content = document.getElementById(`folder-content-${folderId}`);
+        if (!content || content.style.display !== 'block') return;
+
+        await Library.fetchImages(item);
+
+        const sentinel = item.querySelector('.folder-images-sentinel');
+        if (item.dataset.finished === 'true') {
+            if (Library.observer) Library.observer.unobserve(sentinel);
+        } else if (Library.observer) {
+            // Повторное наблюдение сообщает о пересечении, если конец сетки все еще виден
+            Library.observer.unobserve(sentinel);
+            Library.observer.observe(sentinel);
+        } else {
+            Library.loadImages(item);
+        }
+    },
+
+    /**
+     * Создает элемент изображения с чекбоксом выбора
+     * @param {string} folderId - ID папки на странице
+     * @param {Object} image - Изображение (name, path, thumbnail_url, thumbnail_url_2x)
+     * @param {number} index - Номер изображения в папке
+     * @param {boolean} checked - Выбрано ли изображение
+     * @returns {Element} - Элемент изображения
+     */
+    createImage: (folderId, image, index, checked) => {
+        const item = document.createElement('div');
+        item.className = 'image-item';
+        item.innerHTML = `
+            <div class="image-preview">
+                <img loading="lazy">
+                <input type="checkbox" class="image-checkbox folder-${folderId}-checkbox"
+                       id="image-${folderId}-${index}" name="selected_images">
+            </div>
+            <div class="image-name"></div>
+        `;
+
+        const img = item.querySelector('img');
+        img.src = image.thumbnail_url;
+        img.srcset = `${image.thumbnail_url_2x} 2x`;
+        img.alt = image.name;
+
+        const checkbox = item.querySelector('.image-checkbox');
+        checkbox.value = image.path;
+        checkbox.checked = checked;
+        checkbox.addEventListener('change', () => window.updateSelectedCount(folderId));
+
+        const name = item.querySelector('.image-name');
+        name.textContent = image.name;
+        name.title = image.name;
+        return item;
+    }
+};
+
+export default Library;
\ No newline at end of file
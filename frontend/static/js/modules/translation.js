@@ -150,6 +150,7 @@ const TranslationSettings = {
         // Синхронизируем селекторы языков
         syncFormValues('#source_language', ['#source_language_individual', '#source_language_folders']);
         syncFormValues('#target_language', ['#target_language_individual', '#target_language_folders']);
+        syncFormValues('#inpaint_method', ['#inpaint_method_individual', '#inpaint_method_folders']);
         
         // Синхронизируем API ключ
         syncFormValues('#openai_api_key', ['#openai_api_key_individual', '#openai_api_key_folders'], 'input');
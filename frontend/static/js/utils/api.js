@@ -103,11 +103,12 @@ const API = {
 
     /**
      * Скачивает результаты перевода в выбранном формате
-     * @param {string} format - Формат файла (pdf, zip, cbz)
+     * @param {string} format - Формат файла (pdf, zip, cbz, cbz-webp, epub)
      * @param {Array<string>} imagePaths - Массив путей к изображениям
+     * @param {string} jobId - ID экспорта для отслеживания хода (необязательно)
      * @returns {Promise<Blob>} - Blob с данными для скачивания
      */
-    downloadResults: async (format, imagePaths) => {
+    downloadResults: async (format, imagePaths, jobId = null) => {
         try {
             console.log(`API: downloadResults(format=${format}, imagePaths=)`, imagePaths);
             
@@ -120,7 +121,8 @@ const API = {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    image_paths: imagePaths
+                    image_paths: imagePaths,
+                    job_id: jobId
                 })
             });
 
@@ -147,6 +149,70 @@ const API = {
             console.error('Ошибка API downloadResults:', error);
             throw error;
         }
+    },
+
+    /**
+     * Получает ход экспорта
+     * @param {string} jobId - ID экспорта
+     * @returns {Promise<Object|null>} - Состояние экспорта (done, total, status) или null
+     */
+    getExportStatus: async (jobId) => {
+        try {
+            const response = await fetch(`/api/export/status/${encodeURIComponent(jobId)}`);
+            if (!response.ok) {
+                return null;
+            }
+            const data = await response.json();
+            return data.success ? data.job : null;
+        } catch (error) {
+            return null;
+        }
+    },
+
+    /**
+     * Получает страницу папок с мангой
+     * @param {string|null} cursor - Курсор следующей страницы (null - первая страница)
+     * @param {number|null} limit - Размер страницы
+     * @returns {Promise<Object>} - Папки, общее количество и курсор следующей страницы
+     */
+    getLibraryFolders: async (cursor = null, limit = null) => {
+        return API.getLibraryPage('/api/library/folders', { cursor, limit });
+    },
+
+    /**
+     * Получает страницу изображений папки с мангой
+     * @param {string} folder - Имя папки
+     * @param {string|null} cursor - Курсор следующей страницы (null - первая страница)
+     * @param {number|null} limit - Размер страницы
+     * @returns {Promise<Object>} - Изображения, общее количество и курсор следующей страницы
+     */
+    getLibraryImages: async (folder, cursor = null, limit = null) => {
+        return API.getLibraryPage('/api/library/images', { folder, cursor, limit });
+    },
+
+    /**
+     * Выполняет запрос страницы списка библиотеки
+     * @param {string} url - Адрес API
+     * @param {Object} params - Параметры запроса (пустые значения пропускаются)
+     * @returns {Promise<Object>} - Ответ сервера
+     */
+    getLibraryPage: async (url, params) => {
+        const query = new URLSearchParams();
+        Object.entries(params).forEach(([key, value]) => {
+            if (value !== null && value !== undefined) {
+                query.append(key, value);
+            }
+        });
+
+        const response = await fetch(`${url}?${query.toString()}`);
+        if (!response.ok) {
+            throw new Error('Ошибка HTTP: ' + response.status);
+        }
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.error || 'Ошибка загрузки библиотеки');
+        }
+        return result;
     }
 };
 